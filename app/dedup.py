@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+
+from dotenv import find_dotenv, load_dotenv
+import logging
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+env_path = find_dotenv()
+load_dotenv(env_path, override=True)
+
+# Déduplication des transactions renvoyées plusieurs fois par l'API
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Nombre maximal de trans_num gardés en mémoire (les plus anciens sont oubliés en premier)
+DEDUP_MAX_SIZE = int(os.getenv("DEDUP_MAX_SIZE", "100000"))
+# Durée (en secondes) pendant laquelle un trans_num déjà vu est considéré comme un doublon
+DEDUP_TTL_SECONDS = float(os.getenv("DEDUP_TTL_SECONDS", "3600"))
+# Fichier JSON où l'ensemble est sauvegardé à l'arrêt et rechargé au démarrage (vide = pas de sauvegarde)
+DEDUP_STATE_PATH = os.getenv("DEDUP_STATE_PATH", "")
+
+
+class SeenTransactions:
+    """
+    Ensemble borné des trans_num vus récemment (LRU avec expiration).
+
+    Chaque trans_num est gardé `ttl` secondes après son dernier passage ;
+    au-delà de `max_size` entrées, les moins récemment vues sont oubliées.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEDUP_MAX_SIZE,
+        ttl: float = DEDUP_TTL_SECONDS,
+        state_path: str = DEDUP_STATE_PATH,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.state_path = state_path
+        # trans_num → date du dernier passage (time.time()), du plus ancien au plus récent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.dropped = 0
+        if state_path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, seen_at = next(iter(self._entries.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._entries[key]
+
+    def add(self, key: str, now: float = None) -> bool:
+        """
+        Enregistre le passage de `key`. Retourne True si elle n'avait pas été vue récemment.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            self.checked += 1
+            is_new = key not in self._entries
+            if is_new:
+                while len(self._entries) >= self.max_size:
+                    self._entries.popitem(last=False)
+            else:
+                self.dropped += 1
+                self._entries.move_to_end(key)
+            self._entries[key] = now
+            return is_new
+
+    def discard(self, key: str):
+        """
+        Oublie `key` : une transaction dont le traitement a échoué pourra être traitée à nouveau.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def filter_transaction(self, transaction_json: dict, now: float = None):
+        """
+        Retire de la réponse de l'API les lignes dont le trans_num a déjà été vu.
+        Retourne la transaction filtrée, ou None si toutes les lignes sont des doublons.
+        """
+        index_trans_num = transaction_json["columns"].index("trans_num")
+        rows = [row for row in transaction_json["data"] if self.add(str(row[index_trans_num]), now)]
+        if not rows:
+            return None
+        if len(rows) == len(transaction_json["data"]):
+            return transaction_json
+        return {**transaction_json, "data": rows}
+
+    def metrics(self) -> dict:
+        return {"size": len(self._entries), "checked": self.checked, "dropped": self.dropped}
+
+    def load(self):
+        """
+        Recharge les trans_num sauvegardés encore valides.
+        """
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Impossible de relire l'état de déduplication {self.state_path} : {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, seen_at in sorted(entries.items(), key=lambda item: item[1]):
+                if now - seen_at < self.ttl:
+                    self._entries[key] = seen_at
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        logging.info(f"✅ {len(self._entries)} trans_num rechargés depuis {self.state_path}")
+
+    def save(self):
+        """
+        Sauvegarde les trans_num en JSON (écriture dans un fichier temporaire puis renommage).
+        """
+        if not self.state_path:
+            return
+        with self._lock:
+            entries = dict(self._entries)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.state_path)
+        logging.info(f"✅ État de déduplication sauvegardé ({len(entries)} trans_num)")
+
+
+_seen_transactions = None
+_seen_transactions_lock = threading.Lock()
+
+
+def get_seen_transactions() -> SeenTransactions:
+    """
+    Ensemble des trans_num vus, partagé par le process (sauvegardé à la sortie du process).
+    """
+    global _seen_transactions
+    if _seen_transactions is None:
+        with _seen_transactions_lock:
+            if _seen_transactions is None:
+                _seen_transactions = SeenTransactions()
+                atexit.register(_seen_transactions.save)
+    return _seen_transactions
+
+
+def drop_duplicate_transaction(transaction_json: dict):
+    """
+    Retourne la transaction sans les lignes déjà vues (None si c'est un doublon complet).
+    Sans effet si DEDUP_ENABLED est désactivé.
+    """
+    if not DEDUP_ENABLED:
+        return transaction_json
+    return get_seen_transactions().filter_transaction(transaction_json)
+
+
+def forget_trans_nums(trans_nums):
+    """
+    Oublie des trans_num dont le scoring ou l'écriture a échoué,
+    pour qu'ils ne soient pas écartés comme doublons au prochain passage.
+    """
+    if not DEDUP_ENABLED:
+        return
+    seen = get_seen_transactions()
+    for trans_num in trans_nums:
+        seen.discard(str(trans_num))
+
+
+def forget_transaction(transaction_json: dict):
+    """
+    Oublie les trans_num d'une transaction dont le traitement a échoué (voir forget_trans_nums).
+    """
+    if transaction_json is None:
+        return
+    index_trans_num = transaction_json["columns"].index("trans_num")
+    forget_trans_nums(row[index_trans_num] for row in transaction_json["data"])
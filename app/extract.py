@@ -1,11 +1,30 @@
 import os
+import sys
+import gzip
 import json
+import uuid
+import atexit
+import queue
+import asyncio
+import time
+import threading
+from collections import deque
 from datetime import datetime
+from pathlib import Path
 import logging
 
-import requests
 import boto3
 from dotenv import find_dotenv, load_dotenv
+# Rendre les modules du dossier app importables (exécution directe ou via le package app)
+sys.path.insert(0, str(Path(__file__).parent))
+from http_client import get_json, get_json_async, close_async_client
+from dedup import drop_duplicate_transaction, get_seen_transactions
+
+# zstandard est optionnel : sans lui, la compression zstd retombe sur gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Charger le .env
 env_path = find_dotenv()
@@ -26,6 +45,24 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_DEFAULT_REGION", "eu-north-1")
 S3_BUCKET = os.getenv("BUCKET_NAME")
 RAW_PREFIX = "data/raw"
+# Mode d'écriture de la couche raw :
+# - "object" : un objet JSON par transaction (comportement historique)
+# - "batch" : transactions regroupées en NDJSON compressé, partitionné par date/heure
+RAW_WRITE_MODE = os.getenv("RAW_WRITE_MODE", "object")
+RAW_BATCH_MAX_BYTES = int(os.getenv("RAW_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+RAW_BATCH_MAX_SECONDS = float(os.getenv("RAW_BATCH_MAX_SECONDS", "60"))
+RAW_BATCH_COMPRESSION = os.getenv("RAW_BATCH_COMPRESSION", "gzip")  # gzip ou zstd
+# Volume maximal (octets non compressés) gardé en mémoire pour renvoyer les lots en échec ;
+# au-delà, les lots en échec sont abandonnés (et comptés)
+RAW_RETRY_MAX_BYTES = int(os.getenv("RAW_RETRY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# === Extraction concurrente ===
+# Débit cible (transactions/s) et nombre maximum d'appels simultanés à l'API
+EXTRACT_TARGET_RATE = float(os.getenv("EXTRACT_TARGET_RATE", "1"))
+EXTRACT_MAX_CONCURRENCY = int(os.getenv("EXTRACT_MAX_CONCURRENCY", "8"))
+# Seuils au-delà desquels on réduit la concurrence (latence en secondes, taux d'erreur)
+EXTRACT_LATENCY_TARGET = float(os.getenv("EXTRACT_LATENCY_TARGET", "2"))
+EXTRACT_ERROR_RATE_MAX = float(os.getenv("EXTRACT_ERROR_RATE_MAX", "0.2"))
 
 
 boto3.setup_default_session(
@@ -43,15 +80,29 @@ s3_client = boto3.client(
 
 
 
+def parse_transaction_payload(payload) -> dict:
+    """
+    L'API renvoie une chaîne JSON encodée dans du JSON : on la décode une seconde fois.
+    """
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    return payload
+
+
 def get_transaction() -> dict:
     """
     Appelle l'API Jedha pour récupérer une transaction.
     """
-    url = API_URL
-    r = requests.get(url, timeout=60)
-    r.raise_for_status()
-    transaction_json = json.loads(r.text)
-    transaction_json = json.loads(transaction_json)
+    transaction_json = parse_transaction_payload(get_json(API_URL))
+    logging.info("✅ Transaction bancaire récupérée")
+    return transaction_json
+
+
+async def get_transaction_async() -> dict:
+    """
+    Version asynchrone de get_transaction (client HTTP partagé, non bloquant).
+    """
+    transaction_json = parse_transaction_payload(await get_json_async(API_URL))
     logging.info("✅ Transaction bancaire récupérée")
     return transaction_json
 
@@ -78,18 +129,345 @@ def save_transaction_to_s3(transaction_json: dict, timestamp: str) -> str:
         ContentEncoding='utf-8'
     )
     logging.info(f"✅ Raw transaction envoyée sur s3://{S3_BUCKET}/{raw_key}")
-    
+    return raw_key
+
+
+class RawBatchWriter:
+    """
+    Accumule les transactions brutes et les écrit dans S3 par lots, en NDJSON compressé,
+    sous des clés partitionnées par date/heure :
+    data/raw/date=YYYY-MM-DD/hour=HH/<timestamp>_<id>.ndjson.gz
+
+    Un lot est envoyé quand il dépasse max_bytes (non compressé) ou quand il est
+    ouvert depuis plus de max_seconds. close() envoie les lots restants.
+
+    Un lot en échec est remis en attente tant que le volume en attente reste sous
+    retry_max_bytes ; sinon (ou s'il échoue pendant close()) il est abandonné et
+    compté dans `dropped`.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RAW_BATCH_MAX_BYTES,
+        max_seconds: float = RAW_BATCH_MAX_SECONDS,
+        compression: str = RAW_BATCH_COMPRESSION,
+        retry_max_bytes: int = RAW_RETRY_MAX_BYTES,
+    ):
+        if compression == "zstd" and zstandard is None:
+            logging.warning("⚠️ zstandard non installé, compression gzip utilisée pour la couche raw")
+            compression = "gzip"
+        if compression not in ("gzip", "zstd"):
+            raise ValueError(f"Compression non supportée : {compression}")
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compression = compression
+        self.retry_max_bytes = retry_max_bytes
+        # Nombre de transactions abandonnées après un échec d'envoi
+        self.dropped = 0
+        # partition -> {"lines": [...], "size": octets, "opened_at": time.monotonic(), "first": timestamp}
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._flush_expired, name="raw-writer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def partition_for(timestamp: str) -> str:
+        ts = datetime.strptime(timestamp[:15], "%Y%m%d-%H%M%S")
+        return f"date={ts:%Y-%m-%d}/hour={ts:%H}"
+
+    def add(self, transaction_json: dict, timestamp: str):
+        line = json.dumps({"timestamp": timestamp, "transaction": transaction_json}, ensure_ascii=False, separators=(",", ":"))
+        line = (line + "\n").encode("utf-8")
+        partition = self.partition_for(timestamp)
+        with self._lock:
+            batch = self._batches.setdefault(
+                partition, {"lines": [], "size": 0, "opened_at": time.monotonic(), "first": timestamp}
+            )
+            batch["lines"].append(line)
+            batch["size"] += len(line)
+            full = batch["size"] >= self.max_bytes
+            if full:
+                del self._batches[partition]
+        if full:
+            self._upload(partition, batch)
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().compress(data)
+        return gzip.compress(data)
+
+    def _upload(self, partition: str, batch: dict, requeue: bool = True):
+        extension = "zst" if self.compression == "zstd" else "gz"
+        raw_key = f"{RAW_PREFIX}/{partition}/{batch['first']}_{uuid.uuid4().hex[:8]}.ndjson.{extension}"
+        try:
+            s3_client.put_object(
+                Bucket=S3_BUCKET,
+                Key=raw_key,
+                Body=self._compress(b"".join(batch["lines"])),
+                ContentType="application/x-ndjson",
+                ContentEncoding=self.compression,
+            )
+            logging.info(f"✅ Lot de {len(batch['lines'])} transactions raw envoyé sur s3://{S3_BUCKET}/{raw_key}")
+        except Exception as e:
+            # On remet le lot en attente pour le prochain envoi
+            logging.error(f"❌ Erreur lors de l'envoi du lot raw sur S3 : {e}")
+            if not requeue:
+                self._drop(batch, "échec pendant l'arrêt")
+                return
+            with self._lock:
+                pending = sum(current["size"] for current in self._batches.values())
+                keep = pending + batch["size"] <= self.retry_max_bytes
+                if keep:
+                    current = self._batches.get(partition)
+                    if current is None:
+                        self._batches[partition] = batch
+                    else:
+                        current["lines"] = batch["lines"] + current["lines"]
+                        current["size"] += batch["size"]
+            if not keep:
+                self._drop(batch, "tampon de reprise plein")
+
+    def _drop(self, batch: dict, reason: str):
+        self.dropped += len(batch["lines"])
+        logging.error(
+            f"🗑️ {len(batch['lines'])} transactions raw perdues ({reason}), {self.dropped} au total"
+        )
+
+    def _take(self, expired_only: bool) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            partitions = [
+                partition for partition, batch in self._batches.items()
+                if not expired_only or now - batch["opened_at"] >= self.max_seconds
+            ]
+            return {partition: self._batches.pop(partition) for partition in partitions}
+
+    def flush(self, expired_only: bool = False, requeue: bool = True):
+        for partition, batch in self._take(expired_only).items():
+            self._upload(partition, batch, requeue)
+
+    def _flush_expired(self):
+        while not self._stop_event.wait(1):
+            self.flush(expired_only=True)
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        # Dernier essai : un lot en échec n'a plus de prochain envoi, il est compté comme perdu
+        self.flush(requeue=False)
+
+
+_raw_writer = None
+_raw_writer_lock = threading.Lock()
+
+
+def get_raw_writer() -> RawBatchWriter:
+    """
+    Writer raw partagé par le process, vidé automatiquement à la sortie.
+    """
+    global _raw_writer
+    if _raw_writer is None:
+        with _raw_writer_lock:
+            if _raw_writer is None:
+                _raw_writer = RawBatchWriter()
+                atexit.register(_raw_writer.close)
+    return _raw_writer
+
+
+def close_raw_writer():
+    if _raw_writer is not None:
+        _raw_writer.close()
+
+
+def save_raw_transaction(transaction_json: dict, timestamp: str):
+    """
+    Sauvegarde la transaction brute selon RAW_WRITE_MODE (objet unitaire ou lot NDJSON).
+    """
+    if RAW_WRITE_MODE == "batch":
+        get_raw_writer().add(transaction_json, timestamp)
+    else:
+        save_transaction_to_s3(transaction_json, timestamp)
+
 
 
 def extract_transaction() -> tuple[dict, str]:
     """
     Étape complète d'extraction :
     - appelle l'API de transactions bancaires
+    - écarte les transactions déjà vues (avant toute écriture)
     - sauvegarde la transaction JSON en raw S3
-    Retourne (transaction, timestamp).
+    Retourne (transaction, timestamp), ou (None, None) si la transaction est un doublon.
     """
-    transaction = get_transaction()
+    transaction = drop_duplicate_transaction(get_transaction())
+    if transaction is None:
+        dropped = get_seen_transactions().dropped
+        logging.info(f"⏭️ Transaction déjà traitée, ignorée ({dropped} doublons écartés au total)")
+        return None, None
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    save_transaction_to_s3(transaction, timestamp)
+    save_raw_transaction(transaction, timestamp)
     return transaction, timestamp
 
+
+
+class AdaptiveConcurrency:
+    """
+    Limite de concurrence adaptative (AIMD) pour les appels à l'API de transactions.
+
+    Toutes les `window` réponses, si la latence moyenne et le taux d'erreur restent
+    sous les seuils, la limite augmente de 1 ; sinon elle est divisée par 2.
+    """
+
+    def __init__(
+        self,
+        max_limit: int = EXTRACT_MAX_CONCURRENCY,
+        latency_target: float = EXTRACT_LATENCY_TARGET,
+        error_rate_max: float = EXTRACT_ERROR_RATE_MAX,
+        window: int = 10,
+    ):
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.error_rate_max = error_rate_max
+        self.window = window
+        self.limit = 1
+        self._latencies = deque(maxlen=window)
+        self._errors = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool):
+        self._latencies.append(latency)
+        self._errors.append(0 if ok else 1)
+        if len(self._errors) < self.window:
+            return
+        avg_latency = sum(self._latencies) / len(self._latencies)
+        error_rate = sum(self._errors) / len(self._errors)
+        if avg_latency > self.latency_target or error_rate > self.error_rate_max:
+            self.limit = max(1, self.limit // 2)
+            logging.warning(
+                f"⚠️ API lente ou en erreur (latence {avg_latency:.2f}s, erreurs {error_rate:.0%}), "
+                f"concurrence réduite à {self.limit}"
+            )
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+        self._latencies.clear()
+        self._errors.clear()
+
+
+async def stream_transactions_async(
+    target_rate: float = EXTRACT_TARGET_RATE,
+    max_concurrency: int = EXTRACT_MAX_CONCURRENCY,
+):
+    """
+    Générateur asynchrone de (transaction, timestamp) alimenté par plusieurs appels
+    concurrents à l'API, cadencés à `target_rate` transactions/s.
+    La concurrence s'adapte à la latence et au taux d'erreur de l'API.
+    """
+    loop = asyncio.get_running_loop()
+    controller = AdaptiveConcurrency(max_limit=max_concurrency)
+    results = asyncio.Queue(maxsize=max_concurrency * 2)
+    tasks = set()
+
+    async def fetch():
+        start = loop.time()
+        try:
+            transaction = await get_transaction_async()
+        except Exception as e:
+            controller.record(loop.time() - start, ok=False)
+            logging.error(f"❌ Erreur lors de la récupération d'une transaction : {e}")
+            return
+        controller.record(loop.time() - start, ok=True)
+        transaction = drop_duplicate_transaction(transaction)
+        if transaction is None:
+            return
+        # Microsecondes dans le timestamp : plusieurs transactions peuvent arriver dans la même seconde
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        await results.put((transaction, timestamp))
+
+    async def dispatch():
+        interval = 1 / target_rate
+        next_start = loop.time()
+        while True:
+            if len(tasks) >= controller.limit:
+                # Attendre qu'un appel en cours se termine
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            task = asyncio.create_task(fetch())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_start = max(next_start + interval, loop.time())
+            await asyncio.sleep(next_start - loop.time())
+
+    dispatcher = asyncio.create_task(dispatch())
+    try:
+        while True:
+            yield await results.get()
+    finally:
+        dispatcher.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+def iter_transactions(
+    target_rate: float = EXTRACT_TARGET_RATE,
+    max_concurrency: int = EXTRACT_MAX_CONCURRENCY,
+    stop_event: threading.Event = None,
+):
+    """
+    Version synchrone de stream_transactions_async : la boucle asyncio tourne dans
+    un thread dédié et les (transaction, timestamp) sont transmis par une file bornée.
+    L'itération s'arrête quand `stop_event` est positionné.
+    """
+    stop_event = stop_event or threading.Event()
+    consumer_closed = threading.Event()
+    out = queue.Queue(maxsize=max_concurrency * 2)
+    end = object()
+
+    async def pump():
+        async for item in stream_transactions_async(target_rate, max_concurrency):
+            # File pleine : le consommateur est en retard, on ralentit les producteurs
+            while True:
+                if stop_event.is_set():
+                    return
+                try:
+                    out.put_nowait(item)
+                    break
+                except queue.Full:
+                    await asyncio.sleep(0.05)
+
+    async def run():
+        producer = asyncio.create_task(pump())
+        waiter = asyncio.create_task(asyncio.to_thread(stop_event.wait))
+        await asyncio.wait({producer, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.error(f"❌ Arrêt de l'extraction concurrente : {e}")
+        stop_event.set()
+        await waiter
+        await close_async_client()
+
+    def runner():
+        try:
+            asyncio.run(run())
+        finally:
+            # Signaler la fin au consommateur (sauf s'il a déjà arrêté d'itérer)
+            while not consumer_closed.is_set():
+                try:
+                    out.put(end, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    thread = threading.Thread(target=runner, name="extract-producers", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = out.get()
+            if item is end:
+                return
+            yield item
+    finally:
+        consumer_closed.set()
+        stop_event.set()
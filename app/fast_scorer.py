@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+from pathlib import Path
+
+import numpy as np
+import xgboost as xgb
+import logging
+# Rendre les modules du dossier app importables (exécution directe ou via le package app)
+sys.path.insert(0, str(Path(__file__).parent))
+from model_features import derived_features
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# Emplacement des fichiers du scorer rapide dans les artefacts du run MLflow
+FAST_SCORER_ARTIFACT_PATH = "fast_scorer"
+SPEC_FILE = "spec.json"
+BOOSTER_FILE = "booster.json"
+SPEC_FORMAT_VERSION = 1
+
+def build_scorer_spec(pipeline) -> tuple:
+    """
+    Extrait d'un Pipeline entraîné (voir train/train.py) les tables nécessaires au scorer rapide :
+    index des colonnes one-hot, constantes du StandardScaler et booster XGBoost.
+    Retourne (spec, booster).
+    """
+    preprocessor = pipeline.named_steps["features_preprocessing"]
+    classifier = pipeline.steps[-1][1]
+    blocks = []
+    n_features = 0
+    # Les blocs sont dans l'ordre des colonnes produites par le ColumnTransformer
+    for name, transformer, columns in preprocessor.transformers_:
+        if isinstance(transformer, str):
+            if transformer == "drop" or len(columns) == 0:
+                continue
+            raise ValueError(f"Transformateur non supporté par le scorer rapide : {name}={transformer}")
+        if hasattr(transformer, "categories_"):
+            drop_idx = transformer.drop_idx_
+            for i, column in enumerate(columns):
+                categories = [str(category) for category in transformer.categories_[i]]
+                dropped = None if drop_idx is None or drop_idx[i] is None else int(drop_idx[i])
+                blocks.append({"type": "onehot", "name": column, "categories": categories, "drop_idx": dropped})
+                n_features += len(categories) - (dropped is not None)
+        elif hasattr(transformer, "scale_"):
+            for i, column in enumerate(columns):
+                blocks.append({
+                    "type": "scale",
+                    "name": column,
+                    "mean": float(transformer.mean_[i]) if transformer.mean_ is not None else 0.0,
+                    "scale": float(transformer.scale_[i]) if transformer.scale_ is not None else 1.0,
+                })
+                n_features += 1
+        else:
+            raise ValueError(f"Transformateur non supporté par le scorer rapide : {name}")
+
+    booster = classifier.get_booster()
+    if booster.num_features() != n_features:
+        raise ValueError(f"Nombre de features incohérent : {n_features} (préprocessing) ≠ {booster.num_features()} (booster)")
+    spec = {
+        "format_version": SPEC_FORMAT_VERSION,
+        "n_features": n_features,
+        # Sortie creuse : XGBoost traite les zéros implicites comme des valeurs manquantes
+        "sparse_input": bool(getattr(preprocessor, "sparse_output_", False)),
+        "blocks": blocks,
+    }
+    return spec, booster
+
+
+class FastScorer:
+    """
+    Scorer sans DataFrame : transforme directement une transaction (dict) en vecteur
+    NumPy à partir des tables exportées à l'entraînement, puis appelle
+    l'inplace_predict du booster XGBoost.
+
+    Expose predict_proba / predict comme le Pipeline scikit-learn.
+    """
+
+    def __init__(self, spec: dict, booster: xgb.Booster):
+        if spec.get("format_version") != SPEC_FORMAT_VERSION:
+            raise ValueError(f"Version de spec non supportée : {spec.get('format_version')}")
+        self.spec = spec
+        self.booster = booster
+        self.n_features = spec["n_features"]
+        self._fill = np.nan if spec["sparse_input"] else 0.0
+        # Tables précalculées : catégorie → index de colonne (None pour la catégorie supprimée)
+        self._onehot = []
+        self._scaled = []
+        offset = 0
+        for block in spec["blocks"]:
+            if block["type"] == "onehot":
+                index = {}
+                position = offset
+                for i, category in enumerate(block["categories"]):
+                    if i == block["drop_idx"]:
+                        index[category] = None
+                    else:
+                        index[category] = position
+                        position += 1
+                self._onehot.append((block["name"], index))
+                offset = position
+            else:
+                self._scaled.append((block["name"], offset, block["mean"], block["scale"]))
+                offset += 1
+
+    @classmethod
+    def load(cls, directory: str) -> "FastScorer":
+        with open(os.path.join(directory, SPEC_FILE), "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(directory, BOOSTER_FILE))
+        return cls(spec, booster)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, SPEC_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.spec, f)
+        self.booster.save_model(os.path.join(directory, BOOSTER_FILE))
+
+    def _fill_row(self, row: np.ndarray, record: dict):
+        features = derived_features(record)
+        for name, index in self._onehot:
+            value = str(features[name])
+            if value not in index:
+                # Même comportement que OneHotEncoder(handle_unknown='error')
+                raise ValueError(f"Catégorie inconnue pour {name} : {value}")
+            position = index[value]
+            if position is not None:
+                row[position] = 1.0
+        for name, position, mean, scale in self._scaled:
+            value = (float(features[name]) - mean) / scale
+            # Une valeur nulle est implicite dans une matrice creuse, donc manquante pour XGBoost
+            if value != 0.0:
+                row[position] = value
+
+    def vectorize(self, records: list) -> np.ndarray:
+        """
+        Matrice (n_transactions, n_features) équivalente à la sortie du ColumnTransformer.
+        """
+        matrix = np.full((len(records), self.n_features), self._fill, dtype=np.float32)
+        for row, record in zip(matrix, records):
+            self._fill_row(row, record)
+        return matrix
+
+    def score_record(self, record: dict) -> float:
+        """
+        Probabilité de fraude d'une seule transaction.
+        """
+        return float(self.booster.inplace_predict(self.vectorize([record]), missing=np.nan)[0])
+
+    def predict_proba(self, features) -> np.ndarray:
+        """
+        Même sortie que Pipeline.predict_proba : colonnes (non fraude, fraude).
+        features : DataFrame ou liste de dicts.
+        """
+        records = features.to_dict(orient="records") if hasattr(features, "to_dict") else list(features)
+        probas = np.asarray(self.booster.inplace_predict(self.vectorize(records), missing=np.nan), dtype=np.float64)
+        return np.column_stack([1 - probas, probas])
+
+    def predict(self, features) -> np.ndarray:
+        return (self.predict_proba(features)[:, 1] > 0.5).astype(int)
@@ -0,0 +1,128 @@
+import os
+import random
+import time
+import asyncio
+import threading
+
+import httpx
+from dotenv import find_dotenv, load_dotenv
+import logging
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+env_path = find_dotenv()
+load_dotenv(env_path, override=True)
+
+# === Configuration du pool de connexions HTTP ===
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+# Nombre de nouvelles tentatives après un échec, et bornes du backoff (en secondes)
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "10"))
+
+# Codes HTTP pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_client_loop = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Délai avant la tentative suivante : backoff exponentiel avec "full jitter".
+    """
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def _should_retry(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def get_client() -> httpx.Client:
+    """
+    Client HTTP synchrone partagé par le process (connexions keep-alive réutilisées).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(limits=_limits(), timeout=_timeout())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Client HTTP asynchrone partagé, lié à la boucle d'événements courante.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_client():
+    """
+    Ferme le client asynchrone partagé (à appeler à l'arrêt de l'application).
+    """
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+    _async_client, _async_client_loop = None, None
+
+
+def get_json(url: str, retries: int = HTTP_RETRIES):
+    """
+    GET synchrone avec nouvelles tentatives, retourne le corps JSON décodé.
+    """
+    for attempt in range(retries + 1):
+        try:
+            r = get_client().get(url)
+            r.raise_for_status()
+            return r.json()
+        except Exception as e:
+            if attempt == retries or not _should_retry(e):
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"⚠️ Échec de l'appel à {url} ({e}), nouvelle tentative dans {delay:.2f}s")
+            time.sleep(delay)
+
+
+async def get_json_async(url: str, retries: int = HTTP_RETRIES):
+    """
+    GET asynchrone (non bloquant pour la boucle d'événements) avec nouvelles tentatives.
+    """
+    for attempt in range(retries + 1):
+        try:
+            r = await get_async_client().get(url)
+            r.raise_for_status()
+            return r.json()
+        except Exception as e:
+            if attempt == retries or not _should_retry(e):
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"⚠️ Échec de l'appel à {url} ({e}), nouvelle tentative dans {delay:.2f}s")
+            await asyncio.sleep(delay)
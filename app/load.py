@@ -1,11 +1,23 @@
 import os
+import io
+import sys
+import time
+import atexit
+import threading
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from pathlib import Path
 
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from psycopg2.extras import execute_values
-from sqlalchemy import create_engine, text
 import pandas as pd
 from dotenv import find_dotenv, load_dotenv
+# Rendre les modules du dossier app importables (exécution directe ou via le package app)
+sys.path.insert(0, str(Path(__file__).parent))
+from migrations import apply_migrations, ensure_future_partitions, drop_partitions_older_than, ROLLUP_AGGREGATES_SQL
+from dedup import forget_trans_nums
 
 import logging
 
@@ -17,51 +29,146 @@ env_path = find_dotenv()
 load_dotenv(env_path, override=True)
 
 DATABASE_URL = os.getenv("BACKEND_STORE_URI")
+# Taille du pool de connexions Postgres partagé par le process
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+# Une connexion inutilisée depuis plus de N secondes est vérifiée (SELECT 1) avant d'être réutilisée
+PG_POOL_HEALTHCHECK_IDLE = float(os.getenv("PG_POOL_HEALTHCHECK_IDLE", "30"))
+# Rétention des prédictions en mois (0 = pas de suppression) : les partitions plus anciennes sont supprimées
+PREDICTIONS_RETENTION_MONTHS = int(os.getenv("PREDICTIONS_RETENTION_MONTHS", "0"))
+# Comportement quand une prédiction existe déjà pour le même trans_num :
+# "ignore" (la ligne existante est conservée), "update" (elle est remplacée) ou "error"
+PREDICTIONS_CONFLICT_MODE = os.getenv("PREDICTIONS_CONFLICT_MODE", "ignore")
+# Écriture asynchrone (write-behind) : taille d'un lot, délai maximal avant écriture (en secondes)
+# et nombre maximal de lignes en attente (au-delà, les producteurs attendent)
+DB_WRITER_BATCH_SIZE = int(os.getenv("DB_WRITER_BATCH_SIZE", "500"))
+DB_WRITER_FLUSH_SECONDS = float(os.getenv("DB_WRITER_FLUSH_SECONDS", "2"))
+DB_WRITER_MAX_BUFFERED = int(os.getenv("DB_WRITER_MAX_BUFFERED", "10000"))
+# Nombre maximal de tentatives d'écriture d'un lot quand la base est injoignable (erreurs transitoires)
+DB_WRITER_MAX_ATTEMPTS = int(os.getenv("DB_WRITER_MAX_ATTEMPTS", "5"))
+
+# Erreurs transitoires (connexion perdue, base indisponible) : le lot est rejoué.
+# Les autres erreurs (données invalides, contrainte...) échoueraient à chaque tentative.
+RETRYABLE_DB_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+_pool = None
+_pool_lock = threading.Lock()
+# Limite le nombre de connexions empruntées : au-delà, on attend qu'une connexion soit rendue
+_pool_slots = threading.BoundedSemaphore(PG_POOL_MAX_SIZE)
+_last_used = {}
 
 
 def pg_connect():
     return psycopg2.connect(DATABASE_URL)
 
 
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Pool de connexions Postgres partagé par le process (créé au premier appel).
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE, DATABASE_URL)
+                logging.info(f"✅ Pool de connexions Postgres créé ({PG_POOL_MIN_SIZE}-{PG_POOL_MAX_SIZE} connexions)")
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < PG_POOL_HEALTHCHECK_IDLE:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout(pool: ThreadedConnectionPool):
+    # Les connexions cassées (coupure réseau, redémarrage du serveur) sont fermées et remplacées
+    for _ in range(PG_POOL_MAX_SIZE + 1):
+        conn = pool.getconn()
+        if _is_healthy(conn):
+            return conn
+        logging.warning("⚠️ Connexion Postgres invalide, reconnexion...")
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("Impossible d'obtenir une connexion Postgres valide")
+
+
+@contextmanager
+def pg_connection():
+    """
+    Emprunte une connexion au pool : commit en sortie, rollback en cas d'erreur.
+    La connexion est fermée au lieu d'être rendue au pool si elle est cassée.
+    """
+    with _pool_slots:
+        pool = get_pool()
+        conn = _checkout(pool)
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            broken = conn.closed or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            raise
+        finally:
+            if broken:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=broken)
+
+
+def run_migrations() -> int:
+    """
+    Met le schéma des prédictions à jour (migrations versionnées, voir migrations.py).
+    À appeler une seule fois au démarrage du worker, pas à chaque transaction.
+    """
+    with pg_connection() as conn:
+        version = apply_migrations(conn)
+    maintain_partitions()
+    return version
+
+
+def maintain_partitions(retention_months: int = PREDICTIONS_RETENTION_MONTHS):
+    """
+    Crée les partitions mensuelles à venir et, si une rétention est configurée,
+    supprime les partitions trop anciennes (suppression d'une table entière, sans DELETE).
+    """
+    with pg_connection() as conn, conn.cursor() as cur:
+        ensure_future_partitions(cur)
+        if retention_months > 0:
+            dropped = drop_partitions_older_than(cur, retention_months)
+            if dropped:
+                logging.info(f"🗑️ Partitions supprimées (rétention {retention_months} mois) : {', '.join(dropped)}")
+
+
 def ensure_predictions_table_exists():
     """
-    Crée la table fraud_transaction_predictions si elle n'existe pas.
-    """
-    engine = create_engine(DATABASE_URL)
-
-    ddl_fraud_pred = """
-    CREATE TABLE IF NOT EXISTS public.fraud_transaction_predictions (
-        id SERIAL PRIMARY KEY,
-        cc_num BIGINT,
-        trans_date_trans_time TIMESTAMP,
-        merchant VARCHAR,
-        category VARCHAR,
-        amt NUMERIC,
-        first_name VARCHAR,
-        last_name VARCHAR,
-        gender VARCHAR,
-        street VARCHAR,
-        city VARCHAR,
-        state VARCHAR,
-        zip VARCHAR,
-        lat NUMERIC,
-        long NUMERIC,
-        city_pop INTEGER,
-        job VARCHAR,
-        dob DATE,
-        trans_num VARCHAR,
-        merch_lat NUMERIC,
-        merch_long NUMERIC,
-        unix_time NUMERIC,
-        is_fraud INTEGER,
-        fraud_pred INTEGER,
-        fraud_proba NUMERIC,
-        created_at TIMESTAMP
-    );
-    """
-
-    with engine.begin() as conn:
-        conn.execute(text(ddl_fraud_pred))
+    Crée la table fraud_transaction_predictions si elle n'existe pas
+    (conservée pour compatibilité : applique les migrations du schéma).
+    """
+    run_migrations()
 
 
 def build_db_rows(
@@ -111,19 +218,408 @@ def build_db_rows(
     return rows
 
 
-def insert_predictions(rows):
+# Colonnes de fraud_transaction_predictions alimentées par le pipeline (ordre d'insertion)
+DB_COLUMNS = [
+    "cc_num", "trans_date_trans_time", "merchant", "category", "amt", "first_name", "last_name", "gender",
+    "street", "city", "state", "zip", "lat", "long", "city_pop", "job", "dob", "trans_num", "merch_lat",
+    "merch_long", "unix_time", "is_fraud", "fraud_pred", "fraud_proba", "created_at",
+]
+
+
+# Ajoute aux agrégats horaires les lignes renvoyées par le CTE "inserted"
+ROLLUP_UPSERT_SQL = f"""
+    INSERT INTO public.fraud_hourly_rollup AS r
+    (bucket_hour, category, tx_count, fraud_count, amt_sum, fraud_amt_sum, actual_fraud_count)
+    {ROLLUP_AGGREGATES_SQL.format(source="inserted", where="")}
+    ON CONFLICT (bucket_hour, category) DO UPDATE SET
+        tx_count = r.tx_count + EXCLUDED.tx_count,
+        fraud_count = r.fraud_count + EXCLUDED.fraud_count,
+        amt_sum = r.amt_sum + EXCLUDED.amt_sum,
+        fraud_amt_sum = r.fraud_amt_sum + EXCLUDED.fraud_amt_sum,
+        actual_fraud_count = r.actual_fraud_count + EXCLUDED.actual_fraud_count
+"""
+
+
+# Clé d'unicité d'une prédiction, réservée dans fraud_transaction_keys (voir migration 6)
+CONFLICT_KEY = "trans_num"
+
+
+def claim_keys_sql(source: str, mode: str = PREDICTIONS_CONFLICT_MODE) -> str:
     """
-    Insère les lignes de prédiction dans la table fraud_transaction_predictions.
+    Requête qui réserve dans fraud_transaction_keys les clés (trans_num, trans_date_trans_time)
+    fournies par `source` (VALUES %s ou SELECT) et retourne les trans_num à écrire :
+    "ignore" : uniquement les nouveaux, "update" : tous (la date de la clé est mise à jour),
+    "error" : un trans_num déjà présent lève une erreur d'unicité.
+    La clé réservée reste verrouillée jusqu'au commit : deux workers ne peuvent pas
+    écrire la même transaction, même avec des trans_date_trans_time différents.
+    """
+    target = f"ON CONFLICT ({CONFLICT_KEY})"
+    if mode == "ignore":
+        clause = f"{target} DO NOTHING"
+    elif mode == "update":
+        clause = f"{target} DO UPDATE SET trans_date_trans_time = EXCLUDED.trans_date_trans_time"
+    elif mode == "error":
+        clause = ""
+    else:
+        raise ValueError(f"Mode de conflit inconnu : {mode} (attendu ignore, update ou error)")
+    return f"""
+    INSERT INTO public.fraud_transaction_keys (trans_num, trans_date_trans_time)
+    {source}
+    {clause}
+    RETURNING trans_num;
+    """
+
+
+def insert_with_rollup_sql(source: str, mode: str = PREDICTIONS_CONFLICT_MODE) -> str:
+    """
+    Requête qui insère les prédictions fournies par `source` (VALUES %s ou SELECT)
+    et met à jour fraud_hourly_rollup dans la même instruction.
+    Les doublons sont écartés avant, par claim_keys_sql. En mode "update", les lignes
+    remplacées ont été supprimées et ne peuvent pas être décomptées par différence :
+    la requête retourne alors les heures touchées, recalculées ensuite par _refresh_rollup_hours.
+    """
+    columns = ", ".join(DB_COLUMNS)
+    if mode == "update":
+        return f"""
+        INSERT INTO public.fraud_transaction_predictions ({columns})
+        {source}
+        RETURNING date_trunc('hour', trans_date_trans_time);
+        """
+    return f"""
+    WITH inserted AS (
+        INSERT INTO public.fraud_transaction_predictions ({columns})
+        {source}
+        RETURNING trans_date_trans_time, category, amt, fraud_pred, is_fraud
+    )
+    {ROLLUP_UPSERT_SQL};
+    """
+
+
+def _delete_replaced(cur, trans_nums: list) -> list:
+    """
+    Mode "update" : supprime les prédictions existantes des trans_num donnés
+    et retourne leurs heures, à recalculer dans les agrégats.
+    """
+    cur.execute(
+        """
+        DELETE FROM public.fraud_transaction_predictions
+        WHERE trans_num = ANY(%s)
+        RETURNING date_trunc('hour', trans_date_trans_time)
+        """,
+        (trans_nums,),
+    )
+    return [hour for (hour,) in cur.fetchall()]
+
+
+def _refresh_rollup_hours(cur, hours):
+    """
+    Recalcule fraud_hourly_rollup pour les heures données, dans la transaction courante.
+    """
+    hours = sorted(set(hours))
+    if not hours:
+        return
+    cur.execute("DELETE FROM public.fraud_hourly_rollup WHERE bucket_hour = ANY(%s)", (hours,))
+    where = (
+        "WHERE trans_date_trans_time >= %s AND trans_date_trans_time < %s + interval '1 hour'"
+        " AND date_trunc('hour', trans_date_trans_time) = ANY(%s)"
+    )
+    cur.execute(
+        f"""
+        INSERT INTO public.fraud_hourly_rollup
+        (bucket_hour, category, tx_count, fraud_count, amt_sum, fraud_amt_sum, actual_fraud_count)
+        {ROLLUP_AGGREGATES_SQL.format(source="public.fraud_transaction_predictions", where=where)}
+        """,
+        (hours[0], hours[-1], hours),
+    )
+
+
+def _dedupe_rows(rows: list) -> list:
+    """
+    Garde la dernière ligne pour chaque trans_num :
+    ON CONFLICT DO UPDATE refuse de modifier deux fois la même clé dans une instruction.
+    """
+    key_index = DB_COLUMNS.index(CONFLICT_KEY)
+    unique = {}
+    for row in rows:
+        unique[row[key_index]] = row
+    return list(unique.values())
+
+
+def is_fraud_from_transaction(transaction_json: dict) -> list:
+    """
+    Valeurs de 'is_fraud' pour chaque ligne d'une réponse de l'API de transactions.
+    """
+    index_is_fraud = transaction_json['columns'].index('is_fraud')
+    return [row[index_is_fraud] for row in transaction_json['data']]
+
+
+def build_db_frame(pred_df: pd.DataFrame, is_fraud) -> pd.DataFrame:
+    """
+    Version vectorisée de build_db_rows : construit, colonne par colonne, un DataFrame
+    au format de la table (colonnes DB_COLUMNS), sans boucle Python sur les lignes.
+    is_fraud est une valeur unique ou une valeur par ligne de pred_df.
+    """
+    db_df = pd.DataFrame(
+        {
+            "cc_num": pred_df["cc_num"].astype("int64"),
+            "trans_date_trans_time": pd.to_datetime(pred_df["trans_date_trans_time"], format="%Y-%m-%d %H:%M:%S"),
+            "merchant": pred_df["merchant"].astype(str),
+            "category": pred_df["category"].astype(str),
+            "amt": pred_df["amt"].astype("float64"),
+            "first_name": pred_df["first"].astype(str),
+            "last_name": pred_df["last"].astype(str),
+            "gender": pred_df["gender"].astype(str),
+            "street": pred_df["street"].astype(str),
+            "city": pred_df["city"].astype(str),
+            "state": pred_df["state"].astype(str),
+            "zip": pred_df["zip"].astype(str),
+            "lat": pred_df["lat"].astype("float64"),
+            "long": pred_df["long"].astype("float64"),
+            "city_pop": pred_df["city_pop"].astype("int64"),
+            "job": pred_df["job"].astype(str),
+            "dob": pred_df["dob"].astype(str),
+            "trans_num": pred_df["trans_num"].astype(str),
+            "merch_lat": pred_df["merch_lat"].astype("float64"),
+            "merch_long": pred_df["merch_long"].astype("float64"),
+            "unix_time": pred_df["unix_time"].astype("float64"),
+            "fraud_pred": pred_df["fraud_pred"].astype("int64"),
+            "fraud_proba": pred_df["fraud_proba"].astype("float64"),
+        },
+        index=pred_df.index,
+    )
+    db_df["is_fraud"] = is_fraud if pd.api.types.is_scalar(is_fraud) else list(is_fraud)
+    db_df["is_fraud"] = db_df["is_fraud"].astype("int64")
+    db_df["created_at"] = datetime.now(timezone.utc)
+    return db_df[DB_COLUMNS]
+
+
+def copy_predictions(db_df: pd.DataFrame, mode: str = PREDICTIONS_CONFLICT_MODE) -> int:
+    """
+    Chargement en masse avec COPY ... FROM STDIN (format CSV) dans fraud_transaction_predictions.
+    db_df doit avoir les colonnes DB_COLUMNS (voir build_db_frame). Retourne le nombre de lignes
+    lues ; les doublons de trans_num sont traités selon `mode` (voir PREDICTIONS_CONFLICT_MODE).
+    """
+    if db_df.empty:
+        return 0
+    buffer = io.StringIO()
+    db_df[DB_COLUMNS].to_csv(buffer, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S.%f%z")
+    buffer.seek(0)
+    columns = ", ".join(DB_COLUMNS)
+    # COPY dans une table temporaire, puis insertion + mise à jour des agrégats en une instruction
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE predictions_staging ON COMMIT DROP AS
+            SELECT {columns} FROM public.fraud_transaction_predictions WITH NO DATA
+            """
+        )
+        cur.copy_expert(f"COPY predictions_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        # Une seule ligne par trans_num au sein du lot (la dernière lue)
+        cur.execute(
+            f"""
+            DELETE FROM predictions_staging a
+            USING predictions_staging b
+            WHERE a.{CONFLICT_KEY} = b.{CONFLICT_KEY} AND a.ctid < b.ctid
+            """
+        )
+        cur.execute(claim_keys_sql(f"SELECT {CONFLICT_KEY}, trans_date_trans_time FROM predictions_staging", mode))
+        claimed = [trans_num for (trans_num,) in cur.fetchall()]
+        cur.execute(f"DELETE FROM predictions_staging WHERE NOT ({CONFLICT_KEY} = ANY(%s))", (claimed,))
+        replaced_hours = _delete_replaced(cur, claimed) if mode == "update" else []
+        cur.execute(insert_with_rollup_sql(f"SELECT {columns} FROM predictions_staging", mode))
+        if mode == "update":
+            _refresh_rollup_hours(cur, replaced_hours + [hour for (hour,) in cur.fetchall()])
+    logging.info(f"✅ {len(db_df)} lignes chargées en base par COPY.")
+    return len(db_df)
+
+
+def bulk_load_predictions(pred_df: pd.DataFrame, is_fraud, mode: str = PREDICTIONS_CONFLICT_MODE) -> int:
     """
-    insert_sql = """
-    INSERT INTO public.fraud_transaction_predictions
-    (cc_num,trans_date_trans_time,merchant,category,amt,first_name,last_name,gender,street,city,state,zip,lat,long,
-    city_pop,job,dob,trans_num,merch_lat,merch_long,unix_time,is_fraud,fraud_pred,fraud_proba,created_at)
-    VALUES %s;
+    Chargement en masse d'un DataFrame de prédictions (backfill, traitements par lots).
     """
+    return copy_predictions(build_db_frame(pred_df, is_fraud), mode)
 
-    with pg_connect() as conn, conn.cursor() as cur:
+
+def insert_predictions(rows, mode: str = PREDICTIONS_CONFLICT_MODE):
+    """
+    Insère les lignes de prédiction dans la table fraud_transaction_predictions.
+    Une prédiction déjà en base (même trans_num) est ignorée ou remplacée selon `mode` :
+    rejouer un lot après un échec ne crée pas de doublon.
+    """
+    # Insertion et mise à jour des agrégats horaires (fraud_hourly_rollup) dans la même instruction
+    insert_sql = insert_with_rollup_sql("VALUES %s", mode)
+    key_index = DB_COLUMNS.index(CONFLICT_KEY)
+    time_index = DB_COLUMNS.index("trans_date_trans_time")
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        if rows:
+            rows = _dedupe_rows(rows)
+            # Réservation des trans_num, puis une seule instruction pour les lignes à écrire
+            claimed = execute_values(
+                cur, claim_keys_sql("VALUES %s", mode),
+                [(row[key_index], row[time_index]) for row in rows], page_size=len(rows), fetch=True,
+            )
+            claimed = {trans_num for (trans_num,) in claimed}
+            rows = [row for row in rows if row[key_index] in claimed]
         if rows:
-            execute_values(cur, insert_sql, rows)
-        conn.commit()
+            replaced_hours = _delete_replaced(cur, list(claimed)) if mode == "update" else []
+            returned = execute_values(cur, insert_sql, rows, page_size=len(rows), fetch=(mode == "update"))
+            if mode == "update":
+                _refresh_rollup_hours(cur, replaced_hours + [hour for (hour,) in returned])
     logging.info(f"✅ Transaction écrite dans la database avec succès.")
+
+
+class PredictionWriter:
+    """
+    Écriture asynchrone (write-behind) des lignes de prédiction.
+
+    Les lignes sont mises en file par add() ; un thread les écrit par lots
+    (une instruction et un commit par lot) dès que batch_size lignes sont en attente
+    ou au plus tard toutes les flush_seconds. Au-delà de max_buffered lignes
+    en attente, add() bloque jusqu'à ce qu'un lot soit écrit.
+    Un lot est rejoué au plus max_attempts fois sur une erreur transitoire
+    (RETRYABLE_DB_ERRORS) ; sur une autre erreur, ses lignes sont écrites une à une
+    et seules les lignes en erreur sont perdues (comptées dans `dropped`).
+    close() écrit les lignes restantes.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = DB_WRITER_BATCH_SIZE,
+        flush_seconds: float = DB_WRITER_FLUSH_SECONDS,
+        max_buffered: int = DB_WRITER_MAX_BUFFERED,
+        max_attempts: int = DB_WRITER_MAX_ATTEMPTS,
+    ):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.max_attempts = max_attempts
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self._rows = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    def add(self, rows: list):
+        """
+        Met les lignes en file d'écriture (bloque si la file est pleine).
+        """
+        if not rows:
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PredictionWriter fermé")
+            # Un lot plus grand que la limite est accepté quand la file est vide
+            self._cond.wait_for(
+                lambda: not self._rows or len(self._rows) + len(rows) <= self.max_buffered or self._closed
+            )
+            if self._closed:
+                raise RuntimeError("PredictionWriter fermé")
+            self._rows.extend(rows)
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _take(self) -> list:
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._rows) >= self.batch_size or self._closed, timeout=self.flush_seconds)
+            batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+            # De la place s'est libérée pour les producteurs en attente
+            self._cond.notify_all()
+            return batch
+
+    def _drop(self, rows: list, reason):
+        self.dropped += len(rows)
+        logging.error(f"🗑️ {len(rows)} prédictions perdues ({self.dropped} au total) : {reason}")
+        # Les transactions perdues pourront être traitées à nouveau si l'API les renvoie
+        forget_trans_nums(row[DB_COLUMNS.index(CONFLICT_KEY)] for row in rows)
+
+    def _write(self, batch: list):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                insert_predictions(batch)
+                self.written += len(batch)
+                return
+            except RETRYABLE_DB_ERRORS as e:
+                self.failed_batches += 1
+                if self._closed or attempt == self.max_attempts:
+                    self._drop(batch, f"base injoignable après {attempt} tentatives ({e})")
+                    return
+                # Les insertions sont idempotentes (voir PREDICTIONS_CONFLICT_MODE) : on rejoue le lot
+                logging.warning(f"⚠️ Écriture d'un lot de {len(batch)} prédictions en échec (tentative {attempt}) : {e}")
+                time.sleep(self.flush_seconds)
+            except Exception as e:
+                self.failed_batches += 1
+                if len(batch) == 1:
+                    self._drop(batch, e)
+                    return
+                # Erreur non transitoire : on isole les lignes en cause en écrivant le lot ligne par ligne
+                logging.error(f"❌ Erreur lors de l'écriture d'un lot de {len(batch)} prédictions, écriture ligne par ligne : {e}")
+                for row in batch:
+                    self._write([row])
+                return
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch:
+                self._write(batch)
+            elif self._closed:
+                return
+
+    def close(self, timeout: float = 60):
+        """
+        Écrit les lignes en attente puis arrête le thread d'écriture.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        logging.info(f"✅ Writer base de données arrêté ({self.written} prédictions écrites, {self.dropped} perdues)")
+
+
+_prediction_writer = None
+_prediction_writer_lock = threading.Lock()
+
+
+def get_prediction_writer() -> PredictionWriter:
+    """
+    Writer asynchrone partagé par le process, vidé automatiquement à la sortie.
+    """
+    global _prediction_writer
+    if _prediction_writer is None:
+        with _prediction_writer_lock:
+            if _prediction_writer is None:
+                _prediction_writer = PredictionWriter()
+                atexit.register(_prediction_writer.close)
+    return _prediction_writer
+
+
+def close_prediction_writer():
+    if _prediction_writer is not None:
+        _prediction_writer.close()
+
+
+def refresh_hourly_rollup(since: datetime):
+    """
+    Recalcule fraud_hourly_rollup à partir de la table des prédictions pour les heures
+    postérieures à `since` (réconciliation ou rattrapage après un chargement externe).
+    """
+    since_hour = since.replace(minute=0, second=0, microsecond=0)
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM public.fraud_hourly_rollup WHERE bucket_hour >= %s", (since_hour,))
+        cur.execute(
+            f"""
+            INSERT INTO public.fraud_hourly_rollup
+            (bucket_hour, category, tx_count, fraud_count, amt_sum, fraud_amt_sum, actual_fraud_count)
+            {ROLLUP_AGGREGATES_SQL.format(source="public.fraud_transaction_predictions", where="WHERE trans_date_trans_time >= %s")}
+            """,
+            (since_hour,),
+        )
+    logging.info(f"✅ Agrégats horaires recalculés depuis {since_hour}")
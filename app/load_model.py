@@ -1,8 +1,14 @@
 import os
+import sys
+import threading
+from pathlib import Path
 
 import mlflow
 import mlflow.sklearn
+from mlflow.tracking import MlflowClient
 from dotenv import find_dotenv, load_dotenv
+# Rendre les modules du dossier app importables (exécution directe ou via le package app)
+sys.path.insert(0, str(Path(__file__).parent))
 import logging
 
 logging.basicConfig(
@@ -15,8 +21,16 @@ load_dotenv(env_path, override=True)
 MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://0.0.0.0:4000")
 MODEL_URI = os.getenv(
     "MLFLOW_MODEL_URI", "models:/fraud_detector_RF@production"
-    
+
 )
+# Intervalle (en secondes) de vérification de l'alias du modèle dans le registre
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", "60"))
+# Seuil de décision : fraud_pred = 1 quand la probabilité de fraude dépasse ce seuil
+FRAUD_THRESHOLD = float(os.getenv("FRAUD_THRESHOLD", "0.5"))
+# Moteur de scoring : "sklearn" (Pipeline MLflow), "fast" (scorer sans DataFrame exporté à l'entraînement)
+# ou "onnx" (ColumnTransformer + XGBoost exportés en ONNX, exécutés par onnxruntime)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "sklearn")
+MODEL_BACKENDS = ("sklearn", "fast", "onnx")
 
 
 def load_mlflow_model(
@@ -33,3 +47,190 @@ def load_mlflow_model(
     model = mlflow.sklearn.load_model(model_uri)
     logging.info("✅ Model récupéré depuis MLflow")
     return model
+
+
+def predict_with_threshold(model, features, threshold: float = FRAUD_THRESHOLD) -> tuple:
+    """
+    Un seul passage dans le modèle (predict_proba) : la classe est déduite de la probabilité.
+    Retourne (prédictions 0/1, probabilités de fraude). Avec le seuil de 0.5,
+    les prédictions sont identiques à celles de model.predict().
+    """
+    probas = model.predict_proba(features)[:, 1]  # proba de la classe "fraude" (1)
+    return (probas > threshold).astype(int), probas
+
+
+def download_run_artifacts(tracking_uri: str, name: str, version: str, artifact_path: str) -> str:
+    """
+    Télécharge les artefacts `artifact_path` du run ayant produit la version du modèle.
+    Retourne le dossier local.
+    """
+    client = MlflowClient(tracking_uri=tracking_uri)
+    run_id = client.get_model_version(name, version).run_id
+    return mlflow.artifacts.download_artifacts(
+        run_id=run_id, artifact_path=artifact_path, tracking_uri=tracking_uri
+    )
+
+
+def load_exported_model(backend: str, tracking_uri: str, name: str, version: str):
+    """
+    Charge le modèle exporté à l'entraînement pour le moteur "fast" ou "onnx".
+    Les imports sont faits ici : seul le moteur utilisé est chargé en mémoire.
+    """
+    if backend == "fast":
+        from fast_scorer import FastScorer, FAST_SCORER_ARTIFACT_PATH
+        model = FastScorer.load(download_run_artifacts(tracking_uri, name, version, FAST_SCORER_ARTIFACT_PATH))
+    elif backend == "onnx":
+        from onnx_scorer import OnnxScorer, ONNX_ARTIFACT_PATH
+        model = OnnxScorer.load(download_run_artifacts(tracking_uri, name, version, ONNX_ARTIFACT_PATH))
+    else:
+        raise ValueError(f"Pas de modèle exporté pour le moteur {backend}")
+    logging.info(f"✅ Modèle {backend} récupéré depuis MLflow ({name} version {version})")
+    return model
+
+
+def parse_model_alias_uri(model_uri: str) -> tuple[str, str]:
+    """
+    Découpe un URI de type "models:/<nom>@<alias>" en (nom, alias).
+    """
+    prefix = "models:/"
+    if not model_uri.startswith(prefix) or "@" not in model_uri:
+        raise ValueError(f"URI de modèle non supporté (attendu models:/<nom>@<alias>) : {model_uri}")
+    name, alias = model_uri[len(prefix):].split("@", 1)
+    return name, alias
+
+
+def get_alias_version(
+    tracking_uri: str = MLFLOW_TRACKING_URI,
+    model_uri: str = MODEL_URI,
+) -> str:
+    """
+    Retourne la version du registre MLflow vers laquelle pointe l'alias du model URI.
+    """
+    name, alias = parse_model_alias_uri(model_uri)
+    client = MlflowClient(tracking_uri=tracking_uri)
+    return str(client.get_model_version_by_alias(name, alias).version)
+
+
+class ModelHolder:
+    """
+    Garde en mémoire le modèle de production pour tout le process.
+
+    Le modèle est chargé une seule fois, puis un thread en arrière-plan
+    vérifie périodiquement la version pointée par l'alias. Quand l'alias
+    change, la nouvelle version est chargée puis échangée de façon atomique :
+    les appels à get() en cours continuent d'utiliser l'ancien modèle.
+    """
+
+    def __init__(
+        self,
+        tracking_uri: str = MLFLOW_TRACKING_URI,
+        model_uri: str = MODEL_URI,
+        refresh_interval: float = MODEL_REFRESH_INTERVAL,
+        backend: str = MODEL_BACKEND,
+    ):
+        if backend not in MODEL_BACKENDS:
+            raise ValueError(f"Moteur de scoring inconnu : {backend} (attendu {', '.join(MODEL_BACKENDS)})")
+        self.tracking_uri = tracking_uri
+        self.model_uri = model_uri
+        self.refresh_interval = refresh_interval
+        self.backend = backend
+        # (modèle, version) : un seul tuple pour que l'échange soit atomique
+        self._current = (None, None)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def version(self):
+        return self._current[1]
+
+    def snapshot(self) -> tuple:
+        """
+        Retourne le couple (modèle, version) courant, chargé au premier appel si nécessaire.
+        """
+        if self._current[0] is None:
+            with self._lock:
+                if self._current[0] is None:
+                    self._load()
+        return self._current
+
+    def get(self):
+        """
+        Retourne le modèle courant (chargé au premier appel si nécessaire).
+        """
+        return self.snapshot()[0]
+
+    def _load(self, version: str = None):
+        """
+        Charge le modèle de la version donnée (ou de la version courante de l'alias).
+        """
+        if version is None:
+            version = get_alias_version(self.tracking_uri, self.model_uri)
+        name, _ = parse_model_alias_uri(self.model_uri)
+        model = None
+        if self.backend != "sklearn":
+            try:
+                model = load_exported_model(self.backend, self.tracking_uri, name, version)
+            except Exception as e:
+                # Version entraînée sans cet export : on garde le Pipeline sklearn
+                logging.warning(f"⚠️ Modèle {self.backend} indisponible pour la version {version}, Pipeline sklearn utilisé : {e}")
+        if model is None:
+            # On charge la version explicite pour éviter une course avec un changement d'alias
+            model = load_mlflow_model(self.tracking_uri, f"models:/{name}/{version}")
+        # Échange atomique : une seule affectation de référence
+        self._current = (model, version)
+        logging.info(f"✅ Modèle {name} version {version} en mémoire")
+
+    def refresh(self) -> bool:
+        """
+        Recharge le modèle si l'alias pointe vers une nouvelle version.
+        Retourne True si le modèle a été échangé.
+        """
+        version = get_alias_version(self.tracking_uri, self.model_uri)
+        if version == self.version:
+            return False
+        logging.info(f"🔄 Nouvelle version détectée pour {self.model_uri} : {self.version} → {version}")
+        with self._lock:
+            self._load(version)
+        return True
+
+    def _poll(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # On garde le modèle courant si le registre est injoignable
+                logging.error(f"❌ Erreur lors de la vérification du modèle : {e}")
+
+    def start(self):
+        """
+        Charge le modèle et démarre la surveillance de l'alias en arrière-plan.
+        """
+        self.get()
+        if self.refresh_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="model-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+_production_model = None
+_production_model_lock = threading.Lock()
+
+
+def get_production_model():
+    """
+    Retourne le modèle de production partagé par le process
+    (chargé une seule fois, rechargé automatiquement quand l'alias change).
+    """
+    global _production_model
+    if _production_model is None:
+        with _production_model_lock:
+            if _production_model is None:
+                _production_model = ModelHolder().start()
+    return _production_model.get()
@@ -0,0 +1,393 @@
+import os
+from datetime import date
+import logging
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# Table qui enregistre les versions du schéma déjà appliquées
+SCHEMA_VERSION_TABLE = "public.predictions_schema_version"
+# Identifiant du verrou Postgres qui empêche deux workers de migrer en même temps
+MIGRATION_LOCK_ID = 4242001
+# Nombre de partitions mensuelles créées à l'avance
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+PREDICTIONS_TABLE = "fraud_transaction_predictions"
+ROLLUP_TABLE = "fraud_hourly_rollup"
+KEYS_TABLE = "fraud_transaction_keys"
+
+# Agrégats par heure × catégorie calculés à partir d'un ensemble de prédictions
+# (fraud_count / fraud_amt_sum : fraudes prédites, actual_fraud_count : fraudes réelles)
+ROLLUP_AGGREGATES_SQL = """
+    SELECT
+        date_trunc('hour', trans_date_trans_time) AS bucket_hour,
+        COALESCE(category, 'unknown') AS category,
+        COUNT(*) AS tx_count,
+        COUNT(*) FILTER (WHERE fraud_pred = 1) AS fraud_count,
+        COALESCE(SUM(amt), 0) AS amt_sum,
+        COALESCE(SUM(amt) FILTER (WHERE fraud_pred = 1), 0) AS fraud_amt_sum,
+        COUNT(*) FILTER (WHERE is_fraud = 1) AS actual_fraud_count
+    FROM {source}
+    {where}
+    GROUP BY 1, 2
+"""
+
+
+def _create_predictions_table(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS public.fraud_transaction_predictions (
+            id SERIAL PRIMARY KEY,
+            cc_num BIGINT,
+            trans_date_trans_time TIMESTAMP,
+            merchant VARCHAR,
+            category VARCHAR,
+            amt NUMERIC,
+            first_name VARCHAR,
+            last_name VARCHAR,
+            gender VARCHAR,
+            street VARCHAR,
+            city VARCHAR,
+            state VARCHAR,
+            zip VARCHAR,
+            lat NUMERIC,
+            long NUMERIC,
+            city_pop INTEGER,
+            job VARCHAR,
+            dob DATE,
+            trans_num VARCHAR,
+            merch_lat NUMERIC,
+            merch_long NUMERIC,
+            unix_time NUMERIC,
+            is_fraud INTEGER,
+            fraud_pred INTEGER,
+            fraud_proba NUMERIC,
+            created_at TIMESTAMP
+        );
+        """
+    )
+
+
+def _add_months(month_start: date, months: int) -> date:
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_start: date) -> str:
+    return f"{PREDICTIONS_TABLE}_y{month_start.year}m{month_start.month:02d}"
+
+
+def create_month_partition(cur, month_start: date) -> bool:
+    """
+    Crée (si besoin) la partition du mois commençant à month_start.
+    Si la partition par défaut contient déjà des lignes de ce mois, Postgres refuse
+    la création : on détache la partition par défaut, on crée la partition, on y
+    déplace ces lignes puis on rattache la partition par défaut.
+    Retourne True si la partition a été créée.
+    """
+    name = partition_name(month_start)
+    cur.execute("SELECT to_regclass(%s)", (f"public.{name}",))
+    if cur.fetchone()[0] is not None:
+        return False
+    bounds = (month_start, _add_months(month_start, 1))
+    default = f"public.{PREDICTIONS_TABLE}_default"
+    in_range = "trans_date_trans_time >= %s AND trans_date_trans_time < %s"
+    create_sql = f"""
+        CREATE TABLE public.{name}
+        PARTITION OF public.{PREDICTIONS_TABLE}
+        FOR VALUES FROM (%s) TO (%s);
+        """
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})", bounds)
+    if not cur.fetchone()[0]:
+        cur.execute(create_sql, bounds)
+        return True
+    logging.warning(f"⚠️ Lignes de {month_start:%Y-%m} dans la partition par défaut : déplacement vers {name}")
+    cur.execute(f"ALTER TABLE public.{PREDICTIONS_TABLE} DETACH PARTITION {default}")
+    cur.execute(create_sql, bounds)
+    cur.execute(f"INSERT INTO public.{PREDICTIONS_TABLE} SELECT * FROM {default} WHERE {in_range}", bounds)
+    cur.execute(f"DELETE FROM {default} WHERE {in_range}", bounds)
+    cur.execute(f"ALTER TABLE public.{PREDICTIONS_TABLE} ATTACH PARTITION {default} DEFAULT")
+    return True
+
+
+def ensure_future_partitions(cur, months_ahead: int = PARTITION_MONTHS_AHEAD, today: date = None):
+    """
+    Crée les partitions du mois précédent, du mois courant et des `months_ahead` mois suivants.
+    Le mois précédent est nécessaire : trans_date_trans_time est décalé d'un mois
+    dans le passé (voir transform.build_features_from_transaction).
+    """
+    current = (today or date.today()).replace(day=1)
+    for i in range(-1, months_ahead + 1):
+        create_month_partition(cur, _add_months(current, i))
+
+
+def drop_partitions_older_than(cur, retention_months: int, today: date = None) -> list:
+    """
+    Supprime les partitions mensuelles entièrement antérieures à la période de rétention,
+    ainsi que les lignes de cette période restées dans la partition par défaut.
+    Retourne les noms des partitions supprimées.
+    """
+    cutoff = _add_months((today or date.today()).replace(day=1), -retention_months)
+    cur.execute(
+        f"DELETE FROM public.{PREDICTIONS_TABLE}_default WHERE trans_date_trans_time < %s",
+        (cutoff,),
+    )
+    if cur.rowcount:
+        logging.info(f"🗑️ {cur.rowcount} lignes antérieures à {cutoff} supprimées de la partition par défaut")
+    cur.execute(f"DELETE FROM public.{KEYS_TABLE} WHERE trans_date_trans_time < %s", (cutoff,))
+    cur.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE parent.relname = %s
+        """,
+        (PREDICTIONS_TABLE,),
+    )
+    dropped = []
+    prefix = f"{PREDICTIONS_TABLE}_y"
+    for (name,) in cur.fetchall():
+        if not name.startswith(prefix):
+            continue  # partition par défaut
+        year, month = name[len(prefix):].split("m")
+        if date(int(year), int(month), 1) < cutoff:
+            cur.execute(f"ALTER TABLE public.{PREDICTIONS_TABLE} DETACH PARTITION public.{name}")
+            cur.execute(f"DROP TABLE public.{name}")
+            dropped.append(name)
+    return dropped
+
+
+def _partition_predictions_by_month(cur):
+    """
+    Remplace la table par une table partitionnée par mois sur trans_date_trans_time,
+    en recopiant les lignes existantes.
+    """
+    cur.execute(f"ALTER TABLE public.{PREDICTIONS_TABLE} RENAME TO {PREDICTIONS_TABLE}_unpartitioned")
+    cur.execute(f"ALTER TABLE public.{PREDICTIONS_TABLE}_unpartitioned RENAME CONSTRAINT {PREDICTIONS_TABLE}_pkey TO {PREDICTIONS_TABLE}_unpartitioned_pkey")
+    # La clé de partitionnement doit faire partie de la clé primaire
+    cur.execute(
+        f"""
+        CREATE TABLE public.{PREDICTIONS_TABLE} (
+            id INTEGER NOT NULL DEFAULT nextval('public.{PREDICTIONS_TABLE}_id_seq'),
+            cc_num BIGINT,
+            trans_date_trans_time TIMESTAMP NOT NULL,
+            merchant VARCHAR,
+            category VARCHAR,
+            amt NUMERIC,
+            first_name VARCHAR,
+            last_name VARCHAR,
+            gender VARCHAR,
+            street VARCHAR,
+            city VARCHAR,
+            state VARCHAR,
+            zip VARCHAR,
+            lat NUMERIC,
+            long NUMERIC,
+            city_pop INTEGER,
+            job VARCHAR,
+            dob DATE,
+            trans_num VARCHAR,
+            merch_lat NUMERIC,
+            merch_long NUMERIC,
+            unix_time NUMERIC,
+            is_fraud INTEGER,
+            fraud_pred INTEGER,
+            fraud_proba NUMERIC,
+            created_at TIMESTAMP,
+            PRIMARY KEY (id, trans_date_trans_time)
+        ) PARTITION BY RANGE (trans_date_trans_time);
+        """
+    )
+    cur.execute(f"ALTER SEQUENCE public.{PREDICTIONS_TABLE}_id_seq OWNED BY public.{PREDICTIONS_TABLE}.id")
+    # Partition par défaut pour les dates hors des partitions mensuelles
+    cur.execute(f"CREATE TABLE public.{PREDICTIONS_TABLE}_default PARTITION OF public.{PREDICTIONS_TABLE} DEFAULT")
+
+    # Une partition par mois couvert par les données existantes, puis les mois à venir
+    cur.execute(
+        f"""
+        SELECT date_trunc('month', MIN(trans_date_trans_time))::date, date_trunc('month', MAX(trans_date_trans_time))::date
+        FROM public.{PREDICTIONS_TABLE}_unpartitioned
+        """
+    )
+    first_month, last_month = cur.fetchone()
+    if first_month is not None:
+        month = first_month
+        while month <= last_month:
+            create_month_partition(cur, month)
+            month = _add_months(month, 1)
+    ensure_future_partitions(cur)
+
+    cur.execute(f"SELECT COUNT(*) FROM public.{PREDICTIONS_TABLE}_unpartitioned WHERE trans_date_trans_time IS NULL")
+    skipped = cur.fetchone()[0]
+    if skipped:
+        logging.warning(f"⚠️ {skipped} lignes sans trans_date_trans_time ne sont pas recopiées")
+    cur.execute(
+        f"""
+        INSERT INTO public.{PREDICTIONS_TABLE}
+        SELECT * FROM public.{PREDICTIONS_TABLE}_unpartitioned
+        WHERE trans_date_trans_time IS NOT NULL
+        """
+    )
+    cur.execute(f"DROP TABLE public.{PREDICTIONS_TABLE}_unpartitioned")
+
+
+def _create_predictions_indexes(cur):
+    # Créés sur la table partitionnée : Postgres les propage à chaque partition
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_predictions_trans_date ON public.{PREDICTIONS_TABLE} (trans_date_trans_time)")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_predictions_fraud_pred_trans_date ON public.{PREDICTIONS_TABLE} (fraud_pred, trans_date_trans_time)")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_predictions_category ON public.{PREDICTIONS_TABLE} (category)")
+
+
+def _create_hourly_rollup(cur):
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS public.{ROLLUP_TABLE} (
+            bucket_hour TIMESTAMP NOT NULL,
+            category VARCHAR NOT NULL,
+            tx_count BIGINT NOT NULL DEFAULT 0,
+            fraud_count BIGINT NOT NULL DEFAULT 0,
+            amt_sum NUMERIC NOT NULL DEFAULT 0,
+            fraud_amt_sum NUMERIC NOT NULL DEFAULT 0,
+            actual_fraud_count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket_hour, category)
+        );
+        """
+    )
+    # Initialisation à partir des prédictions déjà en base
+    cur.execute(
+        f"""
+        INSERT INTO public.{ROLLUP_TABLE}
+        (bucket_hour, category, tx_count, fraud_count, amt_sum, fraud_amt_sum, actual_fraud_count)
+        {ROLLUP_AGGREGATES_SQL.format(source=f"public.{PREDICTIONS_TABLE}", where="")}
+        """
+    )
+
+
+def _add_trans_num_unique_constraint(cur):
+    """
+    Supprime les doublons (même trans_num et même date, on garde la première ligne insérée),
+    ajoute la contrainte d'unicité puis recalcule les agrégats horaires.
+    La clé de partitionnement doit faire partie de toute contrainte d'unicité d'une table partitionnée.
+    """
+    cur.execute(
+        f"""
+        DELETE FROM public.{PREDICTIONS_TABLE} a
+        USING public.{PREDICTIONS_TABLE} b
+        WHERE a.trans_num = b.trans_num
+          AND a.trans_date_trans_time = b.trans_date_trans_time
+          AND a.id > b.id
+        """
+    )
+    if cur.rowcount:
+        logging.warning(f"⚠️ {cur.rowcount} prédictions en double supprimées")
+    cur.execute(
+        f"""
+        ALTER TABLE public.{PREDICTIONS_TABLE}
+        ADD CONSTRAINT uq_predictions_trans_num UNIQUE (trans_num, trans_date_trans_time)
+        """
+    )
+    _rebuild_hourly_rollup(cur)
+
+
+def _rebuild_hourly_rollup(cur):
+    cur.execute(f"DELETE FROM public.{ROLLUP_TABLE}")
+    cur.execute(
+        f"""
+        INSERT INTO public.{ROLLUP_TABLE}
+        (bucket_hour, category, tx_count, fraud_count, amt_sum, fraud_amt_sum, actual_fraud_count)
+        {ROLLUP_AGGREGATES_SQL.format(source=f"public.{PREDICTIONS_TABLE}", where="")}
+        """
+    )
+
+
+def _create_transaction_keys(cur):
+    """
+    trans_date_trans_time varie d'un appel à l'autre pour une même transaction : la contrainte
+    de la migration 5 ne suffit pas. Une table non partitionnée réserve chaque trans_num
+    (voir load.claim_keys_sql) ; la date est gardée pour la rétention.
+    Supprime les doublons existants (on garde la première ligne insérée), remplit la table
+    puis recalcule les agrégats horaires.
+    """
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS public.{KEYS_TABLE} (
+            trans_num VARCHAR PRIMARY KEY,
+            trans_date_trans_time TIMESTAMP NOT NULL
+        );
+        """
+    )
+    cur.execute(
+        f"""
+        DELETE FROM public.{PREDICTIONS_TABLE} a
+        USING public.{PREDICTIONS_TABLE} b
+        WHERE a.trans_num = b.trans_num
+          AND a.id > b.id
+        """
+    )
+    if cur.rowcount:
+        logging.warning(f"⚠️ {cur.rowcount} prédictions en double (même trans_num) supprimées")
+    cur.execute(
+        f"""
+        INSERT INTO public.{KEYS_TABLE} (trans_num, trans_date_trans_time)
+        SELECT trans_num, trans_date_trans_time
+        FROM public.{PREDICTIONS_TABLE}
+        WHERE trans_num IS NOT NULL AND trans_date_trans_time IS NOT NULL
+        ON CONFLICT (trans_num) DO NOTHING
+        """
+    )
+    _rebuild_hourly_rollup(cur)
+
+
+# Migrations du schéma des prédictions : (version, description, fonction(cursor)).
+# Ne jamais modifier une migration déjà déployée : ajouter une nouvelle version à la fin.
+MIGRATIONS = [
+    (1, "Création de la table fraud_transaction_predictions", _create_predictions_table),
+    (2, "Partitionnement mensuel sur trans_date_trans_time", _partition_predictions_by_month),
+    (3, "Index sur trans_date_trans_time, (fraud_pred, trans_date_trans_time) et category", _create_predictions_indexes),
+    (4, "Table d'agrégats horaires par catégorie fraud_hourly_rollup", _create_hourly_rollup),
+    (5, "Contrainte d'unicité sur (trans_num, trans_date_trans_time)", _add_trans_num_unique_constraint),
+    (6, "Table fraud_transaction_keys : unicité sur trans_num seul", _create_transaction_keys),
+]
+
+
+def get_schema_version(cur) -> int:
+    """
+    Dernière version du schéma appliquée (0 si aucune).
+    """
+    cur.execute(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_VERSION_TABLE}")
+    return cur.fetchone()[0]
+
+
+def apply_migrations(conn) -> int:
+    """
+    Applique, dans une seule transaction, les migrations pas encore appliquées
+    et enregistre chaque version. Retourne la version du schéma après migration.
+    Le commit est laissé à l'appelant.
+    """
+    with conn.cursor() as cur:
+        # Verrou libéré automatiquement à la fin de la transaction
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR,
+                applied_at TIMESTAMP DEFAULT now()
+            );
+            """
+        )
+        current = get_schema_version(cur)
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            logging.info(f"🔄 Migration du schéma vers la version {version} : {description}")
+            migrate(cur)
+            cur.execute(
+                f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (%s, %s)",
+                (version, description),
+            )
+            current = version
+    logging.info(f"✅ Schéma des prédictions à jour (version {current})")
+    return current
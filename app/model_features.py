@@ -0,0 +1,63 @@
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Colonnes de la transaction non utilisées par le modèle
+DROPPED_COLUMNS = ['trans_date_trans_time', 'unix_time','first', 'last', 'street', 'city','lat', 'long', 'job', 'dob', 'merchant', 'merch_lat', 'merch_long', 'trans_num']
+
+
+# Preprocessing (première étape du Pipeline entraîné dans train/train.py)
+def dataset_processing(df):
+    df = df.copy()
+    ## Create new features
+
+    # Calculate distance between transaction location and merchant location
+    df['distance'] = (((df['lat'] - df['merch_lat'])*np.cos(np.radians((df['long'] + df['merch_long'])/2)))**2 + (df['long'] - df['merch_long'])**2)**1/2*111.12
+
+    # calculate age
+    df['age'] = pd.to_numeric(2025 - pd.to_datetime(df['dob']).dt.year)
+
+    # Extract day of week and month from transaction date
+    df['trans_dayofweek'] = pd.to_datetime(df['trans_date_trans_time']).dt.day_name()
+    df['trans_month'] = pd.to_datetime(df['trans_date_trans_time']).dt.month_name()
+
+    ## Remove redundant info or non useful info
+    df = df.drop(DROPPED_COLUMNS, axis=1)
+
+    return df 
+
+
+# Noms renvoyés par pandas day_name() / month_name() (indépendants de la locale)
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+
+def _to_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+
+def derived_features(record: dict) -> dict:
+    """
+    Équivalent de dataset_processing pour une seule transaction (sans DataFrame) :
+    distance, âge, jour de la semaine et mois de la transaction.
+    """
+    lat, long = float(record["lat"]), float(record["long"])
+    merch_lat, merch_long = float(record["merch_lat"]), float(record["merch_long"])
+    trans_time = _to_datetime(record["trans_date_trans_time"])
+    return {
+        **record,
+        # Même formule que dataset_processing, y compris la priorité des opérateurs (**1/2)
+        "distance": (((lat - merch_lat) * math.cos(math.radians((long + merch_long) / 2))) ** 2 + (long - merch_long) ** 2) ** 1 / 2 * 111.12,
+        "age": 2025 - _to_datetime(record["dob"]).year,
+        "trans_dayofweek": DAY_NAMES[trans_time.weekday()],
+        "trans_month": MONTH_NAMES[trans_time.month - 1],
+    }
@@ -0,0 +1,64 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+import logging
+# Rendre les modules du dossier app importables (exécution directe ou via le package app)
+sys.path.insert(0, str(Path(__file__).parent))
+from model_features import derived_features
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# Emplacement du modèle ONNX dans les artefacts du run MLflow
+ONNX_ARTIFACT_PATH = "onnx"
+ONNX_MODEL_FILE = "model.onnx"
+# Threads utilisés par onnxruntime pour un appel (0 = choix d'onnxruntime)
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+
+class OnnxScorer:
+    """
+    Exécute avec onnxruntime la partie ColumnTransformer + XGBoost du Pipeline exportée
+    à l'entraînement. dataset_processing reste en Python (derived_features) :
+    chaque colonne préparée est une entrée du graphe ONNX.
+
+    Expose predict_proba / predict comme le Pipeline scikit-learn.
+    """
+
+    def __init__(self, model_path: str, intra_op_threads: int = ONNX_INTRA_OP_THREADS):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._inputs = [(i.name, i.type == "tensor(string)") for i in self.session.get_inputs()]
+        # Sorties du classifieur : label puis probabilités (zipmap désactivé à l'export)
+        self._probabilities = self.session.get_outputs()[1].name
+
+    @classmethod
+    def load(cls, directory: str) -> "OnnxScorer":
+        return cls(os.path.join(directory, ONNX_MODEL_FILE))
+
+    def _feeds(self, records: list) -> dict:
+        rows = [derived_features(record) for record in records]
+        feeds = {}
+        for name, is_string in self._inputs:
+            if is_string:
+                feeds[name] = np.array([[str(row[name])] for row in rows], dtype=object)
+            else:
+                feeds[name] = np.array([[float(row[name])] for row in rows], dtype=np.float32)
+        return feeds
+
+    def predict_proba(self, features) -> np.ndarray:
+        """
+        Même sortie que Pipeline.predict_proba : colonnes (non fraude, fraude).
+        features : DataFrame ou liste de dicts.
+        """
+        records = features.to_dict(orient="records") if hasattr(features, "to_dict") else list(features)
+        (probas,) = self.session.run([self._probabilities], self._feeds(records))
+        return np.asarray(probas, dtype=np.float64)
+
+    def predict(self, features) -> np.ndarray:
+        return (self.predict_proba(features)[:, 1] > 0.5).astype(int)
@@ -3,9 +3,10 @@ import os
 import boto3
 
 from extract import extract_transaction
-from load_model import load_mlflow_model
-from transform import build_features_from_transaction, save_features_to_s3, predict_fraud, save_predictions_to_s3, alert_fraud_detection
-from load import ensure_predictions_table_exists, build_db_rows, insert_predictions
+from dedup import forget_transaction
+from load_model import get_production_model
+from transform import build_features_from_transaction, save_features, predict_fraud, save_predictions, alert_fraud_detection
+from load import run_migrations, build_db_rows, insert_predictions
 
 
 import pandas as pd
@@ -54,25 +55,32 @@ def run_etl():
     logging.info("🔄 Début de boucle ETL")
     # Extract
     transaction_json, timestamp = extract_transaction()
-
-    # Load model
-    model = load_mlflow_model()
-
-    # Transform + Predict
-    features_df = build_features_from_transaction(transaction_json)
-    save_features_to_s3(features_df, timestamp)
-
-    pred_df = predict_fraud(model, features_df)
-    alert_fraud_detection(pred_df)
-    save_predictions_to_s3(pred_df, timestamp)
-
-    # Load → DB
-    ensure_predictions_table_exists()
-    rows = build_db_rows(
-        transaction_json=transaction_json,
-        pred_df=pred_df
-    )
-    insert_predictions(rows)
+    if transaction_json is None:
+        # Transaction déjà traitée : ni scoring, ni écriture
+        return
+
+    try:
+        # Load model (chargé une seule fois par process, rechargé si l'alias change)
+        model = get_production_model()
+
+        # Transform + Predict
+        features_df = build_features_from_transaction(transaction_json)
+        save_features(features_df, timestamp)
+
+        pred_df = predict_fraud(model, features_df)
+        alert_fraud_detection(pred_df)
+        save_predictions(pred_df, timestamp)
+
+        # Load → DB (le schéma est mis à jour une seule fois au démarrage, voir run_migrations)
+        rows = build_db_rows(
+            transaction_json=transaction_json,
+            pred_df=pred_df
+        )
+        insert_predictions(rows)
+    except Exception:
+        # La transaction n'est pas en base : elle ne doit pas être écartée comme doublon au prochain passage
+        forget_transaction(transaction_json)
+        raise
 
     
 
@@ -115,4 +123,5 @@ def run_etl():
 
 
 if __name__ == "__main__":
+    run_migrations()
     run_etl()
\ No newline at end of file
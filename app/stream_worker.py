@@ -0,0 +1,227 @@
+import os
+import time
+import queue
+import signal
+import threading
+
+from extract import iter_transactions, save_raw_transaction, close_raw_writer
+from dedup import get_seen_transactions, forget_transaction
+from load_model import get_production_model
+from transform import build_features_from_transaction, save_features, predict_fraud, save_predictions, alert_fraud_detection, close_parquet_sinks
+from load import run_migrations, maintain_partitions, build_db_rows, get_prediction_writer, close_prediction_writer
+from dotenv import find_dotenv, load_dotenv
+import logging
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+env_path = find_dotenv()
+load_dotenv(env_path, override=True)
+
+# Taille des files entre étapes : quand une file est pleine, l'étape précédente attend (backpressure)
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+# Nombre de workers par étape
+STREAM_FEATURES_WORKERS = int(os.getenv("STREAM_FEATURES_WORKERS", "2"))
+STREAM_SCORE_WORKERS = int(os.getenv("STREAM_SCORE_WORKERS", "1"))
+STREAM_GOLD_WORKERS = int(os.getenv("STREAM_GOLD_WORKERS", "2"))
+STREAM_LOAD_WORKERS = int(os.getenv("STREAM_LOAD_WORKERS", "2"))
+# Intervalle (en secondes) du rapport de profondeur des files et de débit
+STREAM_REPORT_INTERVAL = float(os.getenv("STREAM_REPORT_INTERVAL", "30"))
+# Intervalle (en secondes) de création des partitions à venir / rétention
+STREAM_MAINTENANCE_INTERVAL = float(os.getenv("STREAM_MAINTENANCE_INTERVAL", "3600"))
+
+# Marqueur de fin envoyé à chaque worker d'une étape lors de l'arrêt
+_STOP = object()
+
+
+class Stage:
+    """
+    Étape du pipeline : `workers` threads lisent in_queue, appliquent func
+    et envoient le résultat dans out_queue (None = rien à transmettre).
+    En cas d'erreur, on_error(item) est appelé avec l'élément qui n'a pas pu être traité.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func,
+        in_queue: queue.Queue,
+        out_queue: queue.Queue = None,
+        workers: int = 1,
+        on_error=None,
+    ):
+        self.name = name
+        self.func = func
+        self.on_error = on_error
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.workers = workers
+        self.processed = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _work(self):
+        while True:
+            item = self.in_queue.get()
+            if item is _STOP:
+                return
+            try:
+                result = self.func(item)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logging.error(f"[ERROR] Étape {self.name} : {e}")
+                if self.on_error is not None:
+                    self.on_error(item)
+                continue
+            with self._lock:
+                self.processed += 1
+            if self.out_queue is not None and result is not None:
+                # Bloque si l'étape suivante est en retard
+                self.out_queue.put(result)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def drain(self):
+        """
+        Termine l'étape après avoir traité les éléments déjà en file.
+        """
+        for _ in self._threads:
+            self.in_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+
+def features_step(item):
+    transaction_json, timestamp = item
+    save_raw_transaction(transaction_json, timestamp)
+    features_df = build_features_from_transaction(transaction_json)
+    save_features(features_df, timestamp)
+    return transaction_json, timestamp, features_df
+
+
+def score_step(item):
+    transaction_json, timestamp, features_df = item
+    pred_df = predict_fraud(get_production_model(), features_df)
+    alert_fraud_detection(pred_df)
+    return transaction_json, timestamp, pred_df
+
+
+def gold_step(item):
+    transaction_json, timestamp, pred_df = item
+    save_predictions(pred_df, timestamp)
+    return transaction_json, pred_df
+
+
+def forget_item(item):
+    """
+    Chaque élément du pipeline commence par la transaction : en cas d'échec d'une étape,
+    ses trans_num sont oubliés pour qu'elle soit traitée à nouveau si l'API la renvoie.
+    """
+    forget_transaction(item[0])
+
+
+def load_step(item):
+    transaction_json, pred_df = item
+    rows = build_db_rows(transaction_json=transaction_json, pred_df=pred_df)
+    # Écriture par lots en arrière-plan (un commit par lot et non par transaction)
+    get_prediction_writer().add(rows)
+
+
+class StreamPipeline:
+    """
+    Pipeline ETL en flux : extract → features (raw + silver) → score → gold → DB,
+    chaque étape tournant en parallèle et reliée à la suivante par une file bornée.
+    """
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.stop_event = threading.Event()
+        self.queues = {name: queue.Queue(maxsize=queue_size) for name in ("features", "score", "gold", "load")}
+        self.stages = [
+            Stage("features", features_step, self.queues["features"], self.queues["score"], STREAM_FEATURES_WORKERS, forget_item),
+            Stage("score", score_step, self.queues["score"], self.queues["gold"], STREAM_SCORE_WORKERS, forget_item),
+            Stage("gold", gold_step, self.queues["gold"], self.queues["load"], STREAM_GOLD_WORKERS, forget_item),
+            Stage("load", load_step, self.queues["load"], None, STREAM_LOAD_WORKERS, forget_item),
+        ]
+        self.extracted = 0
+        self._extract_thread = None
+
+    def _extract(self):
+        for item in iter_transactions(stop_event=self.stop_event):
+            # Bloque si l'étape features est en retard
+            self.queues["features"].put(item)
+            self.extracted += 1
+
+    def report(self, interval: float):
+        """
+        Log la profondeur des files et le débit de chaque étape depuis le dernier rapport.
+        """
+        previous = {stage.name: 0 for stage in self.stages}
+        previous["extract"] = 0
+        while not self.stop_event.wait(interval):
+            counts = {stage.name: stage.processed for stage in self.stages}
+            counts["extract"] = self.extracted
+            throughput = ", ".join(
+                f"{name}={(counts[name] - previous[name]) / interval:.2f}/s" for name in counts
+            )
+            depths = ", ".join(f"{name}={q.qsize()}" for name, q in self.queues.items())
+            errors = ", ".join(f"{stage.name}={stage.errors}" for stage in self.stages)
+            dropped = get_seen_transactions().dropped
+            pending = get_prediction_writer().pending
+            logging.info(
+                f"📊 Débit : {throughput} | Files : {depths} | Erreurs : {errors} "
+                f"| Doublons écartés : {dropped} | En attente d'écriture DB : {pending}"
+            )
+            previous = counts
+
+    def maintenance(self, interval: float):
+        while not self.stop_event.wait(interval):
+            try:
+                maintain_partitions()
+            except Exception as e:
+                logging.error(f"[ERROR] Maintenance des partitions : {e}")
+
+    def start(self):
+        # Le schéma et le modèle sont préparés une seule fois, avant le démarrage des workers
+        run_migrations()
+        get_production_model()
+        for stage in self.stages:
+            stage.start()
+        self._extract_thread = threading.Thread(target=self._extract, name="extract", daemon=True)
+        self._extract_thread.start()
+        threading.Thread(target=self.report, args=(STREAM_REPORT_INTERVAL,), name="report", daemon=True).start()
+        threading.Thread(target=self.maintenance, args=(STREAM_MAINTENANCE_INTERVAL,), name="maintenance", daemon=True).start()
+
+    def shutdown(self):
+        """
+        Arrête l'extraction puis vide les étapes une à une, dans l'ordre du pipeline.
+        """
+        logging.info("🛑 Arrêt du pipeline : traitement des transactions en cours...")
+        self.stop_event.set()
+        if self._extract_thread is not None:
+            self._extract_thread.join()
+        for stage in self.stages:
+            stage.drain()
+        close_prediction_writer()
+        close_raw_writer()
+        close_parquet_sinks()
+        get_seen_transactions().save()
+        logging.info(f"✅ Pipeline arrêté ({self.extracted} transactions extraites)")
+
+
+if __name__ == "__main__":
+    logging.info("🚀 Démarrage du pipeline ETL en flux")
+    pipeline = StreamPipeline()
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_requested.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_requested.set())
+    pipeline.start()
+    while not stop_requested.is_set():
+        time.sleep(1)
+    pipeline.shutdown()
@@ -1,9 +1,16 @@
 import os
 import sys
+import time
+import uuid
+import atexit
+import threading
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import boto3
 from dotenv import find_dotenv, load_dotenv
 import logging
@@ -11,6 +18,8 @@ import logging
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 from monitoring.evidently_monitor import log_prediction
+sys.path.insert(0, str(Path(__file__).parent))
+from load_model import predict_with_threshold, FRAUD_THRESHOLD
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -28,6 +37,18 @@ AWS_REGION = os.getenv("AWS_DEFAULT_REGION", "eu-north-1")
 S3_BUCKET = os.getenv("BUCKET_NAME")
 SILVER_PREFIX = os.getenv("SILVER_PREFIX", "data/silver")
 GOLD_PREFIX = os.getenv("GOLD_PREFIX", "data/gold")
+# Format des couches silver/gold :
+# - "csv" : un fichier CSV par transaction (comportement historique)
+# - "parquet" : lignes regroupées en fichiers Parquet partitionnés par date/heure de transaction
+SILVER_GOLD_FORMAT = os.getenv("SILVER_GOLD_FORMAT", "csv")
+PARQUET_MAX_ROWS = int(os.getenv("PARQUET_MAX_ROWS", "10000"))
+PARQUET_MAX_SECONDS = float(os.getenv("PARQUET_MAX_SECONDS", "300"))
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "100000"))
+# Nombre maximal de lignes gardées en mémoire pour renvoyer les fichiers en échec ;
+# au-delà, les lignes en échec sont abandonnées (et comptées)
+PARQUET_RETRY_MAX_ROWS = int(os.getenv("PARQUET_RETRY_MAX_ROWS", str(10 * PARQUET_MAX_ROWS)))
+# Colonnes à faible cardinalité, encodées en dictionnaire dans les fichiers Parquet
+PARQUET_DICTIONARY_COLUMNS = ["category", "merchant", "state"]
 
 boto3.setup_default_session(
     aws_access_key_id=AWS_ACCESS_KEY_ID,
@@ -94,11 +115,16 @@ def predict_fraud(model, features: pd.DataFrame) -> pd.DataFrame:
     """
     Applique le modèle sur les features et renvoie un DataFrame avec les prédictions.
     """
-    preds = model.predict(features)
-    proba = model.predict_proba(features)
+    if hasattr(model, "score_record") and len(features) == 1:
+        # Scorer "fast" : une transaction est scorée depuis son dict, sans passer par predict_proba
+        proba = np.array([model.score_record(features.to_dict(orient="records")[0])])
+        preds = (proba > FRAUD_THRESHOLD).astype(int)
+    else:
+        # Un seul appel au modèle : fraud_pred est déduit de la probabilité (seuil FRAUD_THRESHOLD)
+        preds, proba = predict_with_threshold(model, features)
 
     # log for evidently monitoring
-    logging.info("Appel pour logging")
+    logging.debug("Appel pour logging")
     log_prediction(
         features=features,
         prediction=preds,
@@ -107,7 +133,7 @@ def predict_fraud(model, features: pd.DataFrame) -> pd.DataFrame:
 
     result = features.copy()
     result["fraud_pred"] = preds
-    result["fraud_proba"] = proba[:, 1]  # proba de la classe "fraude" (1)
+    result["fraud_proba"] = proba
 
     return result
 
@@ -144,3 +170,162 @@ def save_predictions_to_s3(pred_df: pd.DataFrame, timestamp: str) -> str:
         logging.error(f"❌ Erreur lors de l'envoi sur S3 : {e}")
         raise e
 
+
+
+
+class ParquetPartitionSink:
+    """
+    Accumule des lignes (features ou prédictions) et les écrit dans S3 en fichiers
+    Parquet partitionnés par date/heure de transaction :
+    <prefix>/date=YYYY-MM-DD/hour=HH/<id>.parquet
+
+    Une partition est écrite quand elle atteint max_rows lignes ou qu'elle est
+    ouverte depuis plus de max_seconds. close() écrit les partitions restantes.
+
+    Des lignes en échec sont remises en attente tant que le nombre de lignes en attente
+    reste sous retry_max_rows ; sinon (ou si l'envoi échoue pendant close()) elles
+    sont abandonnées et comptées dans `dropped`.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        max_rows: int = PARQUET_MAX_ROWS,
+        max_seconds: float = PARQUET_MAX_SECONDS,
+        row_group_size: int = PARQUET_ROW_GROUP_SIZE,
+        retry_max_rows: int = PARQUET_RETRY_MAX_ROWS,
+    ):
+        self.prefix = prefix
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.row_group_size = row_group_size
+        self.retry_max_rows = retry_max_rows
+        # Nombre de lignes abandonnées après un échec d'envoi
+        self.dropped = 0
+        # partition -> {"frames": [...], "rows": nombre de lignes, "opened_at": time.monotonic()}
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._flush_expired, name=f"parquet-{prefix}", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def partition_keys(df: pd.DataFrame) -> pd.Series:
+        # trans_date_trans_time est au format "YYYY-MM-DD HH:MM:SS"
+        dates = df["trans_date_trans_time"].astype(str)
+        return "date=" + dates.str[:10] + "/hour=" + dates.str[11:13]
+
+    def add(self, df: pd.DataFrame):
+        full = []
+        with self._lock:
+            for partition, part_df in df.groupby(self.partition_keys(df), sort=False):
+                buffer = self._partitions.setdefault(
+                    partition, {"frames": [], "rows": 0, "opened_at": time.monotonic()}
+                )
+                buffer["frames"].append(part_df)
+                buffer["rows"] += len(part_df)
+                if buffer["rows"] >= self.max_rows:
+                    full.append((partition, self._partitions.pop(partition)))
+        for partition, buffer in full:
+            self._upload(partition, buffer)
+
+    def _upload(self, partition: str, buffer: dict, requeue: bool = True):
+        df = pd.concat(buffer["frames"], ignore_index=True)
+        key = f"{self.prefix}/{partition}/{uuid.uuid4().hex}.parquet"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            pq.write_table(
+                table,
+                sink,
+                row_group_size=self.row_group_size,
+                use_dictionary=[col for col in PARQUET_DICTIONARY_COLUMNS if col in df.columns],
+                compression="snappy",
+            )
+            s3_client.put_object(
+                Bucket=S3_BUCKET,
+                Key=key,
+                Body=sink.getvalue().to_pybytes(),
+                ContentType="application/vnd.apache.parquet",
+            )
+            logging.info(f"✅ {len(df)} lignes envoyées sur s3://{S3_BUCKET}/{key}")
+        except Exception as e:
+            # On remet les lignes en attente pour le prochain envoi
+            logging.error(f"❌ Erreur lors de l'envoi Parquet sur S3 : {e}")
+            if not requeue:
+                self._drop(buffer, "échec pendant l'arrêt")
+                return
+            with self._lock:
+                pending = sum(current["rows"] for current in self._partitions.values())
+                keep = pending + buffer["rows"] <= self.retry_max_rows
+                if keep:
+                    current = self._partitions.setdefault(partition, {"frames": [], "rows": 0, "opened_at": buffer["opened_at"]})
+                    current["frames"] = buffer["frames"] + current["frames"]
+                    current["rows"] += buffer["rows"]
+            if not keep:
+                self._drop(buffer, "tampon de reprise plein")
+
+    def _drop(self, buffer: dict, reason: str):
+        self.dropped += buffer["rows"]
+        logging.error(f"🗑️ {buffer['rows']} lignes perdues pour {self.prefix} ({reason}), {self.dropped} au total")
+
+    def flush(self, expired_only: bool = False, requeue: bool = True):
+        now = time.monotonic()
+        with self._lock:
+            partitions = [
+                partition for partition, buffer in self._partitions.items()
+                if not expired_only or now - buffer["opened_at"] >= self.max_seconds
+            ]
+            taken = {partition: self._partitions.pop(partition) for partition in partitions}
+        for partition, buffer in taken.items():
+            self._upload(partition, buffer, requeue)
+
+    def _flush_expired(self):
+        while not self._stop_event.wait(1):
+            self.flush(expired_only=True)
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        # Dernier essai : des lignes en échec n'ont plus de prochain envoi, elles sont comptées comme perdues
+        self.flush(requeue=False)
+
+
+_parquet_sinks = {}
+_parquet_sinks_lock = threading.Lock()
+
+
+def get_parquet_sink(prefix: str) -> ParquetPartitionSink:
+    """
+    Sink Parquet partagé par le process pour un préfixe S3 (silver ou gold), vidé à la sortie.
+    """
+    with _parquet_sinks_lock:
+        if prefix not in _parquet_sinks:
+            _parquet_sinks[prefix] = ParquetPartitionSink(prefix)
+            atexit.register(_parquet_sinks[prefix].close)
+        return _parquet_sinks[prefix]
+
+
+def close_parquet_sinks():
+    for sink in list(_parquet_sinks.values()):
+        sink.close()
+
+
+def save_features(features_df: pd.DataFrame, timestamp: str):
+    """
+    Sauvegarde les features en couche silver selon SILVER_GOLD_FORMAT (CSV unitaire ou Parquet).
+    """
+    if SILVER_GOLD_FORMAT == "parquet":
+        get_parquet_sink(SILVER_PREFIX).add(features_df)
+    else:
+        save_features_to_s3(features_df, timestamp)
+
+
+def save_predictions(pred_df: pd.DataFrame, timestamp: str):
+    """
+    Sauvegarde les prédictions en couche gold selon SILVER_GOLD_FORMAT (CSV unitaire ou Parquet).
+    """
+    if SILVER_GOLD_FORMAT == "parquet":
+        get_parquet_sink(GOLD_PREFIX).add(pred_df)
+    else:
+        save_predictions_to_s3(pred_df, timestamp)
@@ -1,5 +1,6 @@
 import time
 from run_pipeline import run_etl
+from load import run_migrations
 import logging
 
 logging.basicConfig(
@@ -7,6 +8,8 @@ logging.basicConfig(
 )
 
 if __name__ == "__main__":
+    # Mise à jour du schéma une seule fois, avant la boucle ETL
+    run_migrations()
     # while True:
     for i in range(30) : # Limiter à 30 itérations pour les tests
         try:
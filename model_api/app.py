@@ -1,16 +1,34 @@
+import os
+import sys
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+
 import mlflow 
 import uvicorn
 import pandas as pd 
-from pydantic import BaseModel
-from fastapi import FastAPI, File
+from pydantic import BaseModel, ValidationError
+from fastapi import FastAPI, File, Request, HTTPException
 from fastapi.responses import HTMLResponse
-import requests
 import json
 from datetime import datetime
+# Ajouter le répertoire racine du projet et le dossier app au PYTHONPATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "app"))
 from monitoring.evidently_monitor import log_prediction
+from load_model import ModelHolder, predict_with_threshold, FRAUD_THRESHOLD
+from http_client import get_json_async, close_async_client
 
 API_URL = "https://aremusan-real-time-fraud-detection.hf.space/current-transactions" # URL personnelle
-mlflow.set_tracking_uri('https://aremusan-mlflow.hf.space')
+MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "https://aremusan-mlflow.hf.space")
+MODEL_URI = os.getenv("MLFLOW_MODEL_URI", "models:/fraud_detector_RF@production")
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", "60"))
+# Micro-batching des appels concurrents à /predict (désactivé par défaut)
+PREDICT_BATCHING_ENABLED = os.getenv("PREDICT_BATCHING_ENABLED", "false").lower() in ("1", "true", "yes")
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
 
 description = """
 ## Transation simulation
@@ -22,6 +40,7 @@ This endpoint calls an API to get a simulated CB transaction. Here is the endpoi
 This is a Machine Learning endpoint that predict salary given some years of experience. Here is the endpoint:
 
 * `/predict` that accepts `floats`
+* `/predict/batch` that accepts a list of transactions (JSON array or NDJSON body) and scores them in one call
 
 
 Check out documentation below 👇 for more information on each endpoint. 
@@ -38,6 +57,30 @@ tags_metadata = [
     }
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Charge le modèle une seule fois au démarrage et le garde dans l'état de l'application.
+    Le ModelHolder surveille l'alias en arrière-plan et recharge le modèle quand il change.
+    """
+    model_holder = ModelHolder(
+        tracking_uri=MLFLOW_TRACKING_URI,
+        model_uri=MODEL_URI,
+        refresh_interval=MODEL_REFRESH_INTERVAL,
+    )
+    await asyncio.to_thread(model_holder.start)
+    app.state.model_holder = model_holder
+    app.state.batcher = None
+    if PREDICT_BATCHING_ENABLED:
+        app.state.batcher = PredictionBatcher(model_holder, PREDICT_BATCH_MAX_SIZE, PREDICT_BATCH_MAX_WAIT_MS)
+        app.state.batcher.start()
+    yield
+    if app.state.batcher is not None:
+        await app.state.batcher.stop()
+    model_holder.stop()
+    await close_async_client()
+
+
 app = FastAPI(
     title="Fraud prediction API",
     description=description,
@@ -45,7 +88,8 @@ app = FastAPI(
     contact={
         "name": "REMUSAN Aurelie",
     },
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    lifespan=lifespan
 )
 
 
@@ -72,6 +116,155 @@ class PredictionFeatures(BaseModel):
     merch_lat: float
     merch_long: float
 
+
+# Ordre des colonnes attendu par le modèle (identique au jeu d'entraînement)
+FEATURE_COLUMNS = list(PredictionFeatures.model_fields.keys())
+
+
+def features_to_dataframe(items: list[PredictionFeatures]) -> pd.DataFrame:
+    """
+    Construit un DataFrame (une ligne par transaction) prêt pour le modèle.
+    """
+    return pd.DataFrame([item.model_dump() for item in items], columns=FEATURE_COLUMNS)
+
+
+def model_inputs(model, items: list[PredictionFeatures]):
+    """
+    Entrées du modèle : liste de dicts pour le scorer "fast" (pas de DataFrame),
+    DataFrame dans l'ordre FEATURE_COLUMNS pour le Pipeline sklearn et ONNX.
+    """
+    if hasattr(model, "score_record"):
+        return [item.model_dump() for item in items]
+    return features_to_dataframe(items)
+
+
+def parse_batch_body(body: bytes, content_type: str) -> list[PredictionFeatures]:
+    """
+    Lit un corps de requête contenant une liste de transactions,
+    au format tableau JSON ou NDJSON (une transaction JSON par ligne).
+    """
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            records = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Corps de requête JSON invalide : {e}")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=422, detail="Une liste de transactions est attendue")
+    try:
+        return [PredictionFeatures(**record) for record in records]
+    except (ValidationError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def score_batch(model, transactions: pd.DataFrame) -> tuple:
+    """
+    Un seul appel vectorisé au modèle pour tout le lot
+    (predict_proba uniquement, la classe est déduite du seuil FRAUD_THRESHOLD).
+    """
+    return predict_with_threshold(model, transactions)
+
+
+class PredictionBatcher:
+    """
+    Regroupe les appels concurrents à /predict en un seul appel vectorisé au modèle.
+
+    Les transactions sont accumulées jusqu'à max_batch_size éléments ou
+    max_wait_ms millisecondes après l'arrivée de la première, puis le résultat
+    de chaque ligne est renvoyé à la requête qui l'attend.
+    """
+
+    def __init__(self, model_holder: ModelHolder, max_batch_size: int, max_wait_ms: float):
+        self.model_holder = model_holder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self._task = None
+        self.batches_total = 0
+        self.items_total = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+        # Histogramme des tailles de lot atteintes (bornes supérieures)
+        self.batch_size_buckets = {bound: 0 for bound in (1, 2, 4, 8, 16, 32, 64, 128, 256)}
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, item: PredictionFeatures) -> tuple:
+        """
+        Ajoute une transaction au prochain lot et attend (prédiction, proba, version du modèle).
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _record(self, batch_size: int):
+        self.batches_total += 1
+        self.items_total += batch_size
+        self.last_batch_size = batch_size
+        self.max_batch_size_seen = max(self.max_batch_size_seen, batch_size)
+        for bound in self.batch_size_buckets:
+            if batch_size <= bound:
+                self.batch_size_buckets[bound] += 1
+                break
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Les requêtes abandonnées par le client n'ont plus besoin d'être scorées
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            model, model_version = self.model_holder.snapshot()
+            try:
+                transactions = model_inputs(model, [item for item, _ in batch])
+                predictions, probas = await asyncio.to_thread(score_batch, model, transactions)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._record(len(batch))
+            for (_, future), pred, proba in zip(batch, predictions, probas):
+                if not future.done():
+                    future.set_result((int(pred), float(proba), model_version))
+
+    def metrics(self) -> dict:
+        return {
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "avg_batch_size": self.items_total / self.batches_total if self.batches_total else 0,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size_seen": self.max_batch_size_seen,
+            "batch_size_buckets": {f"le_{bound}": count for bound, count in self.batch_size_buckets.items()},
+            "queue_size": self.queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
 @app.get("/", response_class=HTMLResponse)
 def read_root():
     return """
@@ -135,11 +328,10 @@ async def transaction():
     """
     Print informations about a CB transaction. 
     """
-    url = API_URL
-    r = requests.get(url, timeout=60)
-    r.raise_for_status()
-    transaction_json = json.loads(r.text)
-    transaction_json = json.loads(transaction_json)
+    # Client HTTP asynchrone partagé : l'appel ne bloque pas la boucle d'événements
+    transaction_json = await get_json_async(API_URL)
+    if isinstance(transaction_json, str):
+        transaction_json = json.loads(transaction_json)
 
     transaction_data = transaction_json["data"]
     columns = transaction_json["columns"]
@@ -156,58 +348,84 @@ async def transaction():
 
 
 
+@app.get("/health")
+def health(request: Request):
+    """
+    Vérifie que le modèle est chargé et renvoie sa version.
+    """
+    return {"status": "ok", "model_version": request.app.state.model_holder.version}
+
+
+@app.get("/metrics")
+def metrics(request: Request):
+    """
+    Métriques du micro-batching de /predict (taille des lots atteinte, file d'attente).
+    """
+    batcher = request.app.state.batcher
+    return {"batching_enabled": batcher is not None, **(batcher.metrics() if batcher else {})}
+
+
 @app.post("/predict", tags=["Machine Learning"])
-async def predict(predictionFeatures: PredictionFeatures):
+async def predict(predictionFeatures: PredictionFeatures, request: Request):
     """
     Prediction of fraud for a given CB transaction! (0 = not fraud, 1 = fraud) 
     """
-    # Read data 
-    transaction_to_test = pd.DataFrame(
-        {
-            "trans_date_trans_time": [predictionFeatures.trans_date_trans_time],
-            "cc_num": [predictionFeatures.cc_num],
-            "merchant": [predictionFeatures.merchant],
-            "category": [predictionFeatures.category],
-            "amt": [predictionFeatures.amt],
-            "first": [predictionFeatures.first],
-            "last": [predictionFeatures.last],
-            "gender": [predictionFeatures.gender],
-            "street": [predictionFeatures.street],
-            "city": [predictionFeatures.city],
-            "state": [predictionFeatures.state],
-            "zip": [predictionFeatures.zip],
-            "lat": [predictionFeatures.lat],
-            "long": [predictionFeatures.long],
-            "city_pop": [predictionFeatures.city_pop],
-            "job": [predictionFeatures.job],
-            "dob": [predictionFeatures.dob],
-            "trans_num": [predictionFeatures.trans_num],
-            "unix_time": [predictionFeatures.unix_time],
-            "merch_lat": [predictionFeatures.merch_lat],
-            "merch_long": [predictionFeatures.merch_long]
-        }
-    )
+    # Micro-batching : la transaction est scorée avec les autres requêtes concurrentes
+    batcher = request.app.state.batcher
+    if batcher is not None:
+        prediction, fraud_proba, model_version = await batcher.submit(predictionFeatures)
+        return {"prediction": prediction, "fraud_proba": fraud_proba, "model_version": model_version}
 
-    # Log model from mlflow 
-    logged_model = 'models:/fraud_detector_RF@production'
+    # Modèle chargé au démarrage (voir lifespan)
+    loaded_model, model_version = request.app.state.model_holder.snapshot()
 
-    # Load model as a PyFuncModel.
-    loaded_model = mlflow.pyfunc.load_model(logged_model)
+    # Scorer "fast" : la transaction est vectorisée directement, sans DataFrame ni thread
+    if hasattr(loaded_model, "score_record"):
+        fraud_proba = loaded_model.score_record(predictionFeatures.model_dump())
+        return {"prediction": int(fraud_proba > FRAUD_THRESHOLD), "fraud_proba": fraud_proba, "model_version": model_version}
+
+    # Read data 
+    transaction_to_test = features_to_dataframe([predictionFeatures])
 
     # If you want to load model persisted locally
     #loaded_model = joblib.load('salary_predictor/model.joblib')
 
-    prediction = loaded_model.predict(transaction_to_test)
+    predictions, probas = await asyncio.to_thread(score_batch, loaded_model, transaction_to_test)
     
     # # Log for evidently monitoring
     # log_prediction(
     #     features=transaction_to_test,
-    #     prediction=prediction,
+    #     prediction=predictions,
     #     timestamp=datetime.now()
     # )
 
     # Format response
-    response = {"prediction": prediction.tolist()[0]}
+    response = {"prediction": int(predictions[0]), "fraud_proba": float(probas[0]), "model_version": model_version}
+    return response
+
+
+@app.post("/predict/batch", tags=["Machine Learning"])
+async def predict_batch(request: Request):
+    """
+    Prediction of fraud for a batch of CB transactions (JSON array or NDJSON body).
+    Returns the prediction and the fraud probability for each `trans_num`.
+    """
+    body = await request.body()
+    items = parse_batch_body(body, request.headers.get("content-type", ""))
+    if not items:
+        return {"predictions": [], "model_version": request.app.state.model_holder.version}
+
+    loaded_model, model_version = request.app.state.model_holder.snapshot()
+    transactions = model_inputs(loaded_model, items)
+    predictions, probas = await asyncio.to_thread(score_batch, loaded_model, transactions)
+
+    response = {
+        "predictions": [
+            {"trans_num": item.trans_num, "prediction": int(pred), "fraud_proba": float(proba)}
+            for item, pred, proba in zip(items, predictions, probas)
+        ],
+        "model_version": model_version,
+    }
     return response
 
 
@@ -0,0 +1,552 @@
+# monitoring/drift_sketches.py
+import os
+import json
+import math
+import time
+import atexit
+import bisect
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from dotenv import find_dotenv, load_dotenv
+import logging
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+env_path = find_dotenv()
+load_dotenv(env_path, override=True)
+
+# Suivi du drift en continu (sketches mis à jour à chaque prédiction loggée)
+DRIFT_SKETCHES_ENABLED = os.getenv("DRIFT_SKETCHES_ENABLED", "true").lower() in ("1", "true", "yes")
+# Sketches de référence (construits à partir des données de référence)
+DRIFT_REFERENCE_PATH = os.getenv(
+    "DRIFT_REFERENCE_PATH", str(Path(__file__).parent / "reference_data" / "drift_reference.json")
+)
+# Dernier état des sketches courants et des scores de drift : chaque process écrit
+# son propre fichier (<nom>-<pid>.json), fusionnés à la lecture par load_drift_state
+DRIFT_STATE_PATH = os.getenv(
+    "DRIFT_STATE_PATH", str(Path(__file__).parent.parent / "data" / "drift_state.json")
+)
+# Intervalle (en secondes) d'écriture de l'état courant
+DRIFT_SNAPSHOT_SECONDS = float(os.getenv("DRIFT_SNAPSHOT_SECONDS", "60"))
+# Durée (en secondes) d'une fenêtre de drift : fenêtres fixes alignées sur l'horloge, donc
+# communes à tous les process ; les sketches courants repartent de zéro à chaque fenêtre
+DRIFT_WINDOW_SECONDS = float(os.getenv("DRIFT_WINDOW_SECONDS", "3600"))
+# Un fichier d'état non mis à jour depuis N fenêtres (process arrêté) est supprimé à la lecture
+DRIFT_STATE_MAX_WINDOWS = int(os.getenv("DRIFT_STATE_MAX_WINDOWS", "3"))
+# Une alerte portant sur les mêmes features n'est renvoyée qu'après N secondes
+DRIFT_REALERT_SECONDS = float(os.getenv("DRIFT_REALERT_SECONDS", "86400"))
+# Nombre de classes des histogrammes de référence
+DRIFT_BINS = int(os.getenv("DRIFT_BINS", "20"))
+# Seuil de PSI au-delà duquel une feature est considérée en drift
+DRIFT_PSI_ALERT = float(os.getenv("DRIFT_PSI_ALERT", "0.2"))
+# Nombre minimal de prédictions avant de calculer les scores
+DRIFT_MIN_COUNT = int(os.getenv("DRIFT_MIN_COUNT", "100"))
+
+NUMERIC_FEATURES = ("amt", "city_pop", "distance")
+CATEGORICAL_FEATURES = ("category", "gender", "state")
+# Catégories absentes de la référence (ou au-delà de max_categories)
+OTHER = "__other__"
+REFERENCE_FORMAT_VERSION = 1
+# Lissage des proportions nulles pour PSI et Jensen-Shannon
+_EPSILON = 1e-6
+
+
+def transaction_distance(record: dict) -> float:
+    """
+    Distance transaction / commerçant, même formule que dataset_processing (app/model_features.py).
+    """
+    lat, long = float(record["lat"]), float(record["long"])
+    merch_lat, merch_long = float(record["merch_lat"]), float(record["merch_long"])
+    return (((lat - merch_lat) * math.cos(math.radians((long + merch_long) / 2))) ** 2 + (long - merch_long) ** 2) ** 1 / 2 * 111.12
+
+
+class HistogramSketch:
+    """
+    Histogramme à classes fixes d'une feature numérique.
+    counts[0] compte les valeurs < edges[0], counts[-1] celles >= edges[-1].
+    """
+
+    def __init__(self, edges: List[float], counts: Optional[List[int]] = None):
+        self.edges = [float(edge) for edge in edges]
+        self.counts = list(counts) if counts is not None else [0] * (len(self.edges) + 1)
+
+    @classmethod
+    def from_values(cls, values, bins: int = DRIFT_BINS) -> "HistogramSketch":
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        # Classes de même effectif sur la référence (quantiles)
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+        sketch = cls(edges.tolist())
+        indices = np.searchsorted(edges, values, side="right")
+        sketch.counts = np.bincount(indices, minlength=len(edges) + 1).tolist()
+        return sketch
+
+    def empty_like(self) -> "HistogramSketch":
+        return HistogramSketch(self.edges)
+
+    def update(self, value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if not math.isnan(value):
+            self.counts[bisect.bisect_right(self.edges, value)] += 1
+
+    def support(self) -> List[float]:
+        """
+        Valeur représentative de chaque classe (bornes pour les classes ouvertes).
+        """
+        middles = [(low + high) / 2 for low, high in zip(self.edges, self.edges[1:])]
+        return [self.edges[0]] + middles + [self.edges[-1]]
+
+    def to_dict(self) -> dict:
+        return {"type": "histogram", "edges": self.edges, "counts": self.counts}
+
+
+class CounterSketch:
+    """
+    Fréquences d'une feature catégorielle, bornées à max_categories (le reste dans OTHER).
+    Une sketch créée par empty_like() ne compte que les catégories de la référence.
+    """
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None, max_categories: int = 100, fixed: bool = False):
+        self.counts = dict(counts or {})
+        self.max_categories = max_categories
+        self.fixed = fixed
+
+    @classmethod
+    def from_values(cls, values, max_categories: int = 100) -> "CounterSketch":
+        sketch = cls(max_categories=max_categories)
+        for value in values:
+            sketch.update(value)
+        return sketch
+
+    def empty_like(self) -> "CounterSketch":
+        return CounterSketch({key: 0 for key in self.counts}, self.max_categories, fixed=True)
+
+    def update(self, value):
+        key = str(value)
+        if key not in self.counts and (self.fixed or len(self.counts) >= self.max_categories):
+            key = OTHER
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {"type": "counter", "counts": self.counts, "max_categories": self.max_categories}
+
+
+def sketch_from_dict(data: dict):
+    if data["type"] == "histogram":
+        return HistogramSketch(data["edges"], data["counts"])
+    return CounterSketch(data["counts"], data.get("max_categories", 100))
+
+
+def _aligned_counts(reference, current) -> tuple:
+    if isinstance(reference, HistogramSketch):
+        return reference.counts, current.counts
+    keys = sorted(set(reference.counts) | set(current.counts))
+    return [reference.counts.get(k, 0) for k in keys], [current.counts.get(k, 0) for k in keys]
+
+
+def _proportions(counts: List[int], epsilon: float = _EPSILON) -> List[float]:
+    total = sum(counts)
+    return [(count + epsilon) / (total + epsilon * len(counts)) for count in counts]
+
+
+def psi(reference_counts: List[int], current_counts: List[int]) -> float:
+    """
+    Population Stability Index : somme de (c - r) * ln(c / r) sur les classes.
+    """
+    ref, cur = _proportions(reference_counts), _proportions(current_counts)
+    return sum((c - r) * math.log(c / r) for r, c in zip(ref, cur))
+
+
+def jensen_shannon(reference_counts: List[int], current_counts: List[int]) -> float:
+    """
+    Divergence de Jensen-Shannon en base 2 (entre 0 et 1).
+    """
+    ref, cur = _proportions(reference_counts), _proportions(current_counts)
+    mid = [(r + c) / 2 for r, c in zip(ref, cur)]
+    kl_ref = sum(r * math.log2(r / m) for r, m in zip(ref, mid))
+    kl_cur = sum(c * math.log2(c / m) for c, m in zip(cur, mid))
+    return (kl_ref + kl_cur) / 2
+
+
+def wasserstein(reference: HistogramSketch, current: HistogramSketch) -> float:
+    """
+    Distance de Wasserstein-1 entre deux histogrammes de mêmes classes, chaque classe
+    étant représentée par sa valeur de support().
+    """
+    ref_total, cur_total = sum(reference.counts), sum(current.counts)
+    if not ref_total or not cur_total:
+        return 0.0
+    support = reference.support()
+    distance = 0.0
+    ref_cdf = cur_cdf = 0.0
+    for i in range(len(support) - 1):
+        ref_cdf += reference.counts[i] / ref_total
+        cur_cdf += current.counts[i] / cur_total
+        distance += abs(ref_cdf - cur_cdf) * (support[i + 1] - support[i])
+    return distance
+
+
+def build_reference_sketches(df, bins: int = DRIFT_BINS) -> dict:
+    """
+    Sketches de référence à partir d'un DataFrame de transactions brutes (ex : baseline.parquet).
+    """
+    sketches = {}
+    if "distance" not in df.columns and {"lat", "long", "merch_lat", "merch_long"} <= set(df.columns):
+        df = df.assign(distance=[transaction_distance(record) for record in df[["lat", "long", "merch_lat", "merch_long"]].to_dict("records")])
+    for name in NUMERIC_FEATURES:
+        if name in df.columns:
+            sketches[name] = HistogramSketch.from_values(df[name].to_numpy(), bins)
+    for name in CATEGORICAL_FEATURES:
+        if name in df.columns:
+            sketches[name] = CounterSketch.from_values(df[name].tolist())
+    return sketches
+
+
+def save_reference_sketches(sketches: dict, path: str = DRIFT_REFERENCE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "format_version": REFERENCE_FORMAT_VERSION,
+        "features": {name: sketch.to_dict() for name, sketch in sketches.items()},
+    }
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+    logging.info(f"✅ Sketches de référence sauvegardés : {path}")
+
+
+def load_reference_sketches(path: str = DRIFT_REFERENCE_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("format_version") != REFERENCE_FORMAT_VERSION:
+        raise ValueError(f"Version de sketches non supportée : {data.get('format_version')}")
+    return {name: sketch_from_dict(sketch) for name, sketch in data["features"].items()}
+
+
+def drift_scores(reference: dict, current: dict) -> dict:
+    """
+    {feature: {"psi": ..., "js": ..., "wasserstein": ... (numériques uniquement)}}
+    pour les features présentes dans les deux ensembles de sketches.
+    """
+    scores = {}
+    for name, ref in reference.items():
+        cur = current.get(name)
+        if cur is None:
+            continue
+        ref_counts, cur_counts = _aligned_counts(ref, cur)
+        if not sum(cur_counts):
+            continue
+        feature_scores = {"psi": psi(ref_counts, cur_counts), "js": jensen_shannon(ref_counts, cur_counts)}
+        if isinstance(ref, HistogramSketch):
+            feature_scores["wasserstein"] = wasserstein(ref, cur)
+        scores[name] = feature_scores
+    return scores
+
+
+def drifted_features(scores: dict, threshold: float = DRIFT_PSI_ALERT) -> List[str]:
+    return [name for name, score in scores.items() if score["psi"] > threshold]
+
+
+def process_state_path(path: str = DRIFT_STATE_PATH, pid: Optional[int] = None) -> str:
+    """
+    Fichier d'état du process : <nom>-<pid><suffixe> à côté de `path`.
+    """
+    path = Path(path)
+    return str(path.with_name(f"{path.stem}-{os.getpid() if pid is None else pid}{path.suffix}"))
+
+
+class DriftMonitor:
+    """
+    Sketches courants (mémoire constante) mis à jour à chaque prédiction loggée,
+    et scores de drift (PSI, Jensen-Shannon, Wasserstein) par rapport aux sketches de référence.
+
+    Les sketches couvrent une fenêtre de window_seconds alignée sur l'horloge : à la fin
+    de la fenêtre, ils sont gardés dans `previous` (dernière fenêtre complète) puis remis
+    à zéro. Les scores ne sont donc pas une moyenne depuis le démarrage du process.
+
+    Si reference_path est fourni, les sketches de référence sont rechargés quand le fichier
+    change (nouvelle version du modèle en production, voir reload_reference).
+    """
+
+    def __init__(
+        self,
+        reference: dict,
+        state_path: Optional[str] = None,
+        snapshot_seconds: float = DRIFT_SNAPSHOT_SECONDS,
+        window_seconds: float = DRIFT_WINDOW_SECONDS,
+        reference_path: Optional[str] = None,
+    ):
+        self.reference = reference
+        self.reference_path = reference_path
+        self.state_path = state_path or process_state_path()
+        self.snapshot_seconds = snapshot_seconds
+        self.window_seconds = window_seconds
+        # Dernière fenêtre complète : {"start", "count", "current"} (sketches en dict)
+        self.previous = None
+        self._reference_mtime = None
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+        self.reset()
+
+    def _window_start(self, now: float) -> float:
+        return now - now % self.window_seconds if self.window_seconds else 0.0
+
+    def _reset(self, now: Optional[float] = None):
+        self.current = {name: sketch.empty_like() for name, sketch in self.reference.items()}
+        self.count = 0
+        self.window_start = self._window_start(time.time() if now is None else now)
+
+    def reset(self, now: Optional[float] = None):
+        with self._lock:
+            self._reset(now)
+
+    def reload_reference(self) -> bool:
+        """
+        Recharge les sketches de référence si reference_path a été modifié ou vient d'apparaître.
+        Les sketches courants et la dernière fenêtre, comparés à l'ancienne référence,
+        sont alors remis à zéro. Retourne True si la référence a été rechargée.
+        """
+        if not self.reference_path:
+            return False
+        try:
+            mtime = os.path.getmtime(self.reference_path)
+        except OSError:
+            return False
+        if mtime == self._reference_mtime:
+            return False
+        try:
+            reference = load_reference_sketches(self.reference_path)
+        except (OSError, ValueError) as e:
+            logging.error(f"⚠️ Sketches de référence illisibles ({self.reference_path}) : {e}")
+            return False
+        with self._lock:
+            self.reference = reference
+            self._reference_mtime = mtime
+            self.previous = None
+            self._reset()
+        logging.info(f"🔄 Sketches de référence rechargés : {self.reference_path}")
+        return True
+
+    def roll(self, now: Optional[float] = None) -> bool:
+        """
+        Clôt la fenêtre courante si elle est terminée. Retourne True si une fenêtre a été close.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._window_start(now) == self.window_start:
+                return False
+            self.previous = {
+                "start": self.window_start,
+                "count": self.count,
+                "current": {name: sketch.to_dict() for name, sketch in self.current.items()},
+            }
+            self._reset(now)
+            return True
+
+    def update(self, records: List[dict], now: Optional[float] = None):
+        """
+        Met à jour les sketches avec des transactions (features brutes loggées).
+        """
+        self.roll(now)
+        with self._lock:
+            for record in records:
+                self.count += 1
+                for name, sketch in self.current.items():
+                    if name == "distance" and name not in record:
+                        try:
+                            sketch.update(transaction_distance(record))
+                        except (KeyError, TypeError, ValueError):
+                            continue
+                    elif name in record:
+                        sketch.update(record[name])
+
+    def update_entries(self, entries: List[dict], now: Optional[float] = None):
+        self.reload_reference()
+        for entry in entries:
+            self.update(entry.get("features") or [], now)
+
+    def scores(self) -> dict:
+        """
+        Scores de la fenêtre courante (voir drift_scores).
+        """
+        with self._lock:
+            return drift_scores(self.reference, self.current)
+
+    def previous_scores(self) -> dict:
+        """
+        Scores de la dernière fenêtre complète ({} s'il n'y en a pas encore).
+        """
+        if self.previous is None:
+            return {}
+        current = {name: sketch_from_dict(sketch) for name, sketch in self.previous["current"].items()}
+        return drift_scores(self.reference, current)
+
+    def drifted_features(self, threshold: float = DRIFT_PSI_ALERT) -> List[str]:
+        if self.count < DRIFT_MIN_COUNT:
+            return []
+        return drifted_features(self.scores(), threshold)
+
+    def save(self):
+        """
+        Écrit l'état du process (fenêtre courante et dernière fenêtre complète) dans state_path.
+        """
+        with self._lock:
+            current = {name: sketch.to_dict() for name, sketch in self.current.items()}
+            count = self.count
+            window_start = self.window_start
+            previous = self.previous
+        state = {
+            "updated_at": time.time(),
+            "pid": os.getpid(),
+            "window_seconds": self.window_seconds,
+            "window_start": window_start,
+            "count": count,
+            "scores": self.scores(),
+            "current": current,
+            "previous": previous,
+        }
+        path = Path(self.state_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """
+        Supprime le fichier d'état du process : il ne doit pas rester après son arrêt.
+        """
+        try:
+            Path(self.state_path).unlink(missing_ok=True)
+        except OSError as e:
+            logging.warning(f"⚠️ Impossible de supprimer l'état de drift {self.state_path} : {e}")
+
+    def maybe_save(self, now: Optional[float] = None):
+        """
+        Écrit l'état au plus toutes les snapshot_seconds. Les features en drift sont
+        signalées une seule fois par fenêtre, à sa clôture.
+        """
+        if self.roll(now) and self.previous["count"] >= DRIFT_MIN_COUNT:
+            drifted = drifted_features(self.previous_scores())
+            if drifted:
+                logging.warning(f"⚠️ Drift détecté (PSI > {DRIFT_PSI_ALERT}) sur : {', '.join(drifted)}")
+        if time.monotonic() - self._saved_at < self.snapshot_seconds:
+            return
+        self._saved_at = time.monotonic()
+        try:
+            self.save()
+        except Exception as e:
+            logging.error(f"⚠️ Erreur lors de l'écriture de l'état de drift : {e}")
+
+
+def drift_state_files(path: str = DRIFT_STATE_PATH) -> List[Path]:
+    path = Path(path)
+    return sorted(path.parent.glob(f"{path.stem}-*{path.suffix}"))
+
+
+def _add_counts(total: Optional[dict], sketch: dict) -> dict:
+    if total is None:
+        return {**sketch, "counts": list(sketch["counts"]) if sketch["type"] == "histogram" else dict(sketch["counts"])}
+    if sketch["type"] == "histogram":
+        total["counts"] = [a + b for a, b in zip(total["counts"], sketch["counts"])]
+    else:
+        for key, count in sketch["counts"].items():
+            total["counts"][key] = total["counts"].get(key, 0) + count
+    return total
+
+
+def load_drift_state(
+    path: str = DRIFT_STATE_PATH,
+    reference: Optional[dict] = None,
+    now: Optional[float] = None,
+) -> Optional[dict]:
+    """
+    Fusionne les états écrits par les process (voir process_state_path) pour la dernière
+    fenêtre complète : les compteurs de tous les process sont additionnés, puis les scores
+    recalculés par rapport aux sketches de référence.
+    Retourne {"window_start", "window_seconds", "count", "processes", "scores"},
+    ou None s'il n'y a pas encore de fenêtre complète.
+    Les fichiers non modifiés depuis DRIFT_STATE_MAX_WINDOWS fenêtres (process arrêté
+    sans nettoyage) sont supprimés sans être lus.
+    """
+    now = time.time() if now is None else now
+    max_age = DRIFT_STATE_MAX_WINDOWS * DRIFT_WINDOW_SECONDS
+    windows = []
+    for state_path in drift_state_files(path):
+        try:
+            if max_age and now - state_path.stat().st_mtime > max_age:
+                state_path.unlink()
+                logging.info(f"🗑️ État de drift périmé supprimé : {state_path.name}")
+                continue
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ État de drift illisible {state_path} : {e}")
+            continue
+        window_seconds = state.get("window_seconds") or 0
+        # La fenêtre courante d'un process sans activité depuis est terminée elle aussi
+        if window_seconds and state["window_start"] + window_seconds <= now:
+            windows.append((state["window_start"], window_seconds, state["count"], state["current"]))
+        if state.get("previous"):
+            previous = state["previous"]
+            windows.append((previous["start"], window_seconds, previous["count"], previous["current"]))
+    if not windows:
+        return None
+    if reference is None:
+        reference = load_reference_sketches()
+    last_start = max(start for start, _, _, _ in windows)
+    merged, count, processes = {}, 0, 0
+    for start, seconds, window_count, current in windows:
+        if start != last_start:
+            continue
+        window_seconds = seconds
+        processes += 1
+        count += window_count
+        for name, sketch in current.items():
+            # Sketches calculés avec une autre référence (avant son rechargement) : ignorés
+            ref = reference.get(name)
+            if ref is None or (sketch["type"] == "histogram" and sketch["edges"] != ref.edges):
+                continue
+            merged[name] = _add_counts(merged.get(name), sketch)
+    current = {name: sketch_from_dict(sketch) for name, sketch in merged.items()}
+    return {
+        "window_start": last_start,
+        "window_seconds": window_seconds,
+        "count": count,
+        "processes": processes,
+        "scores": drift_scores(reference, current),
+    }
+
+
+_drift_monitor = None
+_drift_monitor_lock = threading.Lock()
+
+
+def get_drift_monitor() -> Optional[DriftMonitor]:
+    """
+    DriftMonitor partagé par le process, ou None si le suivi est désactivé.
+    Les sketches de référence sont lus depuis DRIFT_REFERENCE_PATH, et rechargés
+    quand le fichier change : tant qu'il est absent, aucune feature n'est suivie.
+    """
+    global _drift_monitor
+    if not DRIFT_SKETCHES_ENABLED:
+        return None
+    if _drift_monitor is None:
+        with _drift_monitor_lock:
+            if _drift_monitor is None:
+                monitor = DriftMonitor({}, reference_path=DRIFT_REFERENCE_PATH)
+                if not monitor.reload_reference():
+                    logging.info(f"ℹ️ Pas de sketches de référence ({DRIFT_REFERENCE_PATH}), suivi du drift en attente")
+                atexit.register(monitor.close)
+                _drift_monitor = monitor
+    return _drift_monitor
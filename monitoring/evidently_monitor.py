@@ -1,13 +1,34 @@
 # monitoring/evidently_monitor.py
+import os
+import gzip
+import bisect
 import json
-from datetime import datetime
+import queue
+import atexit
+import random
+import shutil
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Union, Optional
+from typing import Dict, Iterator, List, Tuple, Union, Optional
 import pandas as pd
 import numpy as np
 
 from dotenv import find_dotenv, load_dotenv
 import logging
+# Rendre les modules du dossier monitoring importables (exécution directe ou via le package monitoring)
+sys.path.insert(0, str(Path(__file__).parent))
+from prediction_store import MONITORING_STORE, PredictionStore, entries_to_frame, get_prediction_store
+from drift_sketches import DriftMonitor, get_drift_monitor
+
+# orjson est optionnel : sans lui, les entrées sont sérialisées avec json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -16,13 +37,263 @@ logging.basicConfig(
 env_path = find_dotenv()
 load_dotenv(env_path, override=True)
 
+# Fichier de log des prédictions (partagé par l'écriture et la lecture)
+MONITORING_LOG_FILE = os.getenv(
+    "MONITORING_LOG_FILE", str(Path(__file__).parent.parent / "data" / "monitoring_predictions.jsonl")
+)
+# Nombre maximal d'entrées en attente d'écriture (au-delà, les nouvelles entrées sont ignorées)
+MONITORING_QUEUE_SIZE = int(os.getenv("MONITORING_QUEUE_SIZE", "10000"))
+# Intervalle (en secondes) d'écriture des entrées en attente
+MONITORING_FLUSH_SECONDS = float(os.getenv("MONITORING_FLUSH_SECONDS", "1"))
+# Rotation du fichier de log : taille maximale en octets et âge maximal en secondes (0 = pas de rotation)
+MONITORING_ROTATE_BYTES = int(os.getenv("MONITORING_ROTATE_BYTES", "0"))
+MONITORING_ROTATE_SECONDS = float(os.getenv("MONITORING_ROTATE_SECONDS", "0"))
+# Compression gzip des fichiers après rotation
+MONITORING_COMPRESS = os.getenv("MONITORING_COMPRESS", "false").lower() in ("1", "true", "yes")
+# Part des prédictions dont les features complètes sont loggées en INFO (les autres en DEBUG)
+MONITORING_LOG_SAMPLE_RATE = float(os.getenv("MONITORING_LOG_SAMPLE_RATE", "0"))
+
+
+def _dumps(entry: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(entry, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(entry, default=str).encode("utf-8")
+
+
+def log_file_path(log_file: str = MONITORING_LOG_FILE) -> Path:
+    """
+    Chemin du fichier de log : un chemin relatif l'est à la racine du projet,
+    quel que soit le répertoire courant (écriture et lecture utilisent le même fichier).
+    """
+    return Path(__file__).parent.parent / log_file
+
+
+def rotated_log_files(log_path: Path) -> List[Path]:
+    """
+    Fichiers issus de la rotation de log_path (du plus ancien au plus récent).
+    """
+    return sorted(
+        path for path in log_path.parent.glob(f"{log_path.stem}-*{log_path.suffix}*")
+        if path.suffix != ".idx"
+    )
+
+
+def log_index_path(log_path: Path) -> Path:
+    """
+    Index associé à un fichier de log : une ligne "<heure>\t<offset>" par heure, donnant
+    la position (en octets) de la première entrée de cette heure dans le fichier.
+    """
+    return log_path.with_name(f"{log_path.name}.idx")
+
+
+def read_log_index(log_path: Path) -> List[Tuple[str, int]]:
+    index_path = log_index_path(log_path)
+    if not index_path.exists():
+        return []
+    index = []
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                hour, offset = line.rstrip("\n").split("\t")
+                index.append((hour, int(offset)))
+            except ValueError:
+                continue
+    return index
+
+
+def window_offset(log_path: Path, start: datetime) -> int:
+    """
+    Position à partir de laquelle lire log_path pour trouver les entrées postérieures à start.
+    Recherche dichotomique dans l'index ; 0 (tout le fichier) si l'index est absent ou ne
+    couvre pas le début du fichier.
+    """
+    index = read_log_index(log_path)
+    if not index or index[0][1] != 0:
+        return 0
+    i = bisect.bisect_left([hour for hour, _ in index], f"{start:%Y-%m-%dT%H}")
+    # Toutes les heures indexées sont antérieures : on repart de la dernière (l'index peut être en retard)
+    return index[min(i, len(index) - 1)][1]
+
+
+class MonitoringWriter:
+    """
+    Écriture non bloquante des entrées de monitoring dans un fichier JSONL.
+
+    write() met l'entrée en file ; un thread en arrière-plan les sérialise et
+    les écrit par lots toutes les flush_seconds. Le fichier est renommé
+    (monitoring_predictions-<date>.jsonl, compressé en .gz si demandé) quand il
+    dépasse rotate_bytes ou qu'il est ouvert depuis plus de rotate_seconds.
+    close() écrit les entrées restantes.
+
+    Si un `store` Parquet est fourni (MONITORING_STORE=parquet), les entrées lui sont
+    transmises au lieu d'être écrites dans le fichier JSONL.
+
+    Si un DriftMonitor est fourni, ses sketches sont mis à jour avec chaque lot
+    d'entrées, dans le thread d'écriture (l'appelant n'attend pas).
+    """
+
+    def __init__(
+        self,
+        log_path: Path,
+        queue_size: int = MONITORING_QUEUE_SIZE,
+        flush_seconds: float = MONITORING_FLUSH_SECONDS,
+        rotate_bytes: int = MONITORING_ROTATE_BYTES,
+        rotate_seconds: float = MONITORING_ROTATE_SECONDS,
+        compress: bool = MONITORING_COMPRESS,
+        store: Optional[PredictionStore] = None,
+        drift: Optional[DriftMonitor] = None,
+    ):
+        self.log_path = Path(log_path)
+        self.index_path = log_index_path(self.log_path)
+        self.store = store
+        self.drift = drift
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._opened_at = time.time()
+        self._stop_event = threading.Event()
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        # Dernière heure indexée du fichier courant (les entrées arrivent dans l'ordre chronologique)
+        index = read_log_index(self.log_path) if self.log_path.exists() else []
+        self._last_hour = index[-1][0] if index else ""
+        self._thread = threading.Thread(target=self._run, name="monitoring-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, entry: dict):
+        """
+        Met l'entrée en file d'écriture sans jamais bloquer l'appelant.
+        """
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logging.warning(f"⚠️ File de monitoring pleine, {self.dropped} entrées ignorées")
+
+    def _drain(self) -> list:
+        entries = []
+        while True:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                return entries
+
+    def _rotate(self):
+        # Microsecondes pour garder l'ordre chronologique, suffixe aléatoire pour qu'une
+        # deuxième rotation dans la même seconde n'écrase jamais la précédente
+        rotated = self.log_path.with_name(
+            f"{self.log_path.stem}-{datetime.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}{self.log_path.suffix}"
+        )
+        self.log_path.rename(rotated)
+        # L'index suit le fichier ; il n'est pas gardé pour un fichier compressé (lu en entier)
+        if self.index_path.exists():
+            if self.compress:
+                self.index_path.unlink()
+            else:
+                self.index_path.rename(log_index_path(rotated))
+        self._last_hour = ""
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+        self._opened_at = time.time()
+        logging.info(f"🔄 Rotation du log de monitoring : {rotated.name}")
+
+    def _should_rotate(self) -> bool:
+        if not self.log_path.exists():
+            return False
+        if self.rotate_bytes and self.log_path.stat().st_size >= self.rotate_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.time() - self._opened_at >= self.rotate_seconds
+
+    def flush(self):
+        entries = self._drain()
+        if not entries:
+            return
+        if self.drift is not None:
+            try:
+                self.drift.update_entries(entries)
+                self.drift.maybe_save()
+            except Exception as e:
+                logging.error(f"⚠️ Erreur lors de la mise à jour des sketches de drift : {e}")
+        try:
+            if self.store is not None:
+                self.store.add_entries(entries)
+                self.written += len(entries)
+                return
+            with open(self.log_path, "ab") as f:
+                offset = f.tell()
+                lines = []
+                index = []
+                for entry in entries:
+                    line = _dumps(entry) + b"\n"
+                    hour = str(entry.get("timestamp", ""))[:13]
+                    if hour > self._last_hour:
+                        index.append(f"{hour}\t{offset}\n")
+                        self._last_hour = hour
+                    offset += len(line)
+                    lines.append(line)
+                f.write(b"".join(lines))
+            if index:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.writelines(index)
+            self.written += len(entries)
+            if self._should_rotate():
+                self._rotate()
+        except Exception as e:
+            logging.error(f"⚠️ Erreur lors de l'écriture de {len(entries)} entrées de monitoring : {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_seconds):
+            self.flush()
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        if self.drift is not None:
+            try:
+                self.drift.save()
+            except Exception as e:
+                logging.error(f"⚠️ Erreur lors de l'écriture de l'état de drift : {e}")
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_monitoring_writer(log_path: Path) -> MonitoringWriter:
+    """
+    Writer partagé par le process pour un fichier de log, vidé automatiquement à la sortie.
+    """
+    log_path = Path(log_path)
+    writer = _writers.get(log_path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(log_path)
+            if writer is None:
+                store = get_prediction_store() if MONITORING_STORE == "parquet" else None
+                writer = MonitoringWriter(log_path, store=store, drift=get_drift_monitor())
+                _writers[log_path] = writer
+                atexit.register(writer.close)
+    return writer
+
+
+def close_monitoring_writers():
+    for writer in list(_writers.values()):
+        writer.close()
+
 
 def log_prediction(
     features: Union[Dict, pd.DataFrame, List],
     prediction: Union[int, float, List, np.ndarray],
     actual: Optional[Union[int, float, List, np.ndarray]] = None,
     timestamp: Optional[datetime] = None,
-    log_file: str = 'data/monitoring_predictions.jsonl'
+    log_file: str = MONITORING_LOG_FILE
 ):
     """
     Enregistre une prédiction pour le monitoring Evidently
@@ -34,7 +305,7 @@ def log_prediction(
         timestamp: Horodatage (par défaut: maintenant)
         log_file: Chemin du fichier de log
     """
-    logging.info("📝 Logging de la prédiction pour le monitoring Evidently")
+    logging.debug("📝 Logging de la prédiction pour le monitoring Evidently")
     if timestamp is None:
         timestamp = datetime.now()
     
@@ -71,31 +342,23 @@ def log_prediction(
             actuals_list = [actual]
     
     # Créer l'objet à logger
-    logging.info("📝 Préparation de l'entrée de log")
     log_entry = {
         'timestamp': timestamp.isoformat(),
         'predictions': predictions_list,
         'features': features_list,
         'actuals': actuals_list
     }
-    logging.info(f"📝 Entrée de log préparée : pred={predictions_list}, features={features_list}")
-    
-    # Obtenir le répertoire parent de la base de la librairie
-    lib_dir = Path(__file__).parent.parent
+    # Features complètes en DEBUG, ou en INFO pour un échantillon des prédictions
+    if MONITORING_LOG_SAMPLE_RATE and random.random() < MONITORING_LOG_SAMPLE_RATE:
+        logging.info(f"📝 Entrée de log préparée : pred={predictions_list}, features={features_list}")
+    elif logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"📝 Entrée de log préparée : pred={predictions_list}, features={features_list}")
     
-    # Construire le chemin complet du fichier de log
-    log_path = lib_dir / log_file
+    # Construire le chemin complet du fichier de log (relatif à la racine du projet)
+    log_path = log_file_path(log_file)
     
-    # Créer le répertoire parent si nécessaire
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Écrire dans le fichier JSONL (une ligne par prédiction)
-    try:
-        logging.info(f"📝 Écriture de la prédiction dans le fichier {log_path}")
-        with open(log_path, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception as e:
-        print(f"⚠️ Erreur lors du logging de la prédiction: {e}")
+    # Écriture en arrière-plan dans le fichier JSONL (une ligne par appel) : l'appelant n'attend pas le disque
+    get_monitoring_writer(log_path).write(log_entry)
 
 
 def log_batch_predictions(
@@ -103,7 +366,7 @@ def log_batch_predictions(
     predictions: Union[List, np.ndarray],
     actuals: Optional[Union[List, np.ndarray]] = None,
     timestamp: Optional[datetime] = None,
-    log_file: str = '/data/monitoring_predictions.jsonl'
+    log_file: str = MONITORING_LOG_FILE
 ):
     """
     Enregistre un batch de prédictions pour le monitoring
@@ -135,9 +398,60 @@ def log_batch_predictions(
     )
 
 
+def read_logged_entries(start: datetime, log_file: str = MONITORING_LOG_FILE) -> Iterator[dict]:
+    """
+    Entrées du log JSONL (fichiers de rotation puis fichier courant) horodatées après start.
+    Chaque fichier non compressé est lu à partir de la position donnée par son index.
+    """
+    log_path = log_file_path(log_file)
+    for path in rotated_log_files(log_path) + [log_path]:
+        # Seuls les fichiers modifiés après start peuvent contenir des entrées de la fenêtre
+        if not path.exists() or datetime.fromtimestamp(path.stat().st_mtime) < start:
+            continue
+        if path.suffix == '.gz':
+            f = gzip.open(path, 'rb')
+        else:
+            f = open(path, 'rb')
+            f.seek(window_offset(path, start))
+        with f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                    if datetime.fromisoformat(data['timestamp']) >= start:
+                        yield data
+                except Exception:
+                    continue
+
+
+def read_logged_predictions(
+    hours: int = 24,
+    log_file: str = MONITORING_LOG_FILE,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Prédictions loggées des dernières X heures, depuis le store Parquet ou le log JSONL
+    selon MONITORING_STORE (une ligne par prédiction : features, 'prediction', 'target').
+    
+    Args:
+        hours: Nombre d'heures à récupérer
+        log_file: Chemin du fichier de log (format JSONL)
+        columns: Colonnes à charger (toutes par défaut)
+    """
+    cutoff_time = datetime.now() - timedelta(hours=hours)
+    
+    if MONITORING_STORE == "parquet":
+        # Seules les partitions horaires de la fenêtre sont lues
+        df = PredictionStore().read_window(cutoff_time, columns=columns)
+    else:
+        df = entries_to_frame(list(read_logged_entries(cutoff_time, log_file)))
+        if columns is not None and not df.empty:
+            df = df[[c for c in df.columns if c in columns or c == 'timestamp']]
+    return df.drop(columns=['timestamp'], errors='ignore')
+
+
 def get_logged_predictions(
     hours: int = 24,
-    log_file: str = '/data/monitoring_predictions.jsonl'
+    log_file: str = MONITORING_LOG_FILE
 ) -> pd.DataFrame:
     """
     Récupère les prédictions loggées des dernières X heures
@@ -149,45 +463,4 @@ def get_logged_predictions(
     Returns:
         DataFrame avec toutes les prédictions
     """
-    log_path = Path(log_file)
-    
-    if not log_path.exists():
-        return pd.DataFrame()
-    
-    from datetime import timedelta
-    
-    cutoff_time = datetime.now() - timedelta(hours=hours)
-    predictions_list = []
-    
-    with open(log_path, 'r') as f:
-        for line in f:
-            try:
-                data = json.loads(line)
-                timestamp = datetime.fromisoformat(data['timestamp'])
-                
-                if timestamp >= cutoff_time:
-                    predictions_list.append(data)
-            except Exception:
-                continue
-    
-    if not predictions_list:
-        return pd.DataFrame()
-    
-    # Convertir en DataFrame
-    all_features = []
-    all_predictions = []
-    all_actuals = []
-    
-    for pred in predictions_list:
-        all_features.extend(pred['features'])
-        all_predictions.extend(pred['predictions'])
-        if pred.get('actuals'):
-            all_actuals.extend(pred['actuals'])
-    
-    df = pd.DataFrame(all_features)
-    df['prediction'] = all_predictions
-    
-    if all_actuals:
-        df['target'] = all_actuals
-    
-    return df
\ No newline at end of file
+    return read_logged_predictions(hours, log_file)
@@ -1,4 +1,5 @@
 # monitoring/generate_reports.py
+import sys
 import schedule
 import time
 import json
@@ -9,59 +10,73 @@ import evidently
 from evidently import Report
 from evidently.metrics import *
 from evidently.presets import *
+# Rendre les modules du dossier monitoring importables
+sys.path.insert(0, str(Path(__file__).parent))
+from prediction_store import MONITORING_STORE, compact_prediction_store
+from evidently_monitor import log_file_path, read_logged_predictions, rotated_log_files
+from drift_sketches import (
+    DRIFT_MIN_COUNT,
+    DRIFT_PSI_ALERT,
+    DRIFT_REALERT_SECONDS,
+    DRIFT_REFERENCE_PATH,
+    build_reference_sketches,
+    drifted_features,
+    load_drift_state,
+    save_reference_sketches,
+)
+from reference_profile import ReferenceProfileCache, profile_to_sketches
 
-def load_recent_predictions(hours=24):
+# Profil de référence de la version du modèle en production, gardé en mémoire entre deux rapports
+reference_profiles = ReferenceProfileCache()
+# Version du profil à partir de laquelle les sketches de drift ont été écrits
+_drift_reference_version = None
+# Dernière alerte de drift en continu : (début de la fenêtre, features, heure d'envoi)
+_last_drift_alert = (None, frozenset(), 0.0)
+
+
+def load_reference_data(lib_dir):
+    """
+    Données de référence du rapport : reconstruites à partir du profil de référence de la
+    version en production (voir reference_profile.py), ou baseline.parquet à défaut.
+    """
+    global _drift_reference_version
+    # Une seule résolution de l'alias : jeu de référence et sketches de drift de la même version
+    version, profile, reference_data = reference_profiles.snapshot()
+    if profile is not None:
+        print(f"✅ Profil de référence chargé (version du modèle: {version})")
+        # Sketches de drift alignés sur la version en production
+        if version != _drift_reference_version:
+            save_reference_sketches(profile_to_sketches(profile))
+            _drift_reference_version = version
+        return reference_data
+    
+    reference_data = pd.read_parquet(Path(lib_dir,'reference_data/baseline.parquet'))
+    # Sketches de référence pour le suivi du drift en continu (construits une seule fois)
+    if not Path(DRIFT_REFERENCE_PATH).exists():
+        save_reference_sketches(build_reference_sketches(reference_data))
+    return reference_data
+
+def load_recent_predictions(hours=24, columns=None):
     """
     Charge les prédictions des dernières X heures depuis les logs
     
     Args:
         hours: Nombre d'heures à charger
+        columns: Colonnes à charger (toutes par défaut)
         
     Returns:
         DataFrame avec features, predictions et targets (si disponibles)
     """
-    if Path(__file__).parent == Path('/'):
-        lib_dir = Path('/app/')
-    else:
-        lib_dir = Path(__file__).parent.parent
-    predictions_file = Path(lib_dir,'data/monitoring_predictions.jsonl')
-    
-    if not predictions_file.exists():
+    log_path = log_file_path()
+    if MONITORING_STORE != "parquet" and not log_path.exists() and not rotated_log_files(log_path):
         raise FileNotFoundError("Aucune prédiction loggée trouvée")
     
-    # Charger toutes les prédictions
-    predictions_list = []
-    cutoff_time = datetime.now() - timedelta(hours=hours)
-    
-    with open(predictions_file, 'r') as f:
-        for line in f:
-            data = json.loads(line)
-            timestamp = datetime.fromisoformat(data['timestamp'])
-            
-            # Filtrer par date
-            if timestamp >= cutoff_time:
-                predictions_list.append(data)
+    # Même lecteur que evidently_monitor.get_logged_predictions
+    df = read_logged_predictions(hours, columns=columns)
     
-    if not predictions_list:
+    if df.empty:
         raise ValueError(f"Aucune prédiction trouvée dans les dernières {hours} heures")
     
-    # Convertir en DataFrame
-    all_features = []
-    all_predictions = []
-    all_actuals = []
-    
-    for pred in predictions_list:
-        all_features.extend(pred['features'])
-        all_predictions.extend(pred['predictions'])
-        if pred['actuals']:
-            all_actuals.extend(pred['actuals'])
-    
-    df = pd.DataFrame(all_features)
-    df['prediction'] = all_predictions
-    
-    if all_actuals:
-        df['target'] = all_actuals
-    
     return df
 
 
@@ -170,6 +185,41 @@ def send_alerts(alerts):
     #     })
 
 
+def check_streaming_drift():
+    """
+    Vérifie les scores de drift de la dernière fenêtre complète, fusionnés sur tous les
+    process (voir drift_sketches.load_drift_state), et envoie une alerte pour chaque feature
+    dont le PSI dépasse le seuil. Une fenêtre n'est alertée qu'une fois, et les mêmes
+    features ne sont de nouveau signalées qu'après DRIFT_REALERT_SECONDS.
+    """
+    global _last_drift_alert
+    try:
+        state = load_drift_state()
+    except Exception as e:
+        print(f"❌ Erreur lors de la lecture de l'état de drift: {str(e)}")
+        return
+    if state is None or state.get('count', 0) < DRIFT_MIN_COUNT:
+        return
+    drifted = frozenset(drifted_features(state['scores']))
+    last_window, last_features, last_sent = _last_drift_alert
+    if state['window_start'] == last_window:
+        return
+    if not drifted:
+        # Fin du drift : une nouvelle dérive sur les mêmes features sera de nouveau signalée
+        _last_drift_alert = (state['window_start'], frozenset(), 0.0)
+        return
+    if drifted <= last_features and time.time() - last_sent < DRIFT_REALERT_SECONDS:
+        return
+    window = datetime.fromtimestamp(state['window_start']).strftime('%Y-%m-%d %H:%M')
+    alerts = [
+        f"Drift en continu sur '{name}': PSI={state['scores'][name]['psi']:.3f}, JS={state['scores'][name]['js']:.3f} "
+        f"(fenêtre du {window}, {state['count']} prédictions, {state['processes']} process)"
+        for name in sorted(drifted)
+    ]
+    send_alerts(alerts)
+    _last_drift_alert = (state['window_start'], drifted, time.time())
+
+
 def generate_daily_report():
     """Génère un rapport Evidently quotidien"""
     
@@ -181,12 +231,16 @@ def generate_daily_report():
         print(f"🔄 Génération du rapport quotidien - {datetime.now()}")
         
         # Charger les données de référence
-        reference_data = pd.read_parquet(Path(lib_dir,'reference_data/baseline.parquet'))
+        reference_data = load_reference_data(lib_dir)
         print(f"✅ Données de référence chargées: {len(reference_data)} lignes")
         
         # Charger les prédictions des dernières 24h
-        current_data = load_recent_predictions(hours=48)
+        current_data = load_recent_predictions(hours=48, columns=list(reference_data.columns))
         print(f"✅ Prédictions récentes chargées: {len(current_data)} lignes")
+        # Comparer uniquement les colonnes présentes des deux côtés
+        common_columns = [c for c in reference_data.columns if c in current_data.columns]
+        reference_data = reference_data[common_columns]
+        current_data = current_data[common_columns]
         # Générer le rapport
         report = Report(metrics=[
             # ClassificationPreset(),
@@ -218,6 +272,11 @@ def generate_daily_report():
 
 # Scheduler
 schedule.every().day.at("02:00").do(generate_daily_report)
+# Compaction des segments Parquet des jours passés (MONITORING_STORE=parquet)
+if MONITORING_STORE == "parquet":
+    schedule.every().day.at("01:00").do(compact_prediction_store)
+# Scores de drift calculés en continu par les sketches
+schedule.every(15).minutes.do(check_streaming_drift)
 
 # Pour tester immédiatement (à commenter en production)
 # schedule.every(5).minutes.do(generate_daily_report)
@@ -0,0 +1,266 @@
+# monitoring/prediction_store.py
+import os
+import sys
+import uuid
+import time
+import atexit
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dotenv import find_dotenv, load_dotenv
+import logging
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+env_path = find_dotenv()
+load_dotenv(env_path, override=True)
+
+# Format de stockage des prédictions loggées : "jsonl" (fichier unique) ou "parquet" (segments par heure)
+MONITORING_STORE = os.getenv("MONITORING_STORE", "jsonl")
+# Dossier des segments Parquet (par défaut à côté du fichier JSONL)
+MONITORING_STORE_DIR = os.getenv(
+    "MONITORING_STORE_DIR", str(Path(__file__).parent.parent / "data" / "monitoring_store")
+)
+# Un segment est écrit quand il atteint N lignes ou qu'il est ouvert depuis plus de N secondes
+MONITORING_SEGMENT_MAX_ROWS = int(os.getenv("MONITORING_SEGMENT_MAX_ROWS", "10000"))
+MONITORING_SEGMENT_MAX_SECONDS = float(os.getenv("MONITORING_SEGMENT_MAX_SECONDS", "300"))
+# Les jours plus anciens que N jours sont compactés en un fichier par jour
+MONITORING_COMPACT_AFTER_DAYS = int(os.getenv("MONITORING_COMPACT_AFTER_DAYS", "1"))
+
+
+def entries_to_frame(entries: List[dict]) -> pd.DataFrame:
+    """
+    Aplatit des entrées de log de monitoring (timestamp, predictions, features, actuals)
+    en une ligne par prédiction : features, 'prediction', 'target' (si disponible) et 'timestamp'.
+    """
+    rows = []
+    for entry in entries:
+        actuals = entry.get('actuals') or []
+        for i, (features, prediction) in enumerate(zip(entry['features'], entry['predictions'])):
+            row = dict(features)
+            row['prediction'] = prediction
+            if i < len(actuals):
+                row['target'] = actuals[i]
+            row['timestamp'] = entry['timestamp']
+            rows.append(row)
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
+class PredictionStore:
+    """
+    Stockage des prédictions loggées en segments Parquet partitionnés par heure :
+    <root>/date=YYYY-MM-DD/hour=HH/segment-<id>.parquet
+
+    Les lignes sont accumulées par heure et écrites quand un segment atteint max_rows
+    lignes ou qu'il est ouvert depuis plus de max_seconds. compact() regroupe les
+    segments des jours passés en un fichier par jour : <root>/date=YYYY-MM-DD/daily-<id>.parquet
+    """
+
+    def __init__(
+        self,
+        root: str = MONITORING_STORE_DIR,
+        max_rows: int = MONITORING_SEGMENT_MAX_ROWS,
+        max_seconds: float = MONITORING_SEGMENT_MAX_SECONDS,
+    ):
+        self.root = Path(root)
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        # partition -> {"frames": [...], "rows": nombre de lignes, "opened_at": time.monotonic()}
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def partition_for(timestamp: datetime) -> str:
+        return f"date={timestamp:%Y-%m-%d}/hour={timestamp:%H}"
+
+    def start(self):
+        """
+        Démarre l'écriture périodique des segments ouverts depuis plus de max_seconds.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_expired, name="prediction-store", daemon=True)
+            self._thread.start()
+        return self
+
+    def add_entries(self, entries: List[dict]):
+        df = entries_to_frame(entries)
+        if df.empty:
+            return
+        full = []
+        partitions = df['timestamp'].dt.strftime("date=%Y-%m-%d/hour=%H")
+        with self._lock:
+            for partition, part_df in df.groupby(partitions, sort=False):
+                buffer = self._partitions.setdefault(
+                    partition, {"frames": [], "rows": 0, "opened_at": time.monotonic()}
+                )
+                buffer["frames"].append(part_df)
+                buffer["rows"] += len(part_df)
+                if buffer["rows"] >= self.max_rows:
+                    full.append((partition, self._partitions.pop(partition)))
+        for partition, buffer in full:
+            self._write_segment(partition, buffer)
+
+    @staticmethod
+    def _write_table(df: pd.DataFrame, path: Path):
+        # Écriture dans un fichier temporaire puis renommage : un lecteur ne voit jamais de fichier partiel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression="snappy")
+        os.replace(tmp_path, path)
+
+    def _write_segment(self, partition: str, buffer: dict):
+        df = pd.concat(buffer["frames"], ignore_index=True)
+        path = self.root / partition / f"segment-{uuid.uuid4().hex}.parquet"
+        try:
+            self._write_table(df, path)
+            logging.debug(f"📝 {len(df)} prédictions écrites dans {path}")
+        except Exception as e:
+            # On remet les lignes en attente pour la prochaine écriture
+            logging.error(f"⚠️ Erreur lors de l'écriture du segment {path} : {e}")
+            with self._lock:
+                current = self._partitions.setdefault(partition, {"frames": [], "rows": 0, "opened_at": buffer["opened_at"]})
+                current["frames"] = buffer["frames"] + current["frames"]
+                current["rows"] += buffer["rows"]
+
+    def flush(self, expired_only: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            partitions = [
+                partition for partition, buffer in self._partitions.items()
+                if not expired_only or now - buffer["opened_at"] >= self.max_seconds
+            ]
+            taken = {partition: self._partitions.pop(partition) for partition in partitions}
+        for partition, buffer in taken.items():
+            self._write_segment(partition, buffer)
+
+    def _flush_expired(self):
+        while not self._stop_event.wait(1):
+            self.flush(expired_only=True)
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    @staticmethod
+    def _read_file(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        # Lecture du fichier seul : pq.read_table ajouterait les colonnes date / hour
+        # déduites du chemin (date=.../hour=...), qui ne sont pas dans les données
+        return pq.ParquetFile(path).read(columns=columns).to_pandas()
+
+    def files_for_window(self, start: datetime, end: datetime) -> List[Path]:
+        """
+        Fichiers Parquet des partitions (heures, ou jours compactés) qui recouvrent [start, end).
+        """
+        files = []
+        day = start.date()
+        while day <= end.date():
+            day_dir = self.root / f"date={day:%Y-%m-%d}"
+            if day_dir.exists():
+                files += sorted(day_dir.glob("daily-*.parquet"))
+                for hour_dir in sorted(day_dir.glob("hour=*")):
+                    hour_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=int(hour_dir.name[5:]))
+                    if hour_start < end and hour_start + timedelta(hours=1) > start:
+                        files += sorted(hour_dir.glob("*.parquet"))
+            day += timedelta(days=1)
+        return files
+
+    def read_window(
+        self,
+        start: datetime,
+        end: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Lit les prédictions loggées entre start et end (maintenant par défaut), en n'ouvrant
+        que les partitions concernées et, si `columns` est fourni, que ces colonnes.
+        """
+        end = end or datetime.now()
+        frames = []
+        for path in self.files_for_window(start, end):
+            available = pq.read_schema(path).names
+            wanted = None if columns is None else [c for c in dict.fromkeys(list(columns) + ['timestamp']) if c in available]
+            frames.append(self._read_file(path, columns=wanted))
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        df = df[(df['timestamp'] >= start) & (df['timestamp'] < end)]
+        return df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+    def compact(self, before: Optional[date] = None) -> List[str]:
+        """
+        Regroupe les segments horaires des jours antérieurs à `before` en un fichier par jour.
+        Retourne les jours compactés.
+        """
+        before = before or date.today() - timedelta(days=MONITORING_COMPACT_AFTER_DAYS - 1)
+        compacted = []
+        for day_dir in sorted(self.root.glob("date=*")):
+            day = datetime.strptime(day_dir.name[5:], "%Y-%m-%d").date()
+            hour_dirs = sorted(day_dir.glob("hour=*"))
+            if day >= before or not hour_dirs:
+                continue
+            old_daily = sorted(day_dir.glob("daily-*.parquet"))
+            segments = [path for hour_dir in hour_dirs for path in sorted(hour_dir.glob("*.parquet"))]
+            df = pd.concat([self._read_file(path) for path in old_daily + segments], ignore_index=True)
+            self._write_table(df.sort_values('timestamp', kind='stable'), day_dir / f"daily-{uuid.uuid4().hex}.parquet")
+            # Seuls les fichiers lus sont supprimés : un segment arrivé en retard pendant la
+            # compaction reste en place et sera compacté au prochain passage
+            for path in old_daily + segments:
+                path.unlink()
+            for hour_dir in hour_dirs:
+                try:
+                    hour_dir.rmdir()
+                except OSError:
+                    logging.info(f"⏭️ {hour_dir} contient des segments arrivés pendant la compaction, gardé")
+            compacted.append(day_dir.name)
+            logging.info(f"✅ {len(segments)} segments compactés dans {day_dir.name} ({len(df)} lignes)")
+        return compacted
+
+
+_prediction_store = None
+_prediction_store_lock = threading.Lock()
+
+
+def get_prediction_store() -> PredictionStore:
+    """
+    Store Parquet partagé par le process, vidé automatiquement à la sortie.
+    """
+    global _prediction_store
+    if _prediction_store is None:
+        with _prediction_store_lock:
+            if _prediction_store is None:
+                _prediction_store = PredictionStore().start()
+                atexit.register(_prediction_store.close)
+    return _prediction_store
+
+
+def compact_prediction_store():
+    """
+    Job de compaction quotidien (voir generate_reports.py).
+    """
+    try:
+        PredictionStore().compact()
+    except Exception as e:
+        logging.error(f"❌ Erreur lors de la compaction du store de prédictions : {e}")
+
+
+if __name__ == "__main__":
+    # python prediction_store.py compact
+    if sys.argv[1:] == ["compact"]:
+        compact_prediction_store()
+    else:
+        print("Usage : python prediction_store.py compact")
@@ -0,0 +1,294 @@
+# monitoring/reference_profile.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from dotenv import find_dotenv, load_dotenv
+import logging
+# Rendre les modules du dossier monitoring importables (exécution directe ou via le package monitoring)
+sys.path.insert(0, str(Path(__file__).parent))
+from drift_sketches import (
+    CATEGORICAL_FEATURES,
+    DRIFT_BINS,
+    NUMERIC_FEATURES,
+    CounterSketch,
+    HistogramSketch,
+    transaction_distance,
+)
+
+# mlflow est optionnel : sans lui, seul le profil local est utilisé
+try:
+    import mlflow
+    from mlflow.tracking import MlflowClient
+except ImportError:
+    mlflow = None
+    MlflowClient = None
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+env_path = find_dotenv()
+load_dotenv(env_path, override=True)
+
+# Registre MLflow : le profil de référence est celui du run de la version en production (vide = profil local)
+MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "")
+MODEL_URI = os.getenv("MLFLOW_MODEL_URI", "models:/fraud_detector_RF@production")
+# Profil local, utilisé sans registre MLflow ou si le registre est injoignable
+REFERENCE_PROFILE_PATH = os.getenv(
+    "REFERENCE_PROFILE_PATH", str(Path(__file__).parent / "reference_data" / "reference_profile.json")
+)
+# Dossier où sont gardés les profils téléchargés (un fichier par version du modèle)
+REFERENCE_PROFILE_CACHE_DIR = os.getenv(
+    "REFERENCE_PROFILE_CACHE_DIR", str(Path(__file__).parent / "reference_data" / "profiles")
+)
+# Nombre de lignes du jeu de référence reconstruit à partir du profil pour Evidently
+REFERENCE_SAMPLE_ROWS = int(os.getenv("REFERENCE_SAMPLE_ROWS", "10000"))
+# Au-delà de ce nombre de valeurs distinctes, une colonne texte n'est pas profilée (identifiants, noms...)
+REFERENCE_MAX_CATEGORIES = int(os.getenv("REFERENCE_MAX_CATEGORIES", "100"))
+
+# Emplacement du profil dans les artefacts du run MLflow
+REFERENCE_PROFILE_ARTIFACT_PATH = "reference_profile"
+REFERENCE_PROFILE_FILE = "profile.json"
+PROFILE_FORMAT_VERSION = 1
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# Classes fixes pour la distribution des probabilités de fraude
+PROBA_EDGES = np.linspace(0, 1, 21).tolist()
+
+
+def numeric_profile(values, bins: int = DRIFT_BINS, edges: Optional[list] = None) -> dict:
+    """
+    Histogramme (classes de même effectif, ou `edges` si fournies), quantiles, moyenne et écart-type.
+    """
+    values = np.asarray(values, dtype=float)
+    present = values[~np.isnan(values)]
+    if edges is None:
+        sketch = HistogramSketch.from_values(present, bins)
+    else:
+        sketch = HistogramSketch(edges)
+        sketch.counts = np.bincount(
+            np.searchsorted(sketch.edges, present, side="right"), minlength=len(sketch.edges) + 1
+        ).tolist()
+    return {
+        "type": "numeric",
+        "edges": sketch.edges,
+        "counts": sketch.counts,
+        "quantiles": {str(q): float(v) for q, v in zip(QUANTILES, np.quantile(present, QUANTILES))},
+        "mean": float(present.mean()),
+        "std": float(present.std()),
+        "missing": int(len(values) - len(present)),
+    }
+
+
+def categorical_profile(values, max_categories: int = REFERENCE_MAX_CATEGORIES) -> dict:
+    series = pd.Series(values)
+    sketch = CounterSketch.from_values(series.dropna().tolist(), max_categories)
+    return {
+        "type": "categorical",
+        # Les clés JSON sont des textes : on garde le type d'origine des classes (cible, prédiction)
+        "dtype": "int" if pd.api.types.is_integer_dtype(series) else "str",
+        "counts": sketch.counts,
+        "missing": int(series.isna().sum()),
+    }
+
+
+def build_reference_profile(
+    X: pd.DataFrame,
+    y=None,
+    predictions=None,
+    probas=None,
+    bins: int = DRIFT_BINS,
+    max_categories: int = REFERENCE_MAX_CATEGORIES,
+) -> dict:
+    """
+    Profil compact des données de référence : pour chaque colonne numérique un histogramme et
+    des quantiles, pour chaque colonne catégorielle les fréquences, plus la distance
+    (comme dans dataset_processing), la cible et la distribution des prédictions.
+    Les colonnes texte à forte cardinalité (identifiants, noms...) sont ignorées.
+    """
+    columns = {}
+    for name in X.columns:
+        if X[name].isna().all():
+            continue
+        if pd.api.types.is_numeric_dtype(X[name]):
+            columns[name] = numeric_profile(X[name].to_numpy(), bins)
+        elif X[name].nunique() <= max_categories:
+            columns[name] = categorical_profile(X[name], max_categories)
+    if {"lat", "long", "merch_lat", "merch_long"} <= set(X.columns):
+        distances = [transaction_distance(record) for record in X[["lat", "long", "merch_lat", "merch_long"]].to_dict("records")]
+        columns["distance"] = numeric_profile(distances, bins)
+    if y is not None:
+        columns["target"] = categorical_profile(np.asarray(y).astype(int))
+    if predictions is not None:
+        columns["prediction"] = categorical_profile(np.asarray(predictions).astype(int))
+    if probas is not None:
+        columns["fraud_proba"] = numeric_profile(probas, edges=PROBA_EDGES)
+    return {"format_version": PROFILE_FORMAT_VERSION, "n_rows": int(len(X)), "columns": columns}
+
+
+def profile_to_sketches(profile: dict) -> dict:
+    """
+    Sketches de référence du suivi du drift en continu (voir drift_sketches.py).
+    """
+    sketches = {}
+    for name in NUMERIC_FEATURES:
+        column = profile["columns"].get(name)
+        if column and column["type"] == "numeric":
+            sketches[name] = HistogramSketch(column["edges"], column["counts"])
+    for name in CATEGORICAL_FEATURES:
+        column = profile["columns"].get(name)
+        if column and column["type"] == "categorical":
+            sketches[name] = CounterSketch(column["counts"])
+    return sketches
+
+
+def reference_frame(profile: dict, n_rows: int = REFERENCE_SAMPLE_ROWS, seed: int = 0) -> pd.DataFrame:
+    """
+    Jeu de référence reconstruit à partir du profil (tirage aléatoire reproductible,
+    colonne par colonne) : mêmes distributions marginales que les données d'origine.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for name, column in profile["columns"].items():
+        total = sum(column["counts"].values()) if column["type"] == "categorical" else sum(column["counts"])
+        missing = column.get("missing", 0)
+        if not total:
+            continue
+        if column["type"] == "categorical":
+            categories = list(column["counts"])
+            weights = np.array(list(column["counts"].values()), dtype=float)
+            values = rng.choice(np.array(categories, dtype=object), size=n_rows, p=weights / weights.sum())
+            if column.get("dtype") == "int":
+                values = values.astype(int)
+        else:
+            edges = np.array(column["edges"])
+            counts = np.array(column["counts"], dtype=float)
+            bins = rng.choice(len(counts), size=n_rows, p=counts / counts.sum())
+            # Classe i : [edges[i-1], edges[i]) ; les classes extrêmes prennent la borne
+            low = edges[np.clip(bins - 1, 0, len(edges) - 1)]
+            high = edges[np.clip(bins, 0, len(edges) - 1)]
+            values = low + (high - low) * rng.random(n_rows)
+        if missing:
+            values = pd.Series(values, dtype=object if column["type"] == "categorical" else float)
+            values[rng.random(n_rows) < missing / (missing + total)] = None
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def save_reference_profile(profile: dict, path: str = REFERENCE_PROFILE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+    os.replace(tmp_path, path)
+
+
+def load_reference_profile(path: str = REFERENCE_PROFILE_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    if profile.get("format_version") != PROFILE_FORMAT_VERSION:
+        raise ValueError(f"Version de profil non supportée : {profile.get('format_version')}")
+    return profile
+
+
+class ReferenceProfileCache:
+    """
+    Profil de référence de la version du modèle en production, gardé en mémoire.
+
+    get() résout l'alias du modèle dans le registre MLflow ; le profil n'est téléchargé
+    (puis gardé dans cache_dir) qu'au changement de version. Sans registre, ou s'il est
+    injoignable, le profil local est utilisé (version "local").
+    """
+
+    def __init__(
+        self,
+        tracking_uri: str = MLFLOW_TRACKING_URI,
+        model_uri: str = MODEL_URI,
+        local_path: str = REFERENCE_PROFILE_PATH,
+        cache_dir: str = REFERENCE_PROFILE_CACHE_DIR,
+    ):
+        self.tracking_uri = tracking_uri
+        self.model_uri = model_uri
+        self.local_path = local_path
+        self.cache_dir = Path(cache_dir)
+        self.version = None
+        self.profile = None
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def _production_version(self) -> tuple:
+        prefix = "models:/"
+        name, alias = self.model_uri[len(prefix):].split("@", 1)
+        client = MlflowClient(tracking_uri=self.tracking_uri)
+        model_version = client.get_model_version_by_alias(name, alias)
+        return str(model_version.version), model_version.run_id
+
+    def _download(self, version: str, run_id: str) -> dict:
+        cached = self.cache_dir / f"profile-v{version}.json"
+        if not cached.exists():
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = mlflow.artifacts.download_artifacts(
+                    run_id=run_id,
+                    artifact_path=f"{REFERENCE_PROFILE_ARTIFACT_PATH}/{REFERENCE_PROFILE_FILE}",
+                    tracking_uri=self.tracking_uri,
+                    dst_path=tmp_dir,
+                )
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(path, cached)
+            logging.info(f"✅ Profil de référence de la version {version} téléchargé")
+        return load_reference_profile(cached)
+
+    def _resolve(self) -> tuple:
+        if self.tracking_uri and mlflow is not None:
+            try:
+                version, run_id = self._production_version()
+                if version == self.version:
+                    return version, self.profile
+                return version, self._download(version, run_id)
+            except Exception as e:
+                logging.warning(f"⚠️ Profil de référence indisponible dans MLflow ({e}), utilisation du profil local")
+        if os.path.exists(self.local_path):
+            if self.version == "local":
+                return "local", self.profile
+            return "local", load_reference_profile(self.local_path)
+        return None, None
+
+    def _update(self):
+        version, profile = self._resolve()
+        if version != self.version:
+            self.version, self.profile, self._frame = version, profile, None
+
+    def get(self) -> tuple:
+        """
+        Retourne (version, profil), ou (None, None) si aucun profil n'est disponible.
+        """
+        with self._lock:
+            self._update()
+            return self.version, self.profile
+
+    def snapshot(self) -> tuple:
+        """
+        Retourne (version, profil, jeu de référence) issus d'une seule résolution de l'alias :
+        le jeu de référence correspond toujours à la version et au profil renvoyés.
+        (None, None, None) si aucun profil n'est disponible.
+        """
+        with self._lock:
+            self._update()
+            if self.profile is not None and self._frame is None:
+                self._frame = reference_frame(self.profile)
+            return self.version, self.profile, self._frame
+
+    def reference_frame(self) -> Optional[pd.DataFrame]:
+        """
+        Jeu de référence reconstruit à partir du profil courant (calculé une fois par version).
+        """
+        return self.snapshot()[2]
@@ -12,6 +12,8 @@ from urllib.error import URLError
 load_dotenv()
 BACKEND_STORE_URI = os.getenv("BACKEND_STORE_URI")
 TABLE_NAME = os.getenv("TABLE_NAME")
+# Agrégats horaires par catégorie, maintenus par la pipeline à chaque insertion
+ROLLUP_TABLE_NAME = os.getenv("ROLLUP_TABLE_NAME", "fraud_hourly_rollup")
 
 st.set_page_config(
     page_title="Rapport de Fraudes",
@@ -20,6 +22,14 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+def get_connection():
+    return st.connection(
+        "postgresql",
+        type="sql",
+        url=BACKEND_STORE_URI
+    )
+
+
 @st.cache_data
 def get_data(date_deb=None, date_fin=None) -> pd.DataFrame:
     # Utilisation de valeurs par défaut si aucun argument n'est fourni
@@ -28,11 +38,7 @@ def get_data(date_deb=None, date_fin=None) -> pd.DataFrame:
     if date_fin is None:
         date_fin = pd.Timestamp.now()
     
-    conn = st.connection(
-        "postgresql",
-        type="sql",
-        url=BACKEND_STORE_URI
-    )
+    conn = get_connection()
     df = conn.query(
         f"SELECT * FROM {TABLE_NAME} "
         f"WHERE trans_date_trans_time >= '{date_deb.date()}' "
@@ -40,24 +46,47 @@ def get_data(date_deb=None, date_fin=None) -> pd.DataFrame:
     )
     return df
 
+
+@st.cache_data
+def get_rollup(date_deb=None, date_fin=None) -> pd.DataFrame:
+    """
+    Agrégats heure × catégorie de la période : quelques centaines de lignes
+    par mois au lieu de l'ensemble des transactions.
+    """
+    if date_deb is None:
+        date_deb = pd.Timestamp.now() - pd.Timedelta(days=1)
+    if date_fin is None:
+        date_fin = pd.Timestamp.now()
+
+    conn = get_connection()
+    df = conn.query(
+        f"SELECT bucket_hour, category, tx_count, fraud_count, amt_sum, fraud_amt_sum, actual_fraud_count "
+        f"FROM {ROLLUP_TABLE_NAME} "
+        f"WHERE bucket_hour >= '{date_deb.date()}' "
+        f"AND bucket_hour < '{date_fin.date()}';"
+    )
+    return df
+
 st.title("Rapport de Fraudes")
 
 # --- Initialisation du session_state ---
 if 'dates_actives' not in st.session_state:
     st.session_state.dates_actives = None
+if 'periode' not in st.session_state:
+    st.session_state.periode = (None, None)
 if 'df' not in st.session_state:
     st.session_state.df = None
 
 # --- Chargement initial des données ---
 if st.session_state.df is None:
-    st.session_state.df = get_data()
+    st.session_state.df = get_rollup()
     if not st.session_state.df.empty:
         # Convertir en datetime si nécessaire
-        if not pd.api.types.is_datetime64_any_dtype(st.session_state.df['trans_date_trans_time']):
-            st.session_state.df['trans_date_trans_time'] = pd.to_datetime(st.session_state.df['trans_date_trans_time'])
+        if not pd.api.types.is_datetime64_any_dtype(st.session_state.df['bucket_hour']):
+            st.session_state.df['bucket_hour'] = pd.to_datetime(st.session_state.df['bucket_hour'])
         
-        min_date = st.session_state.df['trans_date_trans_time'].min().date()
-        max_date = st.session_state.df['trans_date_trans_time'].max().date()
+        min_date = st.session_state.df['bucket_hour'].min().date()
+        max_date = st.session_state.df['bucket_hour'].max().date()
         st.session_state.dates_actives = [min_date, max_date]
 
 df = st.session_state.df
@@ -66,8 +95,8 @@ df = st.session_state.df
 if not df.empty:
     st.sidebar.header("Filtres")
     
-    min_date = df['trans_date_trans_time'].min().date()
-    max_date = df['trans_date_trans_time'].max().date()
+    min_date = df['bucket_hour'].min().date()
+    max_date = df['bucket_hour'].max().date()
     
     # Sélecteur de dates (ne déclenche PAS le rechargement)
     date_range = st.sidebar.date_input(
@@ -80,12 +109,14 @@ if not df.empty:
         if len(date_range) == 2:
             date_debut_selected, date_fin_selected = date_range
             
-            # Recharger les données avec les nouvelles dates
+            # Recharger les agrégats avec les nouvelles dates
+            get_rollup.clear()
             get_data.clear()
-            st.session_state.df = get_data(
-                date_deb=pd.Timestamp(date_debut_selected),
-                date_fin=pd.Timestamp(date_fin_selected) + pd.Timedelta(days=1)
+            st.session_state.periode = (
+                pd.Timestamp(date_debut_selected),
+                pd.Timestamp(date_fin_selected) + pd.Timedelta(days=1)
             )
+            st.session_state.df = get_rollup(*st.session_state.periode)
             st.session_state.dates_actives = [date_debut_selected, date_fin_selected]
             st.rerun()
         else:
@@ -96,25 +127,28 @@ if not df.empty:
         st.sidebar.info(f"📅 Période affichée : {st.session_state.dates_actives[0]} au {st.session_state.dates_actives[1]}")
     
     # --- Affichage des données ---
+    # Les transactions détaillées ne sont chargées que si elles sont demandées
     if st.checkbox('Afficher les données brutes'):
         st.subheader('Données brutes')
-        st.write(df)    
+        st.write(get_data(*st.session_state.periode))
     # st.markdown("### Aperçu des données")
     # st.dataframe(data=df, width='stretch', hide_index=True)
     
     st.markdown("### Statistiques clés")
     col1, col2 = st.columns(2)
+
+    nb_transactions = int(df['tx_count'].sum())
     
     with col1:
-        st.metric(label="Nombre de transactions", value=len(df))
+        st.metric(label="Nombre de transactions", value=nb_transactions)
         st.metric(
             label="Montant total des transactions",
-            value=f"${df['amt'].sum():,.2f}"
+            value=f"${float(df['amt_sum'].sum()):,.2f}"
         )
     
     with col2:
-        nb_fraudes = len(df[df['fraud_pred'] == 1])
-        montant_fraudes = df[df['fraud_pred'] == 1]['amt'].sum()
+        nb_fraudes = int(df['fraud_count'].sum())
+        montant_fraudes = float(df['fraud_amt_sum'].sum())
         
         st.metric(
             label="Nombre de transactions frauduleuses",
@@ -126,8 +160,8 @@ if not df.empty:
         )
         
         # Taux de fraude
-        if len(df) > 0:
-            taux_fraude = (nb_fraudes / len(df)) * 100
+        if nb_transactions > 0:
+            taux_fraude = (nb_fraudes / nb_transactions) * 100
             st.metric(
                 label="Taux de fraude",
                 value=f"{taux_fraude:.2f}%"
@@ -142,7 +176,7 @@ if not df.empty:
     col1, col2 = st.columns(2)
 
     # --- Diagramme 1 : toutes les transactions ---
-    df_donut_all = df.groupby('category').size().reset_index(name='count')
+    df_donut_all = df.groupby('category')['tx_count'].sum().reset_index(name='count')
     fig_all = px.pie(
         df_donut_all,
         names='category',
@@ -160,8 +194,9 @@ if not df.empty:
     col1.plotly_chart(fig_all)
 
     # --- Diagramme 2 : uniquement les fraudes ---
-    if not df[df['is_fraud'] == 1].empty:
-        df_donut_fraud = df[df['is_fraud'] == 1].groupby('category').size().reset_index(name='count')
+    df_donut_fraud = df.groupby('category')['actual_fraud_count'].sum().reset_index(name='count')
+    df_donut_fraud = df_donut_fraud[df_donut_fraud['count'] > 0]
+    if not df_donut_fraud.empty:
         fig_fraud = px.pie(
             df_donut_fraud,
             names='category',
@@ -0,0 +1,64 @@
+import logging
+
+from app.dedup import SeenTransactions
+
+
+def _transaction(*trans_nums):
+    return {
+        "columns": ["cc_num", "amt", "trans_num"],
+        "data": [[12345, 89.5, trans_num] for trans_num in trans_nums],
+    }
+
+
+def test_seen_transactions_drops_duplicates():
+    """
+    Test simple : une transaction déjà vue est écartée et comptée comme doublon.
+    """
+    seen = SeenTransactions(max_size=10, ttl=60, state_path="")
+
+    assert seen.filter_transaction(_transaction("A"), now=0) is not None
+    assert seen.filter_transaction(_transaction("A"), now=1) is None, "❌ Le doublon doit être écarté"
+    filtered = seen.filter_transaction(_transaction("A", "B"), now=2)
+    assert filtered["data"] == [[12345, 89.5, "B"]], "❌ Seules les lignes nouvelles doivent être gardées"
+    assert seen.metrics()["dropped"] == 2
+    logging.info("✅ SeenTransactions écarte les transactions déjà vues.")
+
+
+def test_seen_transactions_discard_allows_retry():
+    """
+    Test simple : une transaction oubliée après un échec n'est plus considérée comme un doublon.
+    """
+    seen = SeenTransactions(max_size=10, ttl=60, state_path="")
+
+    assert seen.filter_transaction(_transaction("A"), now=0) is not None
+    seen.discard("A")
+    assert seen.filter_transaction(_transaction("A"), now=1) is not None, "❌ La transaction oubliée doit être retraitée"
+    assert seen.metrics()["dropped"] == 0
+    logging.info("✅ SeenTransactions oublie les transactions en échec.")
+
+
+def test_seen_transactions_is_bounded_and_expires():
+    """
+    Test simple : l'ensemble reste borné et oublie les trans_num expirés.
+    """
+    seen = SeenTransactions(max_size=2, ttl=10, state_path="")
+    for key in ("A", "B", "C"):
+        seen.add(key, now=0)
+    assert len(seen) == 2
+    assert seen.add("A", now=1), "❌ Le trans_num le plus ancien doit être oublié au-delà de max_size"
+    assert seen.add("C", now=20), "❌ Un trans_num expiré doit être considéré comme nouveau"
+    logging.info("✅ SeenTransactions est borné et expire les entrées.")
+
+
+def test_seen_transactions_persistence(tmp_path):
+    """
+    Test simple : l'ensemble sauvegardé est rechargé au démarrage suivant.
+    """
+    state_path = str(tmp_path / "dedup.json")
+    seen = SeenTransactions(max_size=10, ttl=3600, state_path=state_path)
+    seen.add("A")
+    seen.save()
+
+    reloaded = SeenTransactions(max_size=10, ttl=3600, state_path=state_path)
+    assert not reloaded.add("A"), "❌ Le trans_num sauvegardé doit être reconnu après redémarrage"
+    logging.info("✅ SeenTransactions est rechargé depuis le fichier d'état.")
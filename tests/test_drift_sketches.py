@@ -0,0 +1,149 @@
+# tests/test_drift_sketches.py
+
+import os
+import logging
+
+import numpy as np
+import pytest
+
+from monitoring.drift_sketches import (
+    OTHER,
+    CounterSketch,
+    DriftMonitor,
+    HistogramSketch,
+    jensen_shannon,
+    load_drift_state,
+    save_reference_sketches,
+    psi,
+    wasserstein,
+)
+
+
+def test_histogram_sketch_bins_like_reference():
+    """
+    Test simple : une valeur est comptée dans la même classe que numpy.searchsorted.
+    """
+    sketch = HistogramSketch([0.0, 10.0, 20.0])
+    for value in [-1, 0, 5, 10, 25, None, float("nan")]:
+        sketch.update(value)
+    assert sketch.counts == [1, 2, 1, 1]
+    logging.info("✅ HistogramSketch range les valeurs dans les bonnes classes.")
+
+
+def test_counter_sketch_keeps_reference_categories():
+    """
+    Test simple : les catégories absentes de la référence sont comptées dans OTHER.
+    """
+    reference = CounterSketch.from_values(["F", "M", "M"])
+    current = reference.empty_like()
+    for value in ["F", "X", "Y"]:
+        current.update(value)
+    assert current.counts == {"F": 1, "M": 0, OTHER: 2}
+    logging.info("✅ CounterSketch garde une mémoire bornée aux catégories de la référence.")
+
+
+def test_drift_scores_detect_shift():
+    """
+    Test simple : scores nuls pour la même distribution, élevés pour une distribution décalée.
+    """
+    rng = np.random.default_rng(0)
+    reference = HistogramSketch.from_values(rng.normal(100, 10, 10000), bins=10)
+
+    same = reference.empty_like()
+    shifted = reference.empty_like()
+    for value in rng.normal(100, 10, 5000):
+        same.update(value)
+        shifted.update(value + 20)
+
+    assert psi(reference.counts, same.counts) < 0.05
+    assert psi(reference.counts, shifted.counts) > 0.2
+    assert jensen_shannon(reference.counts, same.counts) < jensen_shannon(reference.counts, shifted.counts) <= 1
+    assert wasserstein(reference, shifted) == pytest.approx(20, rel=0.3)
+    logging.info("✅ PSI, Jensen-Shannon et Wasserstein détectent un décalage.")
+
+
+def test_drift_monitor_updates_from_logged_features():
+    """
+    Test simple : le DriftMonitor met à jour ses sketches à partir des features loggées,
+    y compris la distance calculée à partir des coordonnées.
+    """
+    reference = {
+        "amt": HistogramSketch([0.0, 100.0]),
+        "distance": HistogramSketch([0.0, 1000.0]),
+        "gender": CounterSketch({"F": 5, "M": 5}),
+    }
+    monitor = DriftMonitor(reference, snapshot_seconds=3600)
+    record = {"amt": 50.0, "gender": "F", "lat": 48.0, "long": 2.0, "merch_lat": 48.1, "merch_long": 2.1}
+    monitor.update_entries([{"features": [record, dict(record, gender="M")]}])
+
+    assert monitor.count == 2
+    assert monitor.current["amt"].counts == [0, 2, 0]
+    assert sum(monitor.current["distance"].counts) == 2
+    assert set(monitor.scores()) == {"amt", "distance", "gender"}
+    logging.info("✅ DriftMonitor met à jour ses sketches à partir des prédictions loggées.")
+
+
+def test_drift_monitor_uses_tumbling_windows(tmp_path):
+    """
+    Test simple : les sketches repartent de zéro à chaque fenêtre et les états de
+    plusieurs process sont additionnés pour la dernière fenêtre complète.
+    """
+    reference = {"gender": CounterSketch({"F": 5, "M": 5})}
+    state_path = str(tmp_path / "drift_state.json")
+    monitors = [
+        DriftMonitor(reference, state_path=str(tmp_path / f"drift_state-{pid}.json"), window_seconds=60)
+        for pid in (1, 2)
+    ]
+    for monitor in monitors:
+        monitor.update([{"gender": "F"}] * 3, now=0)
+        monitor.update([{"gender": "M"}], now=61)
+        assert monitor.count == 1, "❌ La fenêtre courante doit repartir de zéro"
+        assert monitor.previous["count"] == 3
+        monitor.save()
+
+    state = load_drift_state(state_path, reference=reference, now=70)
+    assert state["window_start"] == 0
+    assert state["count"] == 6 and state["processes"] == 2
+    assert state["scores"]["gender"]["psi"] > 0.2
+    logging.info("✅ DriftMonitor utilise des fenêtres fixes fusionnées entre process.")
+
+
+def test_drift_monitor_reloads_changed_reference(tmp_path):
+    """
+    Test simple : quand le fichier de référence change, il est rechargé
+    et les sketches courants repartent de zéro.
+    """
+    reference_path = str(tmp_path / "drift_reference.json")
+    monitor = DriftMonitor({}, state_path=str(tmp_path / "drift_state-1.json"), reference_path=reference_path)
+    monitor.update_entries([{"features": [{"gender": "F"}]}])
+    assert monitor.current == {}, "❌ Sans référence, aucune feature n'est suivie"
+
+    save_reference_sketches({"gender": CounterSketch({"F": 5, "M": 5})}, reference_path)
+    monitor.update_entries([{"features": [{"gender": "F"}]}])
+    assert monitor.current["gender"].counts["F"] == 1
+
+    save_reference_sketches({"amt": HistogramSketch([0.0, 100.0])}, reference_path)
+    os.utime(reference_path, (0, 0))
+    monitor.update_entries([{"features": [{"amt": 50.0}]}])
+    assert set(monitor.current) == {"amt"} and monitor.count == 1
+    logging.info("✅ DriftMonitor recharge la référence quand elle change.")
+
+
+def test_drift_state_files_are_cleaned_up(tmp_path):
+    """
+    Test simple : le fichier d'état est supprimé à l'arrêt du monitor, et un fichier
+    périmé (process arrêté sans nettoyage) est supprimé à la lecture.
+    """
+    reference = {"gender": CounterSketch({"F": 5, "M": 5})}
+    state_path = str(tmp_path / "drift_state.json")
+    monitor = DriftMonitor(reference, state_path=str(tmp_path / "drift_state-1.json"), window_seconds=60)
+    monitor.save()
+    monitor.close()
+    assert not (tmp_path / "drift_state-1.json").exists(), "❌ L'état doit être supprimé à l'arrêt"
+
+    stale = DriftMonitor(reference, state_path=str(tmp_path / "drift_state-2.json"), window_seconds=60)
+    stale.save()
+    os.utime(stale.state_path, (0, 0))
+    assert load_drift_state(state_path, reference=reference) is None
+    assert not (tmp_path / "drift_state-2.json").exists(), "❌ Un état périmé doit être supprimé"
+    logging.info("✅ Les fichiers d'état de drift ne s'accumulent pas.")
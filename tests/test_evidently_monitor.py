@@ -0,0 +1,85 @@
+# tests/test_evidently_monitor.py
+
+import gzip
+import json
+import logging
+from datetime import datetime
+
+from monitoring.evidently_monitor import (
+    MonitoringWriter,
+    read_log_index,
+    read_logged_entries,
+    rotated_log_files,
+    window_offset,
+)
+
+
+def test_monitoring_writer_flushes_on_close(tmp_path):
+    """
+    Test simple : les entrées mises en file sont écrites (une ligne JSON par entrée) à la fermeture.
+    """
+    log_path = tmp_path / "monitoring_predictions.jsonl"
+    writer = MonitoringWriter(log_path, flush_seconds=60)
+    for i in range(3):
+        writer.write({"timestamp": f"2024-09-08T14:0{i}:00", "predictions": [i]})
+    writer.close()
+
+    lines = log_path.read_text().splitlines()
+    assert [json.loads(line)["predictions"] for line in lines] == [[0], [1], [2]]
+    logging.info("✅ MonitoringWriter écrit les entrées à la fermeture.")
+
+
+def test_monitoring_writer_rotates_and_compresses(tmp_path):
+    """
+    Test simple : le fichier est renommé et compressé quand il dépasse la taille maximale.
+    """
+    log_path = tmp_path / "monitoring_predictions.jsonl"
+    writer = MonitoringWriter(log_path, flush_seconds=60, rotate_bytes=10, compress=True)
+    writer.write({"timestamp": "2024-09-08T14:00:00", "predictions": [1]})
+    writer.close()
+
+    rotated = rotated_log_files(log_path)
+    assert len(rotated) == 1 and rotated[0].suffix == ".gz", f"❌ Fichier de rotation attendu : {rotated}"
+    with gzip.open(rotated[0], "rt") as f:
+        assert json.loads(f.readline())["predictions"] == [1]
+    assert not log_path.exists()
+    logging.info("✅ MonitoringWriter effectue la rotation et la compression.")
+
+
+def test_monitoring_writer_rotations_do_not_overwrite(tmp_path):
+    """
+    Test simple : deux rotations dans la même seconde produisent deux fichiers distincts.
+    """
+    log_path = tmp_path / "monitoring_predictions.jsonl"
+    writer = MonitoringWriter(log_path, flush_seconds=60, rotate_bytes=10)
+    for i in range(2):
+        writer.write({"timestamp": f"2024-09-08T14:0{i}:00", "predictions": [i]})
+        writer.flush()
+    writer.close()
+
+    rotated = rotated_log_files(log_path)
+    assert len(rotated) == 2, f"❌ Deux fichiers de rotation attendus : {rotated}"
+    assert [json.loads(path.read_text())["predictions"] for path in rotated] == [[0], [1]]
+    logging.info("✅ Les rotations successives ne s'écrasent pas.")
+
+
+def test_monitoring_writer_indexes_hours_for_window_reads(tmp_path):
+    """
+    Test simple : l'index donne la position de la première entrée de chaque heure,
+    et la lecture d'une fenêtre commence à cette position.
+    """
+    log_path = tmp_path / "monitoring_predictions.jsonl"
+    writer = MonitoringWriter(log_path, flush_seconds=60)
+    for timestamp in ["2024-09-08T13:10:00", "2024-09-08T13:50:00", "2024-09-08T14:05:00", "2024-09-08T15:20:00"]:
+        writer.write({"timestamp": timestamp, "predictions": [0], "features": [{}], "actuals": None})
+    writer.close()
+
+    index = read_log_index(log_path)
+    assert [hour for hour, _ in index] == ["2024-09-08T13", "2024-09-08T14", "2024-09-08T15"]
+    with open(log_path, "rb") as f:
+        f.seek(window_offset(log_path, datetime(2024, 9, 8, 14, 30)))
+        assert json.loads(f.readline())["timestamp"] == "2024-09-08T14:05:00"
+
+    entries = list(read_logged_entries(datetime(2024, 9, 8, 14, 30), log_file=str(log_path)))
+    assert [entry["timestamp"] for entry in entries] == ["2024-09-08T15:20:00"]
+    logging.info("✅ L'index horaire permet de lire une fenêtre sans parcourir tout le fichier.")
@@ -1,7 +1,7 @@
 
 import os
 import requests
-from app.extract import get_transaction
+from app.extract import get_transaction, AdaptiveConcurrency, RawBatchWriter
 from dotenv import find_dotenv, load_dotenv
 import logging
 
@@ -31,4 +31,57 @@ def test_call_transaction_api():
 
     logging.info("✅ Test de l'appel API transaction réussi : statut 200 + format JSON correct + champs attendus présents et non vides.")
 
-    
\ No newline at end of file
+    
+
+def test_adaptive_concurrency():
+    """
+    Test simple : la concurrence augmente quand l'API répond vite
+    et diminue quand la latence ou le taux d'erreur augmente.
+    """
+    controller = AdaptiveConcurrency(max_limit=4, latency_target=1.0, error_rate_max=0.2, window=2)
+    assert controller.limit == 1
+
+    for _ in range(10):
+        controller.record(0.1, ok=True)
+    assert controller.limit == 4, "❌ La concurrence doit monter jusqu'à la limite maximale"
+
+    controller.record(5.0, ok=True)
+    controller.record(5.0, ok=True)
+    assert controller.limit == 2, "❌ La concurrence doit être divisée par 2 si l'API est lente"
+
+    controller.record(0.1, ok=False)
+    controller.record(0.1, ok=False)
+    assert controller.limit == 1, "❌ La concurrence doit être réduite si l'API renvoie des erreurs"
+
+    logging.info("✅ AdaptiveConcurrency ajuste la concurrence selon la latence et les erreurs.")
+
+
+def test_raw_batch_writer_partition():
+    """
+    Test simple : la partition S3 d'un lot raw est déduite du timestamp de la transaction.
+    """
+    assert RawBatchWriter.partition_for("20240908-140310") == "date=2024-09-08/hour=14"
+    assert RawBatchWriter.partition_for("20240908-140310-123456") == "date=2024-09-08/hour=14"
+    logging.info("✅ RawBatchWriter.partition_for fonctionne.")
+
+
+class _FailingS3:
+    def put_object(self, **kwargs):
+        raise ConnectionError("S3 indisponible")
+
+
+def test_raw_batch_writer_bounds_retries(monkeypatch):
+    """
+    Test simple : pendant une panne S3, les lots en échec au-delà du tampon de reprise
+    sont abandonnés et comptés, ainsi que ceux encore en échec à la fermeture.
+    """
+    monkeypatch.setattr("app.extract.s3_client", _FailingS3())
+    writer = RawBatchWriter(max_bytes=1, retry_max_bytes=150)
+    for i in range(5):
+        writer.add({"trans_num": str(i)}, "20240908-140310")
+    assert writer.dropped > 0, "❌ Le tampon de reprise doit être borné"
+    assert sum(batch["size"] for batch in writer._batches.values()) <= 150
+
+    writer.close()
+    assert writer.dropped == 5 and not writer._batches
+    logging.info("✅ RawBatchWriter borne les reprises et compte les lots perdus.")
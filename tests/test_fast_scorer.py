@@ -0,0 +1,73 @@
+# tests/test_fast_scorer.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
+from xgboost import XGBClassifier
+import logging
+
+from app.fast_scorer import FastScorer, build_scorer_spec
+from app.model_features import dataset_processing
+
+
+def _fake_transactions(n):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame(
+        {
+            "trans_date_trans_time": [f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} 14:03:10" for i in range(n)],
+            "cc_num": rng.integers(10**15, 10**16, n).astype(float),
+            "merchant": "fraud_Test-merchant",
+            "category": rng.choice(["home", "travel", "food_dining"], n),
+            "amt": rng.uniform(1, 500, n),
+            "first": "John",
+            "last": "Doe",
+            "gender": rng.choice(["M", "F"], n),
+            "street": "123 Southpark Ave",
+            "city": "Saxon",
+            "state": rng.choice(["WI", "NY", "CA"], n),
+            "zip": rng.integers(10000, 99999, n).astype(float),
+            "lat": rng.uniform(30, 45, n),
+            "long": rng.uniform(-120, -70, n),
+            "city_pop": rng.integers(100, 100000, n).astype(float),
+            "job": "Nothing",
+            "dob": [f"{1950 + i % 50}-04-15" for i in range(n)],
+            "trans_num": [f"T{i}" for i in range(n)],
+            "unix_time": 1765214590.221,
+            "merch_lat": rng.uniform(30, 45, n),
+            "merch_long": rng.uniform(-120, -70, n),
+        }
+    )
+
+
+@pytest.mark.parametrize("sparse_threshold", [0, 1])
+def test_fast_scorer_matches_pipeline(sparse_threshold):
+    """
+    Test simple : le scorer rapide renvoie les mêmes probabilités que le Pipeline,
+    que la sortie du préprocessing soit dense ou creuse.
+    """
+    X = _fake_transactions(200)
+    y = (X["amt"] > 250).astype(int)
+    processed = dataset_processing(X)
+    categorical_features = processed.select_dtypes("object").columns
+    numerical_features = processed.columns[~processed.columns.isin(categorical_features)]
+    model = Pipeline(steps=[
+        ("Dates_preprocessing", FunctionTransformer(dataset_processing)),
+        ("features_preprocessing", ColumnTransformer(
+            transformers=[
+                ("categorical_transformer", OneHotEncoder(drop="first"), categorical_features),
+                ("numerical_transformer", StandardScaler(), numerical_features),
+            ],
+            sparse_threshold=sparse_threshold,
+        )),
+        ("Regressor", XGBClassifier(n_estimators=10)),
+    ])
+    model.fit(X, y)
+
+    scorer = FastScorer(*build_scorer_spec(model))
+    expected = model.predict_proba(X)[:, 1]
+    np.testing.assert_allclose(scorer.predict_proba(X)[:, 1], expected, atol=1e-5)
+    assert scorer.score_record(X.iloc[0].to_dict()) == pytest.approx(expected[0], abs=1e-5)
+    logging.info("✅ Le scorer rapide renvoie les mêmes probabilités que le Pipeline.")
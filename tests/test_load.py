@@ -2,13 +2,20 @@ import random
 from datetime import datetime
 import logging
 import pandas as pd
+import psycopg2
 from sqlalchemy import create_engine, text
 
 from app.load import (
     pg_connect,
+    pg_connection,
     build_db_rows,
     ensure_predictions_table_exists,
+    run_migrations,
     insert_predictions,
+    build_db_frame,
+    bulk_load_predictions,
+    PredictionWriter,
+    DB_COLUMNS,
     DATABASE_URL,
 )
 
@@ -22,6 +29,20 @@ def test_pg_connect():
     logging.info("✅ Connexion à la base de données réussie.")
 
 
+def test_pg_connection_reuses_pooled_connection():
+    """
+    Test simple : deux emprunts successifs au pool réutilisent la même connexion.
+    """
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1")
+        assert cur.fetchone()[0] == 1
+        first_backend = conn.get_backend_pid()
+
+    with pg_connection() as conn:
+        assert conn.get_backend_pid() == first_backend, "❌ La connexion du pool doit être réutilisée"
+    logging.info("✅ Le pool de connexions réutilise les connexions.")
+
+
 def test_ensure_predictions_table_exists():
     """
     Test très simple : la fonction ne doit pas lever d'erreur
@@ -47,6 +68,110 @@ def test_ensure_predictions_table_exists():
         logging.info("✅ La table fraud_transaction_predictions existe en base.")
 
 
+def test_run_migrations_records_schema_version():
+    """
+    Test simple : les migrations enregistrent la version du schéma
+    et un second appel ne réapplique rien.
+    """
+    from app.migrations import MIGRATIONS
+
+    version = run_migrations()
+    assert version == MIGRATIONS[-1][0], f"❌ Version du schéma inattendue : {version}"
+    assert run_migrations() == version, "❌ Un second appel ne doit pas changer la version"
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        versions = conn.execute(text("SELECT version FROM public.predictions_schema_version ORDER BY version")).scalars().all()
+        assert versions == [v for v, _, _ in MIGRATIONS]
+        logging.info("✅ Les migrations enregistrent la version du schéma.")
+
+
+def test_predictions_table_is_partitioned():
+    """
+    Test simple : après migration, la table est partitionnée par mois
+    et la partition du mois courant existe.
+    """
+    from app.migrations import partition_name
+
+    run_migrations()
+    current_partition = partition_name(datetime.now().date().replace(day=1))
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        partitioned = conn.execute(
+            text(
+                """
+                SELECT COUNT(*)
+                FROM pg_partitioned_table p
+                JOIN pg_class c ON p.partrelid = c.oid
+                WHERE c.relname = 'fraud_transaction_predictions'
+                """
+            )
+        ).scalar()
+        assert partitioned == 1, "❌ La table fraud_transaction_predictions doit être partitionnée"
+
+        partition = conn.execute(
+            text("SELECT to_regclass(:name)"), {"name": f"public.{current_partition}"}
+        ).scalar()
+        assert partition is not None, f"❌ La partition {current_partition} doit exister"
+        logging.info("✅ La table des prédictions est partitionnée par mois.")
+
+
+class _PartitionCursor:
+    """
+    Curseur factice : aucune partition n'existe et la partition par défaut contient
+    des lignes uniquement pour les mois de `default_months`.
+    """
+
+    def __init__(self, default_months=()):
+        self.default_months = set(default_months)
+        self.created = []
+        self.statements = []
+        self._result = None
+
+    def execute(self, sql, params=None):
+        self.statements.append(" ".join(sql.split()))
+        if "to_regclass" in sql:
+            self._result = (None,)
+        elif "SELECT EXISTS" in sql:
+            self._result = (params[0] in self.default_months,)
+        elif "CREATE TABLE" in sql:
+            self.created.append(params[0])
+
+    def fetchone(self):
+        return self._result
+
+
+def test_ensure_future_partitions_includes_previous_month():
+    """
+    Test simple : le 1er du mois, la partition du mois précédent est aussi créée
+    (les transactions sont datées d'un mois dans le passé).
+    """
+    from datetime import date
+    from app.migrations import ensure_future_partitions
+
+    cur = _PartitionCursor()
+    ensure_future_partitions(cur, months_ahead=1, today=date(2025, 1, 1))
+    assert cur.created == [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)]
+    logging.info("✅ Les partitions du mois précédent au mois suivant sont créées.")
+
+
+def test_create_month_partition_moves_rows_from_default():
+    """
+    Test simple : si la partition par défaut contient des lignes du mois, elle est détachée,
+    les lignes sont déplacées dans la nouvelle partition puis elle est rattachée.
+    """
+    from datetime import date
+    from app.migrations import create_month_partition
+
+    cur = _PartitionCursor(default_months=[date(2025, 2, 1)])
+    assert create_month_partition(cur, date(2025, 2, 1)) is True
+    steps = [statement.split()[0] for statement in cur.statements[2:]]
+    assert steps == ["ALTER", "CREATE", "INSERT", "DELETE", "ALTER"], f"❌ Étapes inattendues : {steps}"
+    assert "DETACH PARTITION" in cur.statements[2] and "ATTACH PARTITION" in cur.statements[-1]
+    logging.info("✅ Les lignes de la partition par défaut sont déplacées dans la nouvelle partition.")
+
+
 
 
 
@@ -165,7 +290,7 @@ def test_insert_predictions_inserts_rows():
             100000,  # city_pop
             "Tester",  # job
             "1990-01-01",  # dob
-            "TESTTRANS123",  # trans_num
+            f"TESTTRANS{test_ccnum}",  # trans_num
             40.7130,  # merch_lat
             -74.0050,  # merch_long
             1700000000.0,  # unix_time
@@ -194,3 +319,216 @@ def test_insert_predictions_inserts_rows():
         count = result.scalar()
         assert count >= 1
         logging.info("✅ insert_predictions a inséré la ligne en base avec succès.")
+
+
+
+def _fake_predictions(n, trans_prefix):
+    """
+    DataFrame de prédictions factices (format de sortie de predict_fraud).
+    """
+    return pd.DataFrame(
+        [
+            {
+                "cc_num": 12345.0,
+                "merchant": "fraud_Test-merchant",
+                "category": "home",
+                "amt": 89.5,
+                "first": "John",
+                "last": "Doe",
+                "gender": "M",
+                "street": "123 Southpark Ave",
+                "city": "Saxon",
+                "state": "WI",
+                "zip": 54559.0,
+                "lat": 46.4959,
+                "long": -90.4383,
+                "city_pop": 795.0,
+                "job": "Nothing",
+                "dob": "1986-04-15",
+                "trans_num": f"{trans_prefix}{i}",
+                "merch_lat": 46.904128,
+                "merch_long": -90.911955,
+                "unix_time": 1765214590.221,
+                "trans_date_trans_time": "2024-09-08 14:03:10",
+                "fraud_pred": i % 2,
+                "fraud_proba": 0.9 if i % 2 else 0.1,
+            }
+            for i in range(n)
+        ]
+    )
+
+
+def test_build_db_frame_basic():
+    """
+    Teste que build_db_frame produit les colonnes de la table avec les bons types.
+    """
+    db_df = build_db_frame(_fake_predictions(3, "FRAME"), is_fraud=[0, 1, 0])
+
+    assert list(db_df.columns) == DB_COLUMNS
+    assert len(db_df) == 3
+    assert db_df["cc_num"].tolist() == [12345, 12345, 12345]
+    assert db_df["is_fraud"].tolist() == [0, 1, 0]
+    assert db_df["fraud_pred"].tolist() == [0, 1, 0]
+    assert str(db_df["trans_date_trans_time"].dtype).startswith("datetime64")
+    logging.info("✅ build_db_frame renvoie le DataFrame attendu.")
+
+
+def test_bulk_load_predictions_inserts_rows():
+    """
+    Test d'intégration simple : les lignes chargées par COPY sont présentes en base.
+    """
+    ensure_predictions_table_exists()
+
+    trans_prefix = f"TESTCOPY{str(datetime.now().timestamp()).replace('.', '')}_"
+    loaded = bulk_load_predictions(_fake_predictions(50, trans_prefix), is_fraud=0)
+    assert loaded == 50
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        count = conn.execute(
+            text(
+                """
+                SELECT COUNT(*)
+                FROM public.fraud_transaction_predictions
+                WHERE trans_num LIKE :prefix
+                """
+            ),
+            {"prefix": f"{trans_prefix}%"},
+        ).scalar()
+        assert count == 50
+        logging.info("✅ bulk_load_predictions a chargé les lignes en base avec succès.")
+
+
+
+def test_insert_predictions_updates_hourly_rollup():
+    """
+    Test d'intégration simple : une insertion incrémente les agrégats
+    de l'heure et de la catégorie de la transaction.
+    """
+    run_migrations()
+
+    category = f"test_rollup_{str(datetime.now().timestamp()).replace('.', '')}"
+    trans_time = datetime(2024, 9, 8, 14, 3, 10)
+    pred_df = _fake_predictions(2, f"TESTROLLUP{category}_")
+    pred_df["category"] = category
+    pred_df["trans_date_trans_time"] = trans_time.strftime("%Y-%m-%d %H:%M:%S")
+
+    bulk_load_predictions(pred_df, is_fraud=[0, 1])
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                """
+                SELECT tx_count, fraud_count, actual_fraud_count
+                FROM public.fraud_hourly_rollup
+                WHERE bucket_hour = :hour AND category = :category
+                """
+            ),
+            {"hour": trans_time.replace(minute=0, second=0), "category": category},
+        ).fetchone()
+        assert row is not None, "❌ Les agrégats horaires doivent exister pour la catégorie insérée"
+        assert tuple(row) == (2, 1, 1), f"❌ Agrégats incorrects : {tuple(row)}"
+        logging.info("✅ Les agrégats horaires sont mis à jour à l'insertion.")
+
+
+def test_bulk_load_predictions_retry_is_idempotent():
+    """
+    Test d'intégration simple : rejouer le même lot ne crée pas de doublon
+    et ne compte pas deux fois les transactions dans les agrégats.
+    """
+    run_migrations()
+
+    category = f"test_retry_{str(datetime.now().timestamp()).replace('.', '')}"
+    pred_df = _fake_predictions(5, f"TESTRETRY{category}_")
+    pred_df["category"] = category
+
+    bulk_load_predictions(pred_df, is_fraud=0)
+    bulk_load_predictions(pred_df, is_fraud=0)
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        count = conn.execute(
+            text("SELECT COUNT(*) FROM public.fraud_transaction_predictions WHERE category = :category"),
+            {"category": category},
+        ).scalar()
+        tx_count = conn.execute(
+            text("SELECT SUM(tx_count) FROM public.fraud_hourly_rollup WHERE category = :category"),
+            {"category": category},
+        ).scalar()
+        assert count == 5, f"❌ Le lot rejoué ne doit pas créer de doublon ({count} lignes)"
+        assert tx_count == 5, f"❌ Les agrégats ne doivent pas compter les doublons ({tx_count})"
+        logging.info("✅ Rejouer un lot de prédictions est idempotent.")
+
+
+def test_insert_predictions_unique_by_trans_num():
+    """
+    Test d'intégration simple : une même transaction reçue avec une autre
+    trans_date_trans_time (nouvel appel à l'API) n'est pas insérée une deuxième fois.
+    """
+    run_migrations()
+
+    category = f"test_key_{str(datetime.now().timestamp()).replace('.', '')}"
+    pred_df = _fake_predictions(3, f"TESTKEY{category}_")
+    pred_df["category"] = category
+    bulk_load_predictions(pred_df, is_fraud=0)
+
+    pred_df["trans_date_trans_time"] = "2024-09-08 15:20:00"
+    bulk_load_predictions(pred_df, is_fraud=0)
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        count = conn.execute(
+            text("SELECT COUNT(*) FROM public.fraud_transaction_predictions WHERE category = :category"),
+            {"category": category},
+        ).scalar()
+        assert count == 3, f"❌ Une transaction ne doit être enregistrée qu'une fois ({count} lignes)"
+        logging.info("✅ Les prédictions sont uniques par trans_num.")
+
+
+def test_prediction_writer_batches_rows(monkeypatch):
+    """
+    Test simple : le writer asynchrone écrit les lignes par lots de batch_size au plus
+    et écrit les lignes restantes à la fermeture.
+    """
+    batches = []
+    monkeypatch.setattr("app.load.insert_predictions", lambda rows: batches.append(list(rows)))
+
+    writer = PredictionWriter(batch_size=3, flush_seconds=10, max_buffered=100)
+    for i in range(7):
+        writer.add([(i,)])
+    writer.close()
+
+    assert sum(len(batch) for batch in batches) == 7, "❌ Toutes les lignes doivent être écrites"
+    assert max(len(batch) for batch in batches) <= 3, "❌ Un lot ne doit pas dépasser batch_size"
+    assert writer.pending == 0
+    logging.info("✅ PredictionWriter écrit les prédictions par lots.")
+
+
+def test_prediction_writer_retries_only_transient_errors(monkeypatch):
+    """
+    Test simple : une erreur transitoire est rejouée, une erreur de données
+    ne fait perdre que la ligne en cause et le writer continue.
+    """
+    calls = []
+    written = []
+
+    def fake_insert(rows):
+        calls.append(list(rows))
+        if len(calls) == 1:
+            raise psycopg2.OperationalError("connexion perdue")
+        if any(row[0] == "bad" for row in rows):
+            raise psycopg2.DataError("valeur invalide")
+        written.extend(rows)
+
+    monkeypatch.setattr("app.load.insert_predictions", fake_insert)
+    monkeypatch.setattr("app.load.forget_trans_nums", lambda trans_nums: None)
+
+    writer = PredictionWriter(batch_size=3, flush_seconds=0.01, max_buffered=100, max_attempts=3)
+    writer.add([("ok1",), ("bad",), ("ok2",)])
+    writer.close()
+
+    assert sorted(written) == [("ok1",), ("ok2",)], f"❌ Lignes écrites inattendues : {written}"
+    assert writer.dropped == 1
+    assert writer.pending == 0
+    logging.info("✅ PredictionWriter ne rejoue que les erreurs transitoires.")
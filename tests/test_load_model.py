@@ -1,6 +1,7 @@
 # tests/test_load_model.py
 
-from app.load_model import load_mlflow_model
+from app.load_model import load_mlflow_model, parse_model_alias_uri, predict_with_threshold, ModelHolder
+import numpy as np
 import mlflow
 import logging
 
@@ -15,3 +16,44 @@ def test_load_mlflow_model_success():
 
     assert model is not None, "❌ Le modèle MLflow n'a pas été chargé"
     logging.info("✅ Modèle MLflow chargé correctement.")
+
+
+def test_parse_model_alias_uri():
+    """
+    Test simple : l'URI "models:/<nom>@<alias>" est découpé en (nom, alias).
+    """
+    assert parse_model_alias_uri("models:/fraud_detector_RF@production") == ("fraud_detector_RF", "production")
+    logging.info("✅ parse_model_alias_uri fonctionne.")
+
+
+def test_model_holder_loads_once():
+    """
+    Test simple : le ModelHolder renvoie toujours le même objet tant que l'alias ne change pas.
+    """
+    holder = ModelHolder(refresh_interval=0)
+    model = holder.get()
+
+    assert model is not None, "❌ Le modèle MLflow n'a pas été chargé"
+    assert holder.version is not None, "❌ La version du modèle doit être connue"
+    assert holder.get() is model, "❌ Le modèle ne doit pas être rechargé entre deux appels"
+    assert holder.refresh() is False, "❌ Le modèle ne doit pas être rechargé si l'alias n'a pas changé"
+    logging.info("✅ ModelHolder garde le modèle en mémoire.")
+
+
+def test_predict_with_threshold():
+    """
+    Test simple : la classe est déduite de la probabilité de fraude,
+    comme predict() avec le seuil par défaut.
+    """
+    class FakeModel:
+        def predict_proba(self, features):
+            probas = np.array(features)
+            return np.column_stack([1 - probas, probas])
+
+    predictions, probas = predict_with_threshold(FakeModel(), [0.2, 0.5, 0.8])
+    assert predictions.tolist() == [0, 0, 1]
+    assert probas.tolist() == [0.2, 0.5, 0.8]
+
+    predictions, _ = predict_with_threshold(FakeModel(), [0.2, 0.5, 0.8], threshold=0.1)
+    assert predictions.tolist() == [1, 1, 1]
+    logging.info("✅ predict_with_threshold déduit la classe de la probabilité.")
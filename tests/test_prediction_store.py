@@ -0,0 +1,103 @@
+# tests/test_prediction_store.py
+
+import logging
+from datetime import date, datetime
+
+from monitoring.prediction_store import PredictionStore, entries_to_frame
+
+
+def _entry(timestamp, amt, prediction):
+    return {
+        "timestamp": timestamp,
+        "predictions": [prediction],
+        "features": [{"amt": amt, "category": "misc_net"}],
+        "actuals": None,
+    }
+
+
+def _entry_frame(amt):
+    return entries_to_frame([_entry("2024-09-08T13:45:00", amt, 1)])
+
+
+def test_prediction_store_reads_only_window_and_columns(tmp_path):
+    """
+    Test simple : les segments sont partitionnés par heure et la lecture ne renvoie
+    que la fenêtre et les colonnes demandées.
+    """
+    store = PredictionStore(tmp_path, max_seconds=3600)
+    store.add_entries([
+        _entry("2024-09-08T13:30:00", 10.0, 0),
+        _entry("2024-09-08T14:10:00", 20.0, 1),
+        _entry("2024-09-08T14:50:00", 30.0, 0),
+    ])
+    store.close()
+
+    assert sorted(p.name for p in (tmp_path / "date=2024-09-08").iterdir()) == ["hour=13", "hour=14"]
+    files = store.files_for_window(datetime(2024, 9, 8, 14), datetime(2024, 9, 8, 15))
+    assert all(p.parent.name == "hour=14" for p in files), f"❌ Partitions inattendues : {files}"
+
+    df = store.read_window(datetime(2024, 9, 8, 14), datetime(2024, 9, 8, 15), columns=["amt", "prediction"])
+    assert set(df.columns) == {"amt", "prediction", "timestamp"}
+    assert df["amt"].tolist() == [20.0, 30.0]
+    logging.info("✅ PredictionStore lit uniquement la fenêtre et les colonnes demandées.")
+
+
+def test_prediction_store_reads_only_logged_columns(tmp_path):
+    """
+    Test simple : sans `columns`, la lecture renvoie exactement les colonnes loggées,
+    sans les colonnes date / hour des chemins de partition (segments et fichier journalier).
+    """
+    store = PredictionStore(tmp_path, max_rows=1)
+    store.add_entries([_entry("2024-09-08T13:30:00", 10.0, 0)])
+    store.close()
+    store.compact(before=date(2024, 9, 9))
+    store.add_entries([_entry("2024-09-08T14:10:00", 20.0, 1)])
+    store.close()
+
+    df = store.read_window(datetime(2024, 9, 8), datetime(2024, 9, 9))
+    assert list(df.columns) == ["amt", "category", "prediction", "timestamp"], f"❌ Colonnes inattendues : {list(df.columns)}"
+    assert df["amt"].tolist() == [10.0, 20.0]
+    logging.info("✅ PredictionStore renvoie uniquement les colonnes loggées.")
+
+
+def test_prediction_store_compacts_past_days(tmp_path):
+    """
+    Test simple : compact() regroupe les segments d'un jour passé en un seul fichier.
+    """
+    store = PredictionStore(tmp_path, max_rows=1)
+    store.add_entries([_entry("2024-09-08T13:30:00", 10.0, 0), _entry("2024-09-08T14:10:00", 20.0, 1)])
+    store.close()
+
+    assert store.compact(before=date(2024, 9, 9)) == ["date=2024-09-08"]
+    day_dir = tmp_path / "date=2024-09-08"
+    assert [p.name.startswith("daily-") for p in day_dir.iterdir()] == [True]
+
+    df = store.read_window(datetime(2024, 9, 8), datetime(2024, 9, 9))
+    assert df["amt"].tolist() == [10.0, 20.0]
+    logging.info("✅ PredictionStore compacte les segments des jours passés.")
+
+
+def test_prediction_store_compact_keeps_late_segments(tmp_path, monkeypatch):
+    """
+    Test simple : un segment écrit pendant la compaction n'est pas supprimé.
+    """
+    store = PredictionStore(tmp_path, max_rows=1)
+    store.add_entries([_entry("2024-09-08T13:30:00", 10.0, 0)])
+    store.close()
+
+    write_table = PredictionStore._write_table
+
+    def write_then_late_segment(df, path):
+        # Un segment arrive juste après l'écriture du fichier journalier
+        write_table(df, path)
+        if path.name.startswith("daily-"):
+            write_table(_entry_frame(20.0), tmp_path / "date=2024-09-08" / "hour=13" / "segment-late.parquet")
+
+    monkeypatch.setattr(PredictionStore, "_write_table", staticmethod(write_then_late_segment))
+    store.compact(before=date(2024, 9, 9))
+
+    hour_dir = tmp_path / "date=2024-09-08" / "hour=13"
+    assert len(list(hour_dir.glob("*.parquet"))) == 1, "❌ Le segment arrivé en retard doit être gardé"
+    df = store.read_window(datetime(2024, 9, 8), datetime(2024, 9, 9))
+    assert sorted(df["amt"].tolist()) == [10.0, 20.0]
+    logging.info("✅ La compaction garde les segments arrivés en retard.")
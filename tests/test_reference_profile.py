@@ -0,0 +1,72 @@
+# tests/test_reference_profile.py
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from monitoring.reference_profile import (
+    ReferenceProfileCache,
+    build_reference_profile,
+    profile_to_sketches,
+    reference_frame,
+    save_reference_profile,
+)
+
+
+def _reference_data(n=200):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "amt": rng.exponential(50, n),
+        "city_pop": rng.integers(100, 100000, n).astype(float),
+        "lat": rng.uniform(30, 45, n),
+        "long": rng.uniform(-120, -70, n),
+        "merch_lat": rng.uniform(30, 45, n),
+        "merch_long": rng.uniform(-120, -70, n),
+        "category": rng.choice(["misc_net", "grocery_pos", "travel"], n),
+        "gender": rng.choice(["F", "M"], n),
+        "trans_num": [f"t{i}" for i in range(n)],
+    })
+
+
+def test_reference_profile_is_compact():
+    """
+    Test simple : le profil contient histogrammes, quantiles et fréquences, la distance,
+    la distribution des prédictions, et ignore les identifiants.
+    """
+    X = _reference_data()
+    probas = np.linspace(0, 1, len(X))
+    profile = build_reference_profile(X, y=(probas > 0.9).astype(int), predictions=(probas > 0.5).astype(int), probas=probas, max_categories=10)
+
+    columns = profile["columns"]
+    assert "trans_num" not in columns, "❌ Les identifiants ne doivent pas être profilés"
+    assert {"amt", "distance", "category", "target", "prediction", "fraud_proba"} <= set(columns)
+    assert sum(columns["amt"]["counts"]) == len(X)
+    assert set(columns["amt"]["quantiles"]) == {"0.01", "0.05", "0.25", "0.5", "0.75", "0.95", "0.99"}
+    assert columns["prediction"]["counts"] == {"0": 100, "1": 100}
+    assert set(profile_to_sketches(profile)) == {"amt", "city_pop", "distance", "category", "gender"}
+    logging.info("✅ Le profil de référence résume les données sans les recopier.")
+
+
+def test_reference_frame_matches_profile(tmp_path):
+    """
+    Test simple : le jeu de référence reconstruit a les colonnes et les types du profil,
+    et le cache sans registre MLflow utilise le profil local.
+    """
+    X = _reference_data()
+    profile = build_reference_profile(X, predictions=np.zeros(len(X), dtype=int))
+    frame = reference_frame(profile, n_rows=500)
+    assert len(frame) == 500
+    assert set(frame["category"]) <= {"misc_net", "grocery_pos", "travel"}
+    assert frame["prediction"].dtype.kind == "i"
+    assert X["amt"].min() <= frame["amt"].min() and frame["amt"].max() <= X["amt"].max()
+
+    save_reference_profile(profile, tmp_path / "reference_profile.json")
+    cache = ReferenceProfileCache(tracking_uri="", local_path=str(tmp_path / "reference_profile.json"))
+    version, cached = cache.get()
+    assert version == "local" and cached["n_rows"] == len(X)
+    assert cache.reference_frame() is cache.reference_frame()
+    snapshot_version, snapshot_profile, snapshot_frame = cache.snapshot()
+    assert (snapshot_version, snapshot_profile) == (version, cached)
+    assert snapshot_frame is cache.reference_frame()
+    logging.info("✅ Le jeu de référence est reconstruit à partir du profil et gardé en mémoire.")
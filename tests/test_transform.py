@@ -76,6 +76,32 @@ def test_predict_fraud_output_values():
 
     print("✅ predict_fraud renvoie une classe valide + proba valide.")
 
+class _RecordScorer:
+    """
+    Scorer factice au format FastScorer : seul score_record doit être appelé pour une transaction.
+    """
+
+    def score_record(self, record):
+        return 0.9 if record["amt"] > 100 else 0.1
+
+    def predict_proba(self, features):
+        raise AssertionError("predict_proba ne doit pas être appelé pour une seule transaction")
+
+
+def test_predict_fraud_uses_score_record(monkeypatch):
+    """
+    Test simple : avec le scorer "fast", une transaction est scorée par score_record.
+    """
+    monkeypatch.setattr("app.transform.log_prediction", lambda **kwargs: None)
+    features = pd.DataFrame([{"amt": 250.0, "trans_num": "T1"}])
+
+    pred_df = predict_fraud(_RecordScorer(), features)
+
+    assert pred_df.loc[0, "fraud_pred"] == 1
+    assert pred_df.loc[0, "fraud_proba"] == 0.9
+    logging.info("✅ predict_fraud utilise score_record avec le scorer fast.")
+
+
 def test_alert_fraud_detection(caplog):
     """
     Test simple : vérifier que l'alerte est loggée si une fraude est détectée.
@@ -135,4 +161,41 @@ def test_save_predictions_to_s3():
     expected_key = f"test/gold/{timestamp}_transaction_data_predicted.csv"
     assert gold_key == expected_key, f"❌ La clé S3 retournée est incorrecte : {gold_key}"
 
-    logging.info("✅ save_predictions_to_s3 fonctionne.")
\ No newline at end of file
+    logging.info("✅ save_predictions_to_s3 fonctionne.")
+
+
+def test_parquet_partition_keys():
+    """
+    Test simple : la partition Parquet est déduite de trans_date_trans_time (date/heure).
+    """
+    from app.transform import ParquetPartitionSink
+
+    df = pd.DataFrame({"trans_date_trans_time": ["2024-09-08 14:03:10", "2024-09-08 15:00:00"]})
+    partitions = ParquetPartitionSink.partition_keys(df).tolist()
+
+    assert partitions == ["date=2024-09-08/hour=14", "date=2024-09-08/hour=15"], f"❌ Partitions incorrectes : {partitions}"
+
+    logging.info("✅ ParquetPartitionSink.partition_keys fonctionne.")
+
+
+class _FailingS3:
+    def put_object(self, **kwargs):
+        raise ConnectionError("S3 indisponible")
+
+
+def test_parquet_sink_bounds_retries(monkeypatch):
+    """
+    Test simple : pendant une panne S3, les lignes en échec au-delà du tampon de reprise
+    sont abandonnées et comptées, ainsi que celles encore en échec à la fermeture.
+    """
+    from app.transform import ParquetPartitionSink
+
+    monkeypatch.setattr("app.transform.s3_client", _FailingS3())
+    sink = ParquetPartitionSink("test/gold", max_rows=1, retry_max_rows=2)
+    for i in range(5):
+        sink.add(pd.DataFrame({"trans_date_trans_time": ["2024-09-08 14:03:10"], "amt": [float(i)]}))
+    assert sink.dropped == 3, f"❌ Lignes abandonnées : {sink.dropped}"
+
+    sink.close()
+    assert sink.dropped == 5
+    logging.info("✅ ParquetPartitionSink borne les reprises et compte les lignes perdues.")
@@ -3,6 +3,9 @@ load_dotenv()
 
 import argparse
 import os
+import sys
+import tempfile
+from pathlib import Path
 import pandas as pd
 import numpy as np
 import time
@@ -16,6 +19,40 @@ from sklearn.preprocessing import  StandardScaler, FunctionTransformer, OneHotEn
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from dotenv import find_dotenv, load_dotenv
+import cloudpickle
+# Rendre les modules du dossier app importables (préprocessing partagé, scorer rapide)
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+import model_features
+from model_features import dataset_processing
+from fast_scorer import build_scorer_spec, FastScorer, FAST_SCORER_ARTIFACT_PATH
+from onnx_scorer import OnnxScorer, ONNX_ARTIFACT_PATH, ONNX_MODEL_FILE
+from load_model import predict_with_threshold
+from skl2onnx import convert_sklearn, update_registered_converter
+from skl2onnx.common.data_types import FloatTensorType, StringTensorType
+from skl2onnx.common.shape_calculator import calculate_linear_classifier_output_shapes
+from onnxmltools.convert.xgboost.operator_converters.XGBoost import convert_xgboost
+# Profil de référence et sketches de drift du monitoring
+sys.path.insert(0, str(Path(__file__).parent.parent / "monitoring"))
+from reference_profile import (
+    build_reference_profile,
+    profile_to_sketches,
+    save_reference_profile,
+    REFERENCE_PROFILE_ARTIFACT_PATH,
+    REFERENCE_PROFILE_FILE,
+)
+from drift_sketches import save_reference_sketches
+
+# Le préprocessing est sérialisé avec le modèle : le modèle se charge sans le dossier app
+cloudpickle.register_pickle_by_value(model_features)
+
+# Convertisseur ONNX de XGBClassifier (fourni par onnxmltools) utilisable dans un Pipeline skl2onnx
+update_registered_converter(
+    XGBClassifier,
+    "XGBoostXGBClassifier",
+    calculate_linear_classifier_output_shapes,
+    convert_xgboost,
+    options={"nocl": [True, False], "zipmap": [True, False, "columns"]},
+)
 
 env_path = find_dotenv()
 load_dotenv(env_path, override=True)
@@ -23,6 +60,10 @@ load_dotenv(env_path, override=True)
 # Set your variables for your environment
 MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://0.0.0.0:4000")
 EXPERIMENT_NAME="fraud_detector"
+# Écart maximal toléré entre les probabilités du scorer rapide et celles du Pipeline
+FAST_SCORER_TOLERANCE = 1e-5
+# Écart maximal toléré entre les probabilités du modèle ONNX (calcul en float32) et celles du Pipeline
+ONNX_TOLERANCE = 1e-4
 
 # function for saving data reference for Evidently
 def save_reference_data(X_test, y_test, predictions):
@@ -31,6 +72,86 @@ def save_reference_data(X_test, y_test, predictions):
     reference["prediction"] = predictions
     reference.to_parquet("monitoring/reference_data/baseline.parquet")
 
+# function for saving the compact reference profile (see monitoring/reference_profile.py)
+def export_reference_profile(model, X_check, y_check):
+    """
+    Profil de référence (histogrammes, quantiles, fréquences, distribution des prédictions)
+    loggé dans le run MLflow : le monitoring utilise celui de la version en production.
+    Copie locale dans monitoring/reference_data, avec les sketches de drift qui en découlent.
+    """
+    # Même seuil que le scoring en production (FRAUD_THRESHOLD)
+    predictions, probas = predict_with_threshold(model, X_check)
+    profile = build_reference_profile(X_check, y_check, predictions, probas)
+    mlflow.log_dict(profile, f"{REFERENCE_PROFILE_ARTIFACT_PATH}/{REFERENCE_PROFILE_FILE}")
+    save_reference_profile(profile, "monitoring/reference_data/reference_profile.json")
+    save_reference_sketches(profile_to_sketches(profile), "monitoring/reference_data/drift_reference.json")
+    print(f"✅ Reference profile logged ({len(profile['columns'])} columns)")
+
+# function for exporting the DataFrame-free scorer (see app/fast_scorer.py)
+def export_fast_scorer(model, X_check):
+    """
+    Exporte le scorer rapide (tables one-hot, constantes du scaler, booster) dans le run MLflow
+    courant, seulement si ses probabilités sont identiques à celles du Pipeline sur X_check.
+    """
+    spec, booster = build_scorer_spec(model)
+    scorer = FastScorer(spec, booster)
+    max_diff = float(np.max(np.abs(scorer.predict_proba(X_check)[:, 1] - model.predict_proba(X_check)[:, 1])))
+    mlflow.log_metric("fast_scorer_max_abs_diff", max_diff)
+    if max_diff > FAST_SCORER_TOLERANCE:
+        print(f"[WARN] Scorer rapide non exporté : écart maximal {max_diff:.2e} > {FAST_SCORER_TOLERANCE:.0e}")
+        return False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scorer.save(tmp_dir)
+        mlflow.log_artifacts(tmp_dir, artifact_path=FAST_SCORER_ARTIFACT_PATH)
+    print(f"✅ Fast scorer logged (max abs diff {max_diff:.2e})")
+    return True
+
+# functions for exporting the pipeline to ONNX (see app/onnx_scorer.py)
+def convert_pipeline_to_onnx(model):
+    """
+    Convertit en ONNX la partie ColumnTransformer + XGBoost du Pipeline.
+    dataset_processing n'est pas convertible et reste en Python : le graphe
+    a une entrée par colonne préparée (chaîne pour les catégories, float sinon).
+    """
+    preprocessor = model.named_steps["features_preprocessing"]
+    classifier = model.steps[-1][1]
+    initial_types = []
+    # Probabilités en tenseur (n, 2) plutôt qu'en liste de dictionnaires
+    options = {id(classifier): {"zipmap": False}}
+    for name, transformer, columns in preprocessor.transformers_:
+        if isinstance(transformer, str):
+            continue
+        tensor_type = StringTensorType if hasattr(transformer, "categories_") else FloatTensorType
+        initial_types += [(column, tensor_type([None, 1])) for column in columns]
+        if hasattr(transformer, "scale_"):
+            # Division du StandardScaler en double précision, comme scikit-learn
+            options[id(transformer)] = {"div": "div_cast"}
+    return convert_sklearn(
+        Pipeline(model.steps[1:]),
+        initial_types=initial_types,
+        options=options,
+        target_opset={"": 17, "ai.onnx.ml": 3},
+    )
+
+def export_onnx_model(model, X_check):
+    """
+    Exporte le modèle ONNX dans le run MLflow courant, seulement si ses probabilités
+    (onnxruntime) correspondent à celles du Pipeline sur X_check.
+    """
+    onnx_model = convert_pipeline_to_onnx(model)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, ONNX_MODEL_FILE), "wb") as f:
+            f.write(onnx_model.SerializeToString())
+        scorer = OnnxScorer.load(tmp_dir)
+        max_diff = float(np.max(np.abs(scorer.predict_proba(X_check)[:, 1] - model.predict_proba(X_check)[:, 1])))
+        mlflow.log_metric("onnx_max_abs_diff", max_diff)
+        if max_diff > ONNX_TOLERANCE:
+            print(f"[WARN] Modèle ONNX non exporté : écart maximal {max_diff:.2e} > {ONNX_TOLERANCE:.0e}")
+            return False
+        mlflow.log_artifacts(tmp_dir, artifact_path=ONNX_ARTIFACT_PATH)
+    print(f"✅ ONNX model logged (max abs diff {max_diff:.2e})")
+    return True
+
 if __name__ == "__main__":
 
     # Set tracking URI for MLFlow
@@ -73,26 +194,6 @@ if __name__ == "__main__":
     # Train / test split 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.3, random_state = 42, stratify=y)
 
-    # Preprocessing 
-    def dataset_processing(df):
-        df = df.copy()
-        ## Create new features
-
-        # Calculate distance between transaction location and merchant location
-        df['distance'] = (((df['lat'] - df['merch_lat'])*np.cos(np.radians((df['long'] + df['merch_long'])/2)))**2 + (df['long'] - df['merch_long'])**2)**1/2*111.12
-
-        # calculate age
-        df['age'] = pd.to_numeric(2025 - pd.to_datetime(df['dob']).dt.year)
-
-        # Extract day of week and month from transaction date
-        df['trans_dayofweek'] = pd.to_datetime(df['trans_date_trans_time']).dt.day_name()
-        df['trans_month'] = pd.to_datetime(df['trans_date_trans_time']).dt.month_name()
-
-        ## Remove redundant info or non useful info
-        df = df.drop(['trans_date_trans_time', 'unix_time','first', 'last', 'street', 'city','lat', 'long', 'job', 'dob', 'merchant', 'merch_lat', 'merch_long', 'trans_num'], axis=1)
-
-        return df 
-
     date_preprocessor = FunctionTransformer(dataset_processing)
 
     # Preprocessing 
@@ -108,7 +209,10 @@ if __name__ == "__main__":
         transformers=[
             ("categorical_transformer", categorical_transformer, categorical_features),
             ("numerical_transformer", numerical_transformer, numerical_features)
-        ]
+        ],
+        # Sortie dense : les zéros sont des valeurs (et non des manquants pour XGBoost),
+        # comme dans les modèles exportés (ONNX, scorer rapide)
+        sparse_threshold=0,
     )
 
     # Pipeline 
@@ -152,8 +256,15 @@ if __name__ == "__main__":
         print(f"F1 Score: {result.metrics['f1_score']:.3f}")
         print(f"ROC AUC: {result.metrics['roc_auc']:.3f}")
 
+        # Export du scorer rapide avec vérification de la parité sur le jeu de test
+        export_fast_scorer(model, X_test.drop(columns=["target"]))
+
+        # Export ONNX avec vérification de la parité sur le jeu de test
+        export_onnx_model(model, X_test.drop(columns=["target"]))
+
         # Save reference data for Evidently
         save_reference_data(X_test, y_test, model.predict(X_test))
+        export_reference_profile(model, X_test.drop(columns=["target"]), y_test)
 
         # Récupérer la dernière version du modèle
         client = MlflowClient()